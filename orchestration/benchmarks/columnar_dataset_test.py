@@ -0,0 +1,68 @@
+import time
+import pickle
+
+import pandas as pd
+
+from config.params import params
+from shared.testing import make_target, make_students
+from shared.columnar_dataset import load_split, write_dataset
+
+N_STUDENTS = 1_000_000
+REPEATS = 5
+
+
+def best_of(load) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        load()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def test_splits_load_faster_than_the_pickle(tmp_path):
+    students = make_students(N_STUDENTS)
+    target = make_target(students)
+    train, test = (
+        students.index[: N_STUDENTS // 5 * 4],
+        students.index[N_STUDENTS // 5 * 4 :],
+    )
+    data = (
+        students.loc[train],
+        students.loc[test],
+        target.loc[train],
+        target.loc[test],
+    )
+
+    with open(tmp_path / 'data_bin.pkl', 'wb') as file:
+        pickle.dump(data, file)
+    write_dataset(
+        tmp_path / 'dataset',
+        {'train': (data[0], data[2]), 'test': (data[1], data[3])},
+    )
+
+    def load_pickle():
+        with open(tmp_path / 'data_bin.pkl', 'rb') as file:
+            return pickle.load(file)
+
+    numerical = params['features']['numerical']
+
+    pickle_seconds = best_of(load_pickle)
+    columnar_seconds = best_of(lambda: load_split(tmp_path / 'dataset', 'train'))
+    projected_seconds = best_of(
+        lambda: load_split(tmp_path / 'dataset', 'train', columns=numerical)
+    )
+
+    print(
+        f'\ntrain split of {N_STUDENTS} students: data_bin.pkl {pickle_seconds:.3f}s, '
+        f'Arrow every column {columnar_seconds:.3f}s, '
+        f'Arrow {len(numerical)} columns {projected_seconds:.3f}s'
+    )
+
+    X_train, y_train = load_split(tmp_path / 'dataset', 'train', columns=numerical)
+    pd.testing.assert_frame_equal(X_train, data[0][numerical])
+    pd.testing.assert_series_equal(y_train, data[2], check_dtype=False)
+
+    # Only the train split is read, its numerical columns without a copy
+    assert columnar_seconds < pickle_seconds
+    assert projected_seconds < pickle_seconds
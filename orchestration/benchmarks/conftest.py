@@ -0,0 +1,28 @@
+from typing import Dict, Tuple, Callable, Optional
+
+import mlflow
+import pytest
+
+from config.params import params
+from orchestration.common import export_dataset
+
+
+@pytest.fixture(name='experiment_config')
+def experiment_config_fixture(tmp_path, monkeypatch) -> Callable[..., Dict]:
+    '''
+    Export X_train, X_test, y_train, y_test as the dataset of a config whose
+    runs are tracked in a SQLite MLflow store, both under tmp_path
+    '''
+    # Run artifacts are written under the working directory
+    monkeypatch.chdir(tmp_path)
+    mlflow.set_tracking_uri(f"sqlite:///{tmp_path / 'mlflow.db'}")
+
+    def experiment_config(splits: Tuple, experiment: Optional[str] = None) -> Dict:
+        export_dataset({'data': {'preprocessed': tmp_path}}, splits)
+
+        if experiment is not None:
+            mlflow.set_experiment(experiment)
+
+        return params | {'data': {'preprocessed': str(tmp_path)}}
+
+    return experiment_config
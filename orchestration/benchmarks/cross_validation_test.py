@@ -0,0 +1,55 @@
+import time
+
+import mlflow
+import pytest
+
+from orchestration import common
+from shared.testing import make_target, make_students
+from orchestration.cross_validation import cross_validate
+
+N_STUDENTS = 5000
+HYPERPARAMS = {'n_estimators': 100, 'max_depth': 6, 'random_state': 42}
+
+
+@pytest.fixture(name='config')
+def config_fixture(experiment_config):
+    students = make_students(N_STUDENTS)
+    target = make_target(students)
+    # Same split as preprocess.split_dataset, the holdout is the last fold
+    train_idx, test_idx = list(common.kfold().split(students))[-1]
+
+    return experiment_config(
+        (
+            students.iloc[train_idx],
+            students.iloc[test_idx],
+            target.iloc[train_idx],
+            target.iloc[test_idx],
+        ),
+        'cross-validation',
+    )
+
+
+def timed_cross_validation(config, **options):
+    start = time.perf_counter()
+    results = cross_validate(config, HYPERPARAMS, **options)
+    return time.perf_counter() - start, results
+
+
+def test_cross_validation(config):
+    cold_seconds, cold = timed_cross_validation(config, n_jobs=1)
+    warm_seconds, warm = timed_cross_validation(config, n_jobs=1)
+    parallel_seconds, parallel = timed_cross_validation(config, n_jobs=2)
+
+    holdout_accuracy = common.mlflow_experiment(mlflow, HYPERPARAMS, config)
+
+    print(
+        f"\n{common.CV_FOLDS} folds of {N_STUDENTS} students, accuracy "
+        f"{warm['accuracy'].mean():.4f} ± {warm['accuracy'].std():.4f}: "
+        f'first run {cold_seconds:.2f}s, cached folds {warm_seconds:.2f}s, '
+        f'cached folds on 2 workers {parallel_seconds:.2f}s'
+    )
+
+    assert len(warm) == common.CV_FOLDS
+    assert warm.equals(cold) and warm.equals(parallel)
+    assert warm['accuracy'].iloc[-1] == holdout_accuracy
+    assert warm_seconds * 3 < cold_seconds
@@ -0,0 +1,53 @@
+import time
+
+import pandas as pd
+from imblearn.under_sampling import TomekLinks
+
+from shared.testing import make_target, make_students
+from orchestration.common import kfold
+from orchestration.data_store import DataStore, content_cached
+
+N_STUDENTS = 20_000
+
+
+def test_stored_outputs_skip_the_resampling(tmp_path):
+    store = DataStore(tmp_path / 'store')
+    calls = []
+
+    @content_cached('resampling', store)
+    def resampling(df: pd.DataFrame, config):
+        calls.append(len(df))
+        X, y = df[config['features']], df[config['target']]
+        return TomekLinks().fit_resample(X, y)
+
+    @content_cached('split_dataset', store)
+    def split_dataset(X, y):
+        train_idx, test_idx = list(kfold().split(X))[-1]
+        return X.iloc[train_idx], X.iloc[test_idx], y[train_idx], y[test_idx]
+
+    students = make_students(N_STUDENTS)
+    students['Target'] = make_target(students)
+    config = {'features': students.columns[:-1].tolist(), 'target': 'Target'}
+
+    start = time.perf_counter()
+    computed = split_dataset(*resampling(students, config))
+    computed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stored = split_dataset(*resampling(students.copy(), config))
+    stored_seconds = time.perf_counter() - start
+
+    # Another target invalidates the resampling and everything after it
+    resampling(students.assign(Target=students['Target'].iloc[::-1].to_numpy()), config)
+
+    print(
+        f'\nresampling and split of {N_STUDENTS} students: '
+        f'computed {computed_seconds:.2f}s, stored {stored_seconds:.2f}s'
+    )
+
+    assert calls == [N_STUDENTS, N_STUDENTS]
+    for computed_output, stored_output in zip(computed, stored):
+        assert computed_output.equals(stored_output)
+        assert computed_output.index.equals(stored_output.index)
+    assert computed[2].name == stored[2].name == 'Target'
+    assert stored_seconds < computed_seconds
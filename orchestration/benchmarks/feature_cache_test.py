@@ -0,0 +1,67 @@
+import time
+
+import mlflow
+import pytest
+from xgboost import XGBClassifier
+from sklearn.model_selection import train_test_split
+
+from orchestration import common
+from shared.testing import make_target, make_students
+
+N_STUDENTS = 20_000
+HYPERPARAMS = {'n_estimators': 50, 'max_depth': 6, 'random_state': 42, 'n_jobs': -1}
+
+
+@pytest.fixture(name='config')
+def config_fixture(experiment_config):
+    students = make_students(N_STUDENTS)
+
+    return experiment_config(
+        tuple(
+            train_test_split(
+                students, make_target(students), test_size=0.2, random_state=42
+            )
+        ),
+        'feature-cache',
+    )
+
+
+def timed_run(config, **options):
+    start = time.perf_counter()
+    accuracy = common.mlflow_experiment(mlflow, HYPERPARAMS, config, **options)
+    return time.perf_counter() - start, accuracy
+
+
+def test_trials_reuse_the_fitted_preprocessing(config):
+    cold_seconds, cold_accuracy = timed_run(config)
+    warm_seconds, warm_accuracy = timed_run(config)
+
+    # A new process only finds the entry on disk
+    common.get_feature_cache.cache_clear()
+    disk_seconds, disk_accuracy = timed_run(config)
+
+    print(
+        f'\n{N_STUDENTS} students: first run {cold_seconds:.2f}s, '
+        f'cached in memory {warm_seconds:.2f}s, cached on disk {disk_seconds:.2f}s, '
+        f'speed-up {cold_seconds / warm_seconds:.1f}x'
+    )
+
+    assert cold_accuracy == warm_accuracy == disk_accuracy
+    assert warm_seconds * 3 < cold_seconds
+
+
+def test_cached_features_match_the_full_pipeline(config):
+    X_train, X_test, y_train, _ = common.load_data(config['data']['preprocessed'])
+    features = common.prepare_features(config)
+
+    pipeline = common.pipeline_definition(
+        XGBClassifier, config['features'], 'XGBClassifier', HYPERPARAMS
+    )
+    pipeline.fit(X_train, features['label_encoder'].transform(y_train))
+
+    model = XGBClassifier(**HYPERPARAMS)
+    common.fit_model(model, features)
+
+    assert (
+        pipeline.predict(X_test) == model.predict(common.split_frame(features, 'test'))
+    ).all()
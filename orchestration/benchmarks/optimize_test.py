@@ -0,0 +1,54 @@
+import time
+
+import pytest
+from sklearn.model_selection import train_test_split
+
+from orchestration import optimize
+from shared.testing import make_target, make_students
+
+N_TRIALS = 6
+
+
+@pytest.fixture(name='config')
+def config_fixture(experiment_config):
+    students = make_students(3000)
+    # Noisy target, so the trees have something to overfit
+    target = make_target(students, noise=2.0)
+
+    return experiment_config(
+        tuple(train_test_split(students, target, test_size=0.2, random_state=42))
+    )
+
+
+def timed_search(config, **options):
+    start = time.perf_counter()
+    study = optimize.run(N_TRIALS, config, **options)
+    return time.perf_counter() - start, study
+
+
+def test_parallel_search_with_pruning(config, tmp_path):
+    sequential_seconds, sequential = timed_search(
+        config, study_name='sequential', early_stopping_rounds=0
+    )
+    pruned_seconds, pruned = timed_search(
+        config, study_name='pruned', early_stopping_rounds=50
+    )
+    parallel_seconds, parallel = timed_search(
+        config,
+        study_name='parallel',
+        workers=2,
+        storage=str(tmp_path / 'optuna-journal.log'),
+        early_stopping_rounds=50,
+    )
+
+    print(
+        f'\n{N_TRIALS} trials, tree_method={optimize.default_tree_method()}: '
+        f'sequential {sequential_seconds:.1f}s (best {sequential.best_value:.3f}), '
+        f'early stopping and pruning {pruned_seconds:.1f}s (best {pruned.best_value:.3f}), '
+        f'2 workers {parallel_seconds:.1f}s (best {parallel.best_value:.3f})'
+    )
+
+    assert len(parallel.trials) == N_TRIALS
+    # A single CPU gains nothing from the workers, only from the shorter trials
+    assert pruned_seconds < sequential_seconds * 1.2
+    assert parallel.best_value >= sequential.best_value - 0.05
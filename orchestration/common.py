@@ -1,22 +1,51 @@
 # pylint: disable=import-error
 import pickle
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, List, Tuple, Optional
 from pathlib import Path
+from functools import lru_cache
 
+import numpy as np
 import pandas as pd
 from xgboost import XGBClassifier
 from sklearn.metrics import confusion_matrix, classification_report
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import LabelEncoder
 from feature_engine.creation import MathFeatures
-from feature_engine.encoding import RareLabelEncoder, CountFrequencyEncoder
+from sklearn.model_selection import KFold, train_test_split
 
+from shared import columnar_dataset
+from shared.compiled_model import CompiledModel
+from shared.lookup_encoder import LookupEncoder
+from shared.reference_profile import (
+    PROFILE_FILE_NAME,
+    REFERENCE_FILE_NAME,
+    LABEL_ENCODER_FILE_NAME,
+    save_reference_dataset,
+    build_reference_profile,
+)
+from orchestration.feature_cache import FEATURE_CACHE, FeatureCache, cache_key, file_hash
 
-def export_dataset(config: Dict, splited_data: Tuple) -> None:
-    print('Creating pickle file...')
-    pkl_name = Path(config['data']['preprocessed']) / 'data_bin.pkl'
-    with open(pkl_name, 'wb') as file:
-        pickle.dump(splited_data, file)
+# Shipped with logged models, so clients outside this repository can unpickle them
+SHARED_PATH = Path(__file__).resolve().parents[1] / 'shared'
+
+# Share of the training data early stopping is evaluated on
+VALIDATION_SIZE = 0.2
+# The dataset holds the last fold as train and test sets
+CV_FOLDS = 10
+
+# Columnar dataset versions, under data.preprocessed
+DATASET_DIRECTORY = 'dataset'
+# Written by earlier versions of preprocess.py, still read when no dataset exists
+LEGACY_DATASET_FILE = 'data_bin.pkl'
+
+
+def export_dataset(config: Dict, splited_data: Tuple) -> Path:
+    print('Writing dataset...')
+    X_train, X_test, y_train, y_test = splited_data
+    return columnar_dataset.write_dataset(
+        Path(config['data']['preprocessed']) / DATASET_DIRECTORY,
+        {'train': (X_train, y_train), 'test': (X_test, y_test)},
+    )
 
 
 def metrics(model: Pipeline, X: pd.DataFrame, y_true: pd.Series) -> Dict[str, Any]:
@@ -35,28 +64,76 @@ def metrics(model: Pipeline, X: pd.DataFrame, y_true: pd.Series) -> Dict[str, An
     }
 
 
-def load_data(path):
+def kfold() -> KFold:
+    return KFold(n_splits=CV_FOLDS, shuffle=True, random_state=100)
+
+
+def fold_split(data: Tuple, fold: int) -> Tuple:
     '''
-    Return data containing X_train, X_test, y_train, y_test
+    X_train, X_test, y_train, y_test of another fold of the same KFold
     '''
-    with open(Path(path) / 'data_bin.pkl', 'rb') as file:
-        return pickle.load(file)
+    X_train, X_test, y_train, y_test = data
 
+    # Both sets keep the index of the resampled data, which KFold split by position
+    X = pd.concat([X_train, X_test]).sort_index()
+    y = pd.concat([y_train, y_test]).sort_index()
+    train_idx, test_idx = list(kfold().split(X))[fold]
 
-def pipeline_definition(
-    model, features: Dict, model_name: str, hyperparams: Dict[str, Any]
-) -> Pipeline:
+    return X.iloc[train_idx], X.iloc[test_idx], y.iloc[train_idx], y.iloc[test_idx]
+
+
+def load_data(
+    path, columns: Optional[List[str]] = None, splits: Tuple[str, ...] = ('train', 'test')
+):
+    '''
+    Return data containing X_train, X_test, y_train, y_test, or X and y of
+    each of `splits`. With `columns`, only those features are read.
+    '''
+    dataset_path = Path(path) / DATASET_DIRECTORY
+
+    if not (dataset_path / columnar_dataset.CURRENT_FILE_NAME).exists():
+        with open(Path(path) / LEGACY_DATASET_FILE, 'rb') as file:
+            X_train, X_test, y_train, y_test = pickle.load(file)
+
+        legacy = {'train': (X_train, y_train), 'test': (X_test, y_test)}
+        data = [
+            (X if columns is None else X[columns], y)
+            for X, y in (legacy[split] for split in splits)
+        ]
+    else:
+        data = [
+            columnar_dataset.load_split(dataset_path, split, columns) for split in splits
+        ]
+
+    # Same order as the pickled tuple: every X, then every y
+    return tuple(X for X, _ in data) + tuple(y for _, y in data)
+
+
+def dataset_version(path) -> str:
+    '''
+    Version of the current dataset, the hash of data_bin.pkl for legacy ones
+    '''
+    dataset_path = Path(path) / DATASET_DIRECTORY
+
+    if not (dataset_path / columnar_dataset.CURRENT_FILE_NAME).exists():
+        return file_hash(Path(path) / LEGACY_DATASET_FILE)
+
+    return columnar_dataset.read_manifest(dataset_path)['version']
+
+
+def feature_columns(features: Dict) -> List[str]:
+    return features['numerical'] + features['categorical']
+
+
+def preprocessing_definition(features: Dict) -> Pipeline:
+    '''
+    Feature engineering steps of the pipeline, everything but the model
+    '''
     return Pipeline(
         [
             (
-                'RareLabelEncoder',
-                RareLabelEncoder(
-                    variables=features['categorical'], ignore_format=True, tol=0.05
-                ),
-            ),
-            (
-                'CountFrequencyEncoder',
-                CountFrequencyEncoder(variables=features['categorical']),
+                'LookupEncoder',
+                LookupEncoder(variables=features['categorical'], tol=0.05),
             ),
             (
                 'MathFeatures',
@@ -67,45 +144,184 @@ def pipeline_definition(
                     new_variables_names=['mean_inflation_gdp'],
                 ),
             ),
-            (model_name, model(**hyperparams)),
         ]
     )
 
 
-def mlflow_experiment(mlflow, hyperparams, config: Dict, log_artifacts=False):
-    # pylint: disable=too-many-locals
+def pipeline_definition(
+    model, features: Dict, model_name: str, hyperparams: Dict[str, Any]
+) -> Pipeline:
+    return Pipeline(
+        preprocessing_definition(features).steps + [(model_name, model(**hyperparams))]
+    )
+
+
+def export_serving_artifact(pipeline: Pipeline, path: Path) -> Path:
+    '''
+    Compile the fitted pipeline into the flat artifact served by
+    shared/compiled_model.py: encoder lookup tables, the mean feature
+    and the booster in XGBoost's native format
+    '''
+    CompiledModel.from_pipeline(pipeline).save(path)
+    return Path(path)
+
+
+@lru_cache(maxsize=None)
+def get_feature_cache(directory: Path) -> FeatureCache:
+    return FeatureCache(directory if FEATURE_CACHE else None)
+
 
-    X_train, X_test, y_train, y_test = load_data(config['data']['preprocessed'])
+def as_matrix(X: pd.DataFrame) -> np.ndarray:
+    # XGBoost converts every input to float32, so nothing is lost
+    return np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+
+
+def build_features(
+    config: Dict, validation_size: Optional[float] = None, fold: Optional[int] = None
+) -> Dict:
+    '''
+    Fit the preprocessing steps and transform every split. With
+    `validation_size`, they are fitted without the validation rows.
+    '''
+    # pylint: disable=too-many-locals
+    # Only the columns the preprocessing uses are read
+    data = load_data(config['data']['preprocessed'], feature_columns(config['features']))
+    X_train, X_test, y_train, y_test = data if fold is None else fold_split(data, fold)
 
     label_encoder = LabelEncoder()
     y_train = label_encoder.fit_transform(y_train)
     y_test = label_encoder.transform(y_test)
 
+    splits = {'train': (X_train, y_train), 'test': (X_test, y_test)}
+
+    if validation_size:
+        # The test set stays out of the model selection
+        X_fit, X_valid, y_fit, y_valid = train_test_split(
+            X_train, y_train, test_size=validation_size, stratify=y_train, random_state=42
+        )
+        splits |= {'fit': (X_fit, y_fit), 'valid': (X_valid, y_valid)}
+
+    preprocessing = preprocessing_definition(config['features'])
+    preprocessing.fit(*splits.get('fit', splits['train']))
+
+    features = {
+        'preprocessing': preprocessing,
+        'label_encoder': label_encoder,
+        'schema': {
+            'columns': X_train.columns.tolist(),
+            'data_types': X_train.dtypes.astype('str').to_dict(),
+        },
+    }
+
+    for split, (X, y) in splits.items():
+        X = preprocessing.transform(X)
+        features['feature_names'] = X.columns.tolist()
+        features[f'X_{split}'], features[f'y_{split}'] = as_matrix(X), np.asarray(y)
+
+    if 'X_fit' not in features:
+        features['X_fit'], features['y_fit'] = features['X_train'], features['y_train']
+
+    return features
+
+
+def prepare_features(
+    config: Dict, validation_size: Optional[float] = None, fold: Optional[int] = None
+) -> Dict:
+    '''
+    Fitted preprocessing and float32 matrices of every split, built once per
+    dataset version, features and preprocessing definition.
+    `fold` selects a cross-validation fold instead of the stored split.
+    '''
+    path = Path(config['data']['preprocessed'])
+    key = cache_key(
+        dataset_version(path),
+        config['features'],
+        repr(preprocessing_definition(config['features'])),
+        validation_size,
+        fold if fold is None else [fold, CV_FOLDS],
+    )
+
+    return get_feature_cache(path / 'feature_cache').get(
+        key, lambda: build_features(config, validation_size, fold)
+    )
+
+
+def split_frame(features: Dict, split: str) -> pd.DataFrame:
+    # Wraps the cached matrix without a copy, the booster keeps the column names
+    return pd.DataFrame(
+        features[f'X_{split}'], columns=features['feature_names'], copy=False
+    )
+
+
+def fit_model(
+    model,
+    features: Dict,
+    early_stopping_rounds: Optional[int] = None,
+    callbacks: Optional[List] = None,
+) -> None:
+    '''
+    Fit only the model on the transformed training data, with early stopping
+    on the validation split when `early_stopping_rounds` is set
+    '''
+    if early_stopping_rounds is None:
+        model.fit(split_frame(features, 'fit'), features['y_fit'])
+        return
+
+    model.set_params(early_stopping_rounds=early_stopping_rounds, callbacks=callbacks)
+    model.fit(
+        split_frame(features, 'fit'),
+        features['y_fit'],
+        eval_set=[(split_frame(features, 'valid'), features['y_valid'])],
+        verbose=False,
+    )
+
+    # Not kept on the logged model, the callbacks hold the Optuna trial
+    model.set_params(early_stopping_rounds=None, callbacks=None)
+
+
+def mlflow_experiment(
+    mlflow,
+    hyperparams,
+    config: Dict,
+    log_artifacts=False,
+    *,
+    early_stopping_rounds: Optional[int] = None,
+    callbacks: Optional[List] = None,
+):
+    # pylint: disable=too-many-locals,too-many-arguments
+
+    # Only the model is fitted here, the preprocessing is shared by every run
+    features = prepare_features(
+        config, VALIDATION_SIZE if early_stopping_rounds is not None else None
+    )
+    label_encoder = features['label_encoder']
+
     with mlflow.start_run():
-        model = XGBClassifier
-        model_name = type(model()).__name__
+        model = XGBClassifier(**hyperparams)
+        model_name = type(model).__name__
 
         mlflow.set_tag('model', model_name)
-        mlflow.log_params(hyperparams)
 
-        pipeline = pipeline_definition(
-            model,
-            config['features'],
-            model_name,
-            hyperparams,
-        )
-        pipeline.fit(X_train, y_train)
+        if early_stopping_rounds is None:
+            mlflow.log_params(hyperparams)
+            fit_model(model, features)
+        else:
+            # n_estimators is logged once known, so training the best run's params reproduces it
+            mlflow.log_params(
+                {k: v for k, v in hyperparams.items() if k != 'n_estimators'}
+            )
+            fit_model(model, features, early_stopping_rounds, callbacks)
+            mlflow.log_param('n_estimators', model.best_iteration + 1)
 
-        train_metrics = metrics(pipeline, X_train, y_train)
-        test_metrics = metrics(pipeline, X_test, y_test)
+        # Same steps as pipeline_definition, with the fitted preprocessing
+        pipeline = Pipeline(features['preprocessing'].steps + [(model_name, model)])
 
-        mlflow.log_dict(
-            {
-                'columns': X_train.columns.tolist(),
-                'data_types': X_train.dtypes.astype('str').to_dict(),
-            },
-            'dataset_schema.json',
+        train_metrics = metrics(
+            model, split_frame(features, 'train'), features['y_train']
         )
+        test_metrics = metrics(model, split_frame(features, 'test'), features['y_test'])
+
+        mlflow.log_dict(features['schema'], 'dataset_schema.json')
 
         train_accuracy, test_accuracy = (
             train_metrics['report']['accuracy'],
@@ -119,18 +335,44 @@ def mlflow_experiment(mlflow, hyperparams, config: Dict, log_artifacts=False):
         mlflow.log_dict(test_metrics, 'test_metrics.json')
 
         if log_artifacts:
-            mlflow.sklearn.log_model(pipeline, artifact_path='model')
+            # Ship LookupEncoder with the model so any client can unpickle the pipeline
+            mlflow.sklearn.log_model(
+                pipeline, artifact_path='model', code_paths=[str(SHARED_PATH)]
+            )
 
-            # Log the serialized LabelEncoder file as an artifact in MLflow
-            X_train['prediction'] = label_encoder.inverse_transform(
-                pipeline.predict(X_train)
+            # Drift reference data: the train split of the dataset with its predictions
+            X_train = load_data(
+                config['data']['preprocessed'],
+                feature_columns(config['features']),
+                splits=('train',),
+            )[0].assign(
+                prediction=label_encoder.inverse_transform(
+                    model.predict(split_frame(features, 'train'))
+                )
             )
             print('Logging training dataset and label encoder object')
 
-            with open('artifacts.pkl', 'wb') as file:
-                pickle.dump((label_encoder, X_train), file)
+            # Log the serialized LabelEncoder file as an artifact in MLflow
+            with open(LABEL_ENCODER_FILE_NAME, 'wb') as file:
+                pickle.dump(label_encoder, file)
+
+            mlflow.log_artifact(LABEL_ENCODER_FILE_NAME, artifact_path='artifacts')
+
+            # Columnar so the service can memory-map it instead of unpickling it
+            save_reference_dataset(X_train, REFERENCE_FILE_NAME)
+            mlflow.log_artifact(REFERENCE_FILE_NAME, artifact_path='artifacts')
+
+            # Reference statistics for drift detection, computed once per model version
+            reference_profile = build_reference_profile(
+                X_train,
+                config['features']['numerical'],
+                config['features']['categorical'],
+            )
+            mlflow.log_dict(reference_profile, f'artifacts/{PROFILE_FILE_NAME}')
 
-            mlflow.log_artifact('artifacts.pkl', artifact_path='artifacts')
+            # Served with SERVING_ENGINE=compiled, next to the other artifacts
+            serving_path = export_serving_artifact(pipeline, Path('serving'))
+            mlflow.log_artifacts(str(serving_path), artifact_path='artifacts/serving')
 
         return test_accuracy
 
@@ -0,0 +1,135 @@
+'''
+K-fold evaluation of a set of hyperparameters. Every fold of the KFold the
+holdout split was taken from is trained and scored, in parallel worker
+processes that split the CPUs between them. The preprocessed folds come
+from the feature cache, so only the boosters are trained on later runs.
+'''
+
+# pylint: disable=import-error
+import os
+from typing import Dict, Tuple, Optional
+
+import pandas as pd
+from joblib import Parallel, delayed, cpu_count, parallel_config
+from xgboost import XGBClassifier
+
+from orchestration.common import (
+    CV_FOLDS,
+    VALIDATION_SIZE,
+    metrics,
+    fit_model,
+    split_frame,
+    prepare_features,
+)
+
+# Folds trained at the same time, -1 for one per CPU
+CV_N_JOBS = int(os.getenv('CV_N_JOBS', '-1'))
+
+
+def score_fold(
+    config: Dict, fold: int, hyperparams: Dict, early_stopping_rounds: Optional[int]
+) -> Dict:
+    validation_size = VALIDATION_SIZE if early_stopping_rounds is not None else None
+    features = prepare_features(config, validation_size, fold)
+
+    model = XGBClassifier(**hyperparams)
+    fit_model(model, features, early_stopping_rounds)
+
+    report = metrics(model, split_frame(features, 'test'), features['y_test'])['report']
+
+    return {
+        'fold': fold,
+        'accuracy': report['accuracy'],
+        'f1': report['macro avg']['f1-score'],
+        'n_estimators': (
+            model.best_iteration + 1
+            if early_stopping_rounds is not None
+            else hyperparams['n_estimators']
+        ),
+    }
+
+
+def fold_workers(n_jobs: int, total_threads: Optional[int] = None) -> Tuple[int, int]:
+    '''
+    Folds trained at the same time and threads of each, within `total_threads`
+    '''
+    total_threads = total_threads or cpu_count()
+    workers = min(n_jobs if n_jobs > 0 else total_threads, CV_FOLDS)
+    # XGBoost and the libraries below it share the CPUs of the folds running together
+    return workers, max(total_threads // workers, 1)
+
+
+def cross_validate(
+    config: Dict,
+    hyperparams: Dict,
+    *,
+    n_jobs: int = CV_N_JOBS,
+    early_stopping_rounds: Optional[int] = None,
+    total_threads: Optional[int] = None,
+) -> pd.DataFrame:
+    '''
+    One row of test metrics per fold, in fold order. `total_threads` is the
+    CPU budget of the caller, every CPU of the machine by default.
+    '''
+    workers, threads = fold_workers(n_jobs, total_threads)
+
+    with parallel_config(backend='loky', inner_max_num_threads=threads):
+        results = Parallel(n_jobs=workers)(
+            delayed(score_fold)(
+                config, fold, hyperparams | {'n_jobs': threads}, early_stopping_rounds
+            )
+            for fold in range(CV_FOLDS)
+        )
+
+    return pd.DataFrame(results)
+
+
+# pylint: disable-next=too-many-arguments
+def cross_validated_experiment(
+    mlflow,
+    hyperparams: Dict,
+    config: Dict,
+    *,
+    n_jobs: int = CV_N_JOBS,
+    early_stopping_rounds: Optional[int] = None,
+    total_threads: Optional[int] = None,
+) -> float:
+    '''
+    Log the mean and standard deviation of the fold metrics in a new run and
+    return the mean accuracy
+    '''
+    with mlflow.start_run():
+        mlflow.set_tag('model', XGBClassifier.__name__)
+        mlflow.set_tag('evaluation', f'{CV_FOLDS}-fold')
+
+        results = cross_validate(
+            config,
+            hyperparams,
+            n_jobs=n_jobs,
+            early_stopping_rounds=early_stopping_rounds,
+            total_threads=total_threads,
+        )
+
+        # Folds may stop at different rounds, the final model gets their mean
+        mlflow.log_params(
+            hyperparams | {'n_estimators': int(round(results['n_estimators'].mean()))}
+        )
+
+        for row in results.itertuples():
+            mlflow.log_metric('cv_accuracy', row.accuracy, step=row.fold)
+
+        mlflow.log_metrics(
+            {
+                'cv_accuracy_mean': results['accuracy'].mean(),
+                'cv_accuracy_std': results['accuracy'].std(),
+                'cv_f1_mean': results['f1'].mean(),
+                'cv_f1_std': results['f1'].std(),
+                # The last fold is the train and test split of the dataset
+                'test_accuracy': results['accuracy'].iloc[-1],
+            }
+        )
+
+        cv_accuracy = results['accuracy'].mean()
+        print(f"{cv_accuracy = :.4f} ± {results['accuracy'].std():.4f}")
+
+        return cv_accuracy
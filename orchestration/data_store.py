@@ -0,0 +1,144 @@
+'''
+Content-addressed store for the outputs of the preprocessing tasks.
+
+`content_cached` keys a task on its name and the hash of its arguments:
+DataFrames and Series by their content, files by their bytes and anything
+else by its JSON form. The outputs, one DataFrame, Series or a tuple of
+them, are written as Parquet files next to a manifest under
+DATA_STORE_PATH/<task name>/<key>, so a rerun on unchanged data reads them
+back instead of computing them.
+'''
+
+import os
+import json
+import shutil
+import hashlib
+import functools
+from typing import Any, Dict, List, Callable, Optional
+from pathlib import Path
+
+import pandas as pd
+
+from orchestration.feature_cache import file_hash
+
+DATA_STORE_PATH = os.getenv('DATA_STORE_PATH', './data/store')
+# Set to False to always run the tasks
+DATA_STORE_ENABLED = os.getenv('DATA_STORE_ENABLED', 'True') == 'True'
+
+# Bump when the outputs of a task change for the same inputs
+STORE_VERSION = 1
+
+MANIFEST_FILE_NAME = 'manifest.json'
+
+
+def content_hash(value: Any) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        frame = value.to_frame() if isinstance(value, pd.Series) else value
+        digest.update(
+            json.dumps(
+                [list(map(str, frame.columns)), frame.dtypes.astype(str).tolist()]
+            ).encode('utf-8')
+        )
+    elif isinstance(value, Path):
+        digest.update(file_hash(value).encode('utf-8'))
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+class DataStore:
+    def __init__(self, directory: Path = DATA_STORE_PATH) -> None:
+        self.directory = Path(directory)
+
+    def path(self, name: str, key: str) -> Path:
+        return self.directory / name / key
+
+    def get(self, name: str, key: str) -> Optional[Any]:
+        path = self.path(name, key)
+
+        if not (path / MANIFEST_FILE_NAME).exists():
+            return None
+
+        with open(path / MANIFEST_FILE_NAME, 'rt', encoding='utf-8') as file:
+            manifest = json.load(file)
+
+        outputs = []
+        for index, output in enumerate(manifest['outputs']):
+            frame = pd.read_parquet(path / f'{index}.parquet')
+
+            if output['kind'] == 'series':
+                frame = frame.iloc[:, 0].rename(output['name'])
+
+            outputs.append(frame)
+
+        return tuple(outputs) if manifest['tuple'] else outputs[0]
+
+    def put(self, name: str, key: str, result: Any) -> None:
+        outputs: List = list(result) if isinstance(result, tuple) else [result]
+        manifest: Dict = {'tuple': isinstance(result, tuple), 'outputs': []}
+
+        # Written aside and renamed, a failed run never leaves a partial entry
+        path = self.path(name, key)
+        temporary_path = path.with_name(f'{key}.tmp{os.getpid()}')
+        temporary_path.mkdir(parents=True, exist_ok=True)
+
+        for index, output in enumerate(outputs):
+            if isinstance(output, pd.Series):
+                manifest['outputs'].append({'kind': 'series', 'name': output.name})
+                output = output.to_frame(name='values')
+            else:
+                manifest['outputs'].append({'kind': 'frame'})
+
+            output.to_parquet(temporary_path / f'{index}.parquet')
+
+        with open(temporary_path / MANIFEST_FILE_NAME, 'wt', encoding='utf-8') as file:
+            json.dump(manifest, file)
+
+        try:
+            temporary_path.rename(path)
+        except OSError:
+            # Stored by another run in the meantime
+            shutil.rmtree(temporary_path)
+
+
+def content_cached(name: str, store: Optional[DataStore] = None) -> Callable:
+    '''
+    Cache the DataFrame or Series outputs of the decorated function on the
+    hash of its arguments
+    '''
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not DATA_STORE_ENABLED:
+                return func(*args, **kwargs)
+
+            data_store = store or DataStore()
+            key = content_hash(
+                [
+                    STORE_VERSION,
+                    [content_hash(arg) for arg in args],
+                    {
+                        keyword: content_hash(value)
+                        for keyword, value in sorted(kwargs.items())
+                    },
+                ]
+            )
+
+            result = data_store.get(name, key)
+
+            if result is None:
+                result = func(*args, **kwargs)
+                data_store.put(name, key, result)
+            else:
+                print(f'{name}: reusing the stored result {key}')
+
+            return result
+
+        return wrapper
+
+    return decorator
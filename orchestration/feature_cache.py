@@ -0,0 +1,106 @@
+'''
+Fitted preprocessing and transformed matrices, computed once per dataset
+version and reused by every training run on it: the first run of a process
+loads them from disk or builds them, the next ones read them from memory.
+
+An entry is a dict. NumPy arrays are stored in arrays.npz and everything
+else (fitted transformers, encoders, schemas) in objects.pkl, under a
+directory named after the key.
+'''
+
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import threading
+from typing import Any, Dict, Tuple, Callable, Optional
+from pathlib import Path
+
+import numpy as np
+
+# Set to False to only keep entries in memory
+FEATURE_CACHE = os.getenv('FEATURE_CACHE', 'True') == 'True'
+
+# Bump when the layout of the entries changes
+CACHE_VERSION = 1
+
+_file_hashes: Dict[Tuple, str] = {}
+
+
+def file_hash(path: Path) -> str:
+    '''
+    Content hash, only recomputed when the size or modification time changes
+    '''
+    path = Path(path)
+    stat = path.stat()
+    signature = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+
+    if signature not in _file_hashes:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        _file_hashes[signature] = digest.hexdigest()
+
+    return _file_hashes[signature]
+
+
+def cache_key(*parts: Any) -> str:
+    data = json.dumps([CACHE_VERSION, *parts], sort_keys=True, default=str)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class FeatureCache:
+    def __init__(self, directory: Optional[Path] = None) -> None:
+        self.directory = Path(directory) if directory is not None else None
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+
+    def get(self, key: str, build: Callable[[], Dict]) -> Dict:
+        with self.lock:
+            if key not in self.entries:
+                entry = self.load(key)
+
+                if entry is None:
+                    entry = build()
+                    self.save(key, entry)
+
+                self.entries[key] = entry
+
+            return self.entries[key]
+
+    def load(self, key: str) -> Optional[Dict]:
+        if self.directory is None or not (self.directory / key).exists():
+            return None
+
+        with np.load(self.directory / key / 'arrays.npz') as arrays:
+            entry = dict(arrays)
+
+        with open(self.directory / key / 'objects.pkl', 'rb') as file:
+            entry.update(pickle.load(file))
+
+        return entry
+
+    def save(self, key: str, entry: Dict) -> None:
+        if self.directory is None:
+            return
+
+        arrays = {
+            name: value for name, value in entry.items() if isinstance(value, np.ndarray)
+        }
+        objects = {name: value for name, value in entry.items() if name not in arrays}
+
+        # Written aside and renamed, concurrent trials never read a partial entry
+        temporary_directory = self.directory / f'{key}.tmp{os.getpid()}'
+        temporary_directory.mkdir(parents=True, exist_ok=True)
+
+        np.savez(temporary_directory / 'arrays.npz', **arrays)
+        with open(temporary_directory / 'objects.pkl', 'wb') as file:
+            pickle.dump(objects, file)
+
+        try:
+            temporary_directory.rename(self.directory / key)
+        except OSError:
+            # Another process saved the same entry first
+            shutil.rmtree(temporary_directory)
@@ -1,25 +1,78 @@
 # pylint: disable=import-error
 import os
+import shutil
 import argparse
 import warnings
-from typing import Dict
+from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
 
 import mlflow
 import optuna
-from common import mlflow_experiment
+import xgboost
 
 from config.params import params
+from orchestration.common import mlflow_experiment
+from orchestration.cross_validation import CV_N_JOBS, cross_validated_experiment
 
 warnings.filterwarnings('ignore')
 
 MLFLOW_TRACKING_URI: str = os.getenv('MLFLOW_TRACKING_URI')
 
+# Shared by the worker processes of a parallel search
+OPTUNA_STORAGE: str = os.getenv('OPTUNA_STORAGE', 'optuna-journal.log')
 
-def objective(trial: optuna.Trial, config: Dict):
-    PORT: int = config['mlflow']['port']
 
-    mlflow.set_tracking_uri(f'http://{MLFLOW_TRACKING_URI}:{PORT}')
+def default_tree_method() -> str:
+    '''
+    XGBOOST_TREE_METHOD, e.g. gpu_hist, when set. Otherwise gpu_hist only when
+    XGBoost was built with CUDA and a GPU driver is present
+    '''
+    # An empty value, as exported from a copied .env, also detects it
+    tree_method = os.getenv('XGBOOST_TREE_METHOD')
+    if tree_method:
+        return tree_method
 
+    # CUDA builds are also installed on CPU-only machines
+    if xgboost.build_info().get('USE_CUDA') and shutil.which('nvidia-smi'):
+        return 'gpu_hist'
+
+    return 'hist'
+
+
+class PruningCallback(xgboost.callback.TrainingCallback):
+    '''
+    Reports the validation loss of every boosting round to the trial and
+    stops the training as soon as the pruner gives up on it
+    '''
+
+    def __init__(self, trial: optuna.Trial, observation_key='validation_0-logloss'):
+        super().__init__()
+        self.trial = trial
+        self.observation_key = observation_key
+
+    def after_iteration(self, model, epoch: int, evals_log) -> bool:
+        dataset, metric = self.observation_key.split('-', 1)
+        loss = evals_log[dataset][metric][-1]
+
+        # The study maximizes accuracy, so the loss is reported negated
+        self.trial.report(-loss, step=epoch)
+
+        if self.trial.should_prune():
+            raise optuna.TrialPruned(f'Pruned at boosting round {epoch}')
+
+        return False
+
+
+# pylint: disable-next=too-many-arguments
+def objective(
+    trial: optuna.Trial,
+    config: Dict,
+    *,
+    n_jobs: int = -1,
+    early_stopping_rounds: int = 50,
+    cross_validation: bool = False,
+    cv_n_jobs: int = CV_N_JOBS,
+):
     mlflow.set_experiment(config['mlflow']['experiments']['optimized_models'])
 
     hyperparams = {
@@ -33,35 +86,194 @@ def objective(trial: optuna.Trial, config: Dict):
         'eval_metric': 'logloss',
         'objective': 'binary:logistic',
         'random_state': 42,
-        'n_jobs': -1,
-        'tree_method': 'gpu_hist',
+        'n_jobs': n_jobs,
+        'tree_method': default_tree_method(),
     }
 
-    return mlflow_experiment(mlflow, hyperparams, config['features'])
+    if cross_validation:
+        # Folds train in other processes, nothing reports to the pruner
+        return cross_validated_experiment(
+            mlflow,
+            hyperparams,
+            config,
+            n_jobs=cv_n_jobs,
+            early_stopping_rounds=early_stopping_rounds or None,
+            # The folds share the CPUs given to this worker, not the whole machine
+            total_threads=n_jobs if n_jobs > 0 else None,
+        )
 
+    if not early_stopping_rounds:
+        return mlflow_experiment(mlflow, hyperparams, config)
+
+    return mlflow_experiment(
+        mlflow,
+        hyperparams,
+        config,
+        early_stopping_rounds=early_stopping_rounds,
+        callbacks=[PruningCallback(trial)],
+    )
+
+
+def create_storage(storage: Optional[str]):
+    '''
+    Database URLs are used as they are, anything else is a journal file,
+    which unlike SQLite is safe to share between processes
+    '''
+    if storage is None or '://' in storage:
+        return storage
+
+    # pylint: disable=import-outside-toplevel
+    try:
+        from optuna.storages.journal import JournalFileBackend
+    except ImportError:
+        # Optuna < 4
+        from optuna.storages import JournalFileStorage as JournalFileBackend
+
+    return optuna.storages.JournalStorage(JournalFileBackend(storage))
+
+
+def create_study(study_name: str, storage: Optional[str]) -> optuna.Study:
+    return optuna.create_study(
+        study_name=study_name,
+        storage=create_storage(storage),
+        direction='maximize',
+        # Trees are not compared before the first rounds are done
+        pruner=optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=20),
+        load_if_exists=True,
+    )
 
-def run(n_trials: int, config: Dict):
-    # pylint: disable=unnecessary-lambda-assignment
 
-    study = optuna.create_study(direction='maximize')
+# pylint: disable-next=too-many-arguments
+def optimize_worker(
+    study_name: str,
+    storage: Optional[str],
+    n_trials: int,
+    config: Dict,
+    tracking_uri: Optional[str] = None,
+    **options,
+) -> optuna.Study:
+    '''
+    Run `n_trials` trials of the shared study, in this or a worker process
+    '''
+    if tracking_uri is not None:
+        mlflow.set_tracking_uri(tracking_uri)
 
-    objective_func = lambda trial: objective(trial, config)
+    study = create_study(study_name, storage)
+    study.optimize(lambda trial: objective(trial, config, **options), n_trials=n_trials)
+    return study
 
-    study.optimize(objective_func, n_trials=n_trials)
+
+def split_trials(n_trials: int, workers: int) -> List[int]:
+    return [
+        n_trials // workers + (1 if worker < n_trials % workers else 0)
+        for worker in range(workers)
+    ]
+
+
+# pylint: disable-next=too-many-arguments
+def run(
+    n_trials: int,
+    config: Dict,
+    *,
+    workers: int = 1,
+    storage: Optional[str] = None,
+    study_name: str = 'xgboost',
+    early_stopping_rounds: int = 50,
+    cross_validation: bool = False,
+) -> optuna.Study:
+    '''
+    With `workers` > 1 the trials run in that many processes sharing the
+    study through `storage`, each training with its share of the CPUs.
+    With `cross_validation` trials are scored on every fold, see cross_validation.py.
+    '''
+    if MLFLOW_TRACKING_URI is not None:
+        mlflow.set_tracking_uri(
+            f"http://{MLFLOW_TRACKING_URI}:{config['mlflow']['port']}"
+        )
+
+    if workers > 1:
+        storage = storage or OPTUNA_STORAGE
+        n_jobs = max((os.cpu_count() or 1) // workers, 1)
+
+        # Created once up front, so the workers only load it
+        create_study(study_name, storage)
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    optimize_worker,
+                    study_name,
+                    storage,
+                    worker_trials,
+                    config,
+                    # Worker processes do not share the tracking URI set here
+                    tracking_uri=mlflow.get_tracking_uri(),
+                    n_jobs=n_jobs,
+                    early_stopping_rounds=early_stopping_rounds,
+                    cross_validation=cross_validation,
+                    cv_n_jobs=n_jobs,
+                )
+                for worker_trials in split_trials(n_trials, workers)
+                if worker_trials
+            ]
+            for future in futures:
+                future.result()
+
+        study = create_study(study_name, storage)
+    else:
+        study = optimize_worker(
+            study_name,
+            storage,
+            n_trials,
+            config,
+            early_stopping_rounds=early_stopping_rounds,
+            cross_validation=cross_validation,
+        )
 
     print(f'Test accuracy optimzed: {study.best_value}')
     print(f'Best params: {study.best_params}')
 
+    return study
+
 
 def main():
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument(
         '--num_trials', default=50, type=int, help='Number of trials for the optimizer'
     )
+    arg_parser.add_argument(
+        '--workers', default=1, type=int, help='Worker processes running trials'
+    )
+    arg_parser.add_argument(
+        '--storage',
+        default=None,
+        help='Optuna journal file or database URL, in memory for a single worker',
+    )
+    arg_parser.add_argument('--study_name', default='xgboost')
+    arg_parser.add_argument(
+        '--early_stopping_rounds',
+        default=50,
+        type=int,
+        help='Rounds without improvement of the validation loss, 0 disables pruning',
+    )
+
+    arg_parser.add_argument(
+        '--cross_validation',
+        action='store_true',
+        help='Score every trial on all the folds instead of the holdout split',
+    )
 
     args = arg_parser.parse_args()
 
-    run(args.num_trials, params)
+    run(
+        args.num_trials,
+        params,
+        workers=args.workers,
+        storage=args.storage,
+        study_name=args.study_name,
+        early_stopping_rounds=args.early_stopping_rounds,
+        cross_validation=args.cross_validation,
+    )
 
 
 if __name__ == '__main__':
@@ -1,39 +1,84 @@
 # pylint: disable=import-error
-import io
+import os
 from typing import Dict, List, Tuple
 from pathlib import Path
 from zipfile import ZipFile
+from urllib.parse import urlparse
 
 import pandas as pd
 import requests
 from prefect import flow, task
 from imblearn.under_sampling import TomekLinks
-from sklearn.model_selection import KFold
 
 from config.params import params
-from orchestration.common import export_dataset
+from orchestration.common import kfold, export_dataset
+from orchestration.data_store import content_cached
+
+# Local zip or CSV file (or another URL) used instead of data.raw.origin, e.g. offline
+RAW_DATA_SOURCE = os.getenv('RAW_DATA_SOURCE')
+DOWNLOAD_TIMEOUT = float(os.getenv('DOWNLOAD_TIMEOUT', '60'))
+
+
+def data_source(origin: str) -> str | Path:
+    '''
+    URLs are kept as they are, anything else is a local file
+    '''
+    if urlparse(origin).scheme in ('http', 'https'):
+        return origin
+
+    return Path(origin)
+
+
+def download(url: str, target_path: str) -> Path:
+    '''
+    Fetched on every run, so the stored outputs are keyed on what the URL
+    serves now and not on the URL itself
+    '''
+    print(f'Downloading data from {url}')
+    response = requests.get(url, timeout=DOWNLOAD_TIMEOUT)
+    response.raise_for_status()
+
+    archive_path = Path(target_path) / 'data.zip'
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    archive_path.write_bytes(response.content)
+    return archive_path
+
+
+@content_cached('read_data')
+def load_raw_data(source: Path, target_path: str) -> pd.DataFrame:
+    '''
+    Students of the local zip file or CSV at `source`, keyed on its content
+    '''
+    if source.suffix == '.csv':
+        csv_path = source
+    else:
+        print(f'Extracting {source} to {target_path}')
+        with ZipFile(source, 'r') as zip_file:
+            zip_file.extractall(path=target_path)
+
+        csv_path = Path(target_path) / 'data.csv'
+
+    df = pd.read_csv(csv_path, sep=';', encoding='utf-8')
+    return df.query('Target!="Enrolled"').reset_index(drop=True)
 
 
 @task(name='Read data')
 def read_data(data_config: Dict) -> pd.DataFrame:
-    print(f"Downloading data from {data_config['origin']}")
-    response = requests.get(data_config['origin'], timeout=1)
+    source = data_source(RAW_DATA_SOURCE or data_config['origin'])
 
-    print(f"Extracting to {data_config['target_path']}")
-    with ZipFile(io.BytesIO(response.content), 'r') as zip_file:
-        zip_file.extractall(path=data_config['target_path'])
+    if isinstance(source, str):
+        source = download(source, data_config['target_path'])
 
-    df = pd.read_csv(
-        Path(data_config['target_path']) / 'data.csv', sep=';', encoding='utf-8'
-    )
-    return df.query('Target!="Enrolled"').reset_index(drop=True)
+    return load_raw_data(source, data_config['target_path'])
 
 
 @task(name='Resampling')
-def resampling(df: pd.DataFrame, config: Dict) -> Tuple[pd.DataFrame, pd.Series]:
-    features: List[str] = sum(config['features'].values(), [])
-
-    X, y = df[features], df[config['target']]
+@content_cached('resampling')
+def resampling(
+    df: pd.DataFrame, features: List[str], target: str
+) -> Tuple[pd.DataFrame, pd.Series]:
+    # Only the columns used are passed, other config changes keep the stored output
+    X, y = df[features], df[target]
 
     tomek_links = TomekLinks(n_jobs=-1)
     student_df_resampled = tomek_links.fit_resample(X, y)
@@ -43,12 +88,13 @@ def resampling(df: pd.DataFrame, config: Dict) -> Tuple[pd.DataFrame, pd.Series]
 
 
 @task(name='Split dataset')
+@content_cached('split_dataset')
 def split_dataset(X: pd.DataFrame, y: pd.Series) -> Tuple[pd.DataFrame | pd.Series]:
     '''
     Return X_train, X_test, y_train, y_test
     '''
-    kfold = KFold(n_splits=10, shuffle=True, random_state=100)
-    for train_idx, test_idx in kfold.split(X):
+    # Only the last fold is kept, orchestration/cross_validation.py rebuilds the others
+    for train_idx, test_idx in kfold().split(X):
         X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
         y_train, y_test = y[train_idx], y[test_idx]
 
@@ -63,7 +109,8 @@ def preprocess():
     Path.mkdir(preprocessed_path, exist_ok=True)
 
     print('Resampling data...')
-    X, y = resampling(df, params)
+    features: List[str] = sum(params['features'].values(), [])
+    X, y = resampling(df, features, params['target'])
 
     print('Splitting data...')
     X_train, X_test, y_train, y_test = split_dataset(X, y)
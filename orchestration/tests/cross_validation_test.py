@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+
+import pandas as pd
+import pytest
+
+from orchestration import cross_validation
+from shared.testing import make_students
+from orchestration.common import CV_FOLDS, kfold, fold_split
+from orchestration.cross_validation import fold_workers
+
+
+def test_folds_share_the_thread_budget_of_the_caller():
+    # One Optuna worker out of 4 on 16 CPUs
+    assert fold_workers(-1, total_threads=4) == (4, 1)
+    assert fold_workers(2, total_threads=4) == (2, 2)
+    # Never more workers than folds
+    assert fold_workers(-1, total_threads=32) == (10, 3)
+    assert fold_workers(1, total_threads=1) == (1, 1)
+
+
+class MlflowMock:
+    def __init__(self) -> None:
+        self.params, self.metrics, self.steps = {}, {}, []
+
+    @contextmanager
+    def start_run(self):
+        yield
+
+    def set_tag(self, key, value):
+        pass
+
+    def log_params(self, params):
+        self.params.update(params)
+
+    def log_metric(self, key, value, step):
+        self.steps.append((key, step, value))
+
+    def log_metrics(self, metrics):
+        self.metrics.update(metrics)
+
+
+def test_fold_metrics_are_aggregated(monkeypatch):
+    results = pd.DataFrame(
+        {
+            'fold': [0, 1, 2],
+            'accuracy': [0.8, 0.9, 0.85],
+            'f1': [0.7, 0.8, 0.9],
+            'n_estimators': [100, 120, 131],
+        }
+    )
+    monkeypatch.setattr(cross_validation, 'cross_validate', lambda *_, **__: results)
+    mlflow = MlflowMock()
+
+    cv_accuracy = cross_validation.cross_validated_experiment(
+        mlflow, {'n_estimators': 4000, 'max_depth': 6}, {}, early_stopping_rounds=50
+    )
+
+    assert cv_accuracy == pytest.approx(0.85)
+    # The final model is trained with the mean number of rounds of the folds
+    assert mlflow.params == {'n_estimators': 117, 'max_depth': 6}
+    assert mlflow.steps == [
+        ('cv_accuracy', 0, 0.8),
+        ('cv_accuracy', 1, 0.9),
+        ('cv_accuracy', 2, 0.85),
+    ]
+    assert mlflow.metrics == pytest.approx(
+        {
+            'cv_accuracy_mean': 0.85,
+            'cv_accuracy_std': 0.05,
+            'cv_f1_mean': 0.8,
+            'cv_f1_std': 0.1,
+            'test_accuracy': 0.85,
+        }
+    )
+
+
+def test_folds_of_the_stored_split():
+    X = make_students(50).assign(GDP=range(50))
+    y = pd.Series(range(50), name='Target')
+    train_idx, test_idx = list(kfold().split(X))[-1]
+    stored = X.iloc[train_idx], X.iloc[test_idx], y.iloc[train_idx], y.iloc[test_idx]
+
+    last_fold = fold_split(stored, CV_FOLDS - 1)
+    test_sets = [fold_split(stored, fold)[1].index for fold in range(CV_FOLDS)]
+
+    for part, stored_part in zip(last_fold, stored):
+        assert part.equals(stored_part)
+    assert sorted(index for test_set in test_sets for index in test_set) == list(
+        range(50)
+    )
@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+from orchestration import data_store
+from shared.testing import make_students
+from orchestration.data_store import DataStore, content_hash, content_cached
+
+
+@pytest.fixture(name='students')
+def students_fixture():
+    students = make_students(3).set_axis([4, 0, 9])
+    students['GDP'] = [0.5, None, -1.5]
+    return students
+
+
+def test_outputs_round_trip(tmp_path, students):
+    store = DataStore(tmp_path)
+    target = pd.Series(
+        ['Dropout', 'Graduate', 'Dropout'], index=students.index, name='Target'
+    )
+
+    store.put('frame', 'key', students)
+    store.put('outputs', 'key', (students, target))
+
+    pd.testing.assert_frame_equal(store.get('frame', 'key'), students)
+    stored_students, stored_target = store.get('outputs', 'key')
+    pd.testing.assert_frame_equal(stored_students, students)
+    pd.testing.assert_series_equal(stored_target, target)
+    assert store.get('frame', 'other') is None
+
+
+def test_content_hash(tmp_path, students):
+    assert content_hash(students) == content_hash(students.copy())
+    assert content_hash(students) != content_hash(students.assign(GDP=0.0))
+    assert content_hash(students) != content_hash(students.set_index(students.index + 1))
+    assert content_hash(students) != content_hash(students.rename(columns={'GDP': 'gdp'}))
+    assert content_hash(students) != content_hash(students.astype({'GDP': 'float32'}))
+
+    path = tmp_path / 'data.csv'
+    path.write_text('GDP\n1.74\n', encoding='utf-8')
+    first = content_hash(path)
+    path.write_text('GDP\n0.32\n', encoding='utf-8')
+
+    assert content_hash(path) != first
+    assert content_hash({'a': [1, 2]}) == content_hash({'a': [1, 2]})
+
+
+def test_content_cached(tmp_path, students):
+    calls = []
+
+    @content_cached('double', DataStore(tmp_path))
+    def double(df: pd.DataFrame, factor: int = 2) -> pd.DataFrame:
+        calls.append(factor)
+        return df * factor
+
+    first = double(students)
+    pd.testing.assert_frame_equal(double(students.copy()), first)
+    double(students, factor=3)
+
+    assert calls == [2, 3]
+
+
+def test_content_cached_disabled(tmp_path, students, monkeypatch):
+    monkeypatch.setattr(data_store, 'DATA_STORE_ENABLED', False)
+    calls = []
+
+    @content_cached('double', DataStore(tmp_path))
+    def double(df: pd.DataFrame) -> pd.DataFrame:
+        calls.append(len(df))
+        return df * 2
+
+    double(students)
+    double(students)
+
+    assert calls == [3, 3]
+    assert not list(tmp_path.iterdir())
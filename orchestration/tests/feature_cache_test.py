@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from config.params import params
+from orchestration import common
+from shared.testing import make_students
+from orchestration.feature_cache import FeatureCache, cache_key, file_hash
+
+
+def build_entry(calls):
+    def build():
+        calls.append(len(calls))
+        return {'X_train': np.arange(6, dtype=np.float32).reshape(3, 2), 'columns': ['a']}
+
+    return build
+
+
+def test_entries_are_built_once_and_loaded_from_disk(tmp_path):
+    calls = []
+
+    entry = FeatureCache(tmp_path).get('key', build_entry(calls))
+    # Another process finds the saved entry
+    loaded = FeatureCache(tmp_path).get('key', build_entry(calls))
+
+    assert calls == [0]
+    assert (loaded['X_train'] == entry['X_train']).all()
+    assert loaded['columns'] == ['a']
+    assert FeatureCache(tmp_path).load('other') is None
+
+
+def test_memory_only_cache(tmp_path):
+    calls = []
+    cache = FeatureCache(None)
+
+    cache.get('key', build_entry(calls))
+    cache.get('key', build_entry(calls))
+
+    assert calls == [0]
+    assert not list(tmp_path.iterdir())
+
+
+def test_keys_follow_the_content(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'students')
+    first = file_hash(path)
+
+    path.write_bytes(b'students and more')
+
+    assert file_hash(path) != first
+    assert cache_key(first, [1]) == cache_key(first, [1]) != cache_key(first, [2])
+
+
+def test_new_dataset_version_misses_the_cache(tmp_path, monkeypatch):
+    builds = []
+    monkeypatch.setattr(
+        common,
+        'build_features',
+        lambda *_: builds.append(len(builds)) or {'version': len(builds)},
+    )
+    config = params | {'data': {'preprocessed': str(tmp_path)}}
+
+    def export(gdp: float) -> None:
+        X = make_students(4).assign(GDP=gdp)
+        y = pd.Series(['Dropout', 'Graduate'] * 2, name='Target')
+        common.export_dataset(config, (X.iloc[:2], X.iloc[2:], y.iloc[:2], y.iloc[2:]))
+
+    export(1.74)
+    assert common.prepare_features(config) == common.prepare_features(config)
+    assert common.prepare_features(config, common.VALIDATION_SIZE)['version'] == 2
+
+    export(0.32)
+    assert common.prepare_features(config)['version'] == 3
+    assert builds == [0, 1, 2]
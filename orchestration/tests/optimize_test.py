@@ -0,0 +1,65 @@
+import optuna
+import pytest
+
+from orchestration import optimize
+
+
+class TrialMock:
+    def __init__(self, prune_at=None) -> None:
+        self.prune_at = prune_at
+        self.reports = []
+
+    def report(self, value, step):
+        self.reports.append((step, value))
+
+    def should_prune(self):
+        return self.reports[-1][0] == self.prune_at
+
+
+def evals_log(*losses):
+    return {'validation_0': {'logloss': list(losses)}}
+
+
+def test_pruning_callback_reports_the_negated_loss():
+    trial = TrialMock()
+    callback = optimize.PruningCallback(trial)
+
+    assert callback.after_iteration(None, 0, evals_log(0.6)) is False
+    assert callback.after_iteration(None, 1, evals_log(0.6, 0.5)) is False
+    assert trial.reports == [(0, -0.6), (1, -0.5)]
+
+
+def test_pruning_callback_stops_pruned_trials():
+    callback = optimize.PruningCallback(TrialMock(prune_at=1))
+    callback.after_iteration(None, 0, evals_log(0.6))
+
+    with pytest.raises(optuna.TrialPruned):
+        callback.after_iteration(None, 1, evals_log(0.6, 0.5))
+
+
+def test_split_trials():
+    assert optimize.split_trials(10, 3) == [4, 3, 3]
+    assert optimize.split_trials(2, 4) == [1, 1, 0, 0]
+    assert sum(optimize.split_trials(50, 7)) == 50
+
+
+def test_default_tree_method(monkeypatch):
+    monkeypatch.delenv('XGBOOST_TREE_METHOD', raising=False)
+    monkeypatch.setattr(optimize.xgboost, 'build_info', lambda: {'USE_CUDA': True})
+    monkeypatch.setattr(optimize.shutil, 'which', lambda _: '/usr/bin/nvidia-smi')
+    assert optimize.default_tree_method() == 'gpu_hist'
+
+    # CUDA build without a GPU driver
+    monkeypatch.setattr(optimize.shutil, 'which', lambda _: None)
+    assert optimize.default_tree_method() == 'hist'
+
+    monkeypatch.setenv('XGBOOST_TREE_METHOD', 'approx')
+    assert optimize.default_tree_method() == 'approx'
+
+
+def test_empty_tree_method_is_detected(monkeypatch):
+    # A copied .env exports the variable even when it is left empty
+    monkeypatch.setenv('XGBOOST_TREE_METHOD', '')
+    monkeypatch.setattr(optimize.xgboost, 'build_info', dict)
+
+    assert optimize.default_tree_method() == 'hist'
@@ -23,7 +23,8 @@ def get_best_params(mlflow_client, config: Dict) -> Dict:
     runs = mlflow_client.search_runs(
         experiment_ids=[experiment.experiment_id],
         max_results=1,
-        order_by=['metrics.test_accuracy DESC'],
+        # Cross-validated runs first, see optimize.py --cross_validation
+        order_by=['metrics.cv_accuracy_mean DESC', 'metrics.test_accuracy DESC'],
     )
     return runs[0].data.params
 
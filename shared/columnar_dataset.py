@@ -0,0 +1,196 @@
+'''
+Versioned columnar layout of the preprocessed dataset, one uncompressed Arrow
+IPC file per split so readers memory-map it and only touch the columns they
+select:
+
+    <path>/<version>/train.arrow        features, target and original index
+    <path>/<version>/test.arrow
+    <path>/<version>/manifest.json      schema, row counts and hash of every split
+    <path>/CURRENT                      version to read
+
+The version is the hash of the split files, so the same data always gets the
+same version. The split files are also valid inputs of streaming/batch_score.py.
+'''
+
+import os
+import json
+import shutil
+import hashlib
+from typing import Set, Dict, List, Tuple, Optional
+from pathlib import Path
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+MANIFEST_FILE_NAME = 'manifest.json'
+CURRENT_FILE_NAME = 'CURRENT'
+INDEX_COLUMN = '__index__'
+
+# Bump when the layout of the files changes
+FORMAT_VERSION = 1
+
+# Split files whose hash matched in this process, keyed by path, size and
+# modification time so a rewritten file is hashed again
+_verified_files: Set[Tuple] = set()
+
+
+class DatasetError(Exception):
+    pass
+
+
+def blake2b(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_split(X: pd.DataFrame, y: pd.Series, path: Path) -> pa.Schema:
+    if y.name is None or y.name in X.columns:
+        raise DatasetError(
+            f'The target needs a name other than the features, not {y.name}'
+        )
+
+    frame = X.assign(**{y.name: y.to_numpy()})
+    # Cross-validation folds are rebuilt from the index of the resampled data
+    frame.insert(0, INDEX_COLUMN, X.index.to_numpy())
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    feather.write_feather(table, str(path), compression='uncompressed')
+    return table.schema
+
+
+def write_dataset(path: Path, splits: Dict[str, Tuple[pd.DataFrame, pd.Series]]) -> Path:
+    '''
+    Write the (X, y) pair of every split as a new version and make it current
+    '''
+    path = Path(path)
+    temporary_directory = path / f'.tmp{os.getpid()}'
+    shutil.rmtree(temporary_directory, ignore_errors=True)
+    temporary_directory.mkdir(parents=True)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'index': INDEX_COLUMN,
+        'target': None,
+        'schema': {},
+        'splits': {},
+    }
+
+    for split, (X, y) in splits.items():
+        file_name = f'{split}.arrow'
+        schema = write_split(X, y, temporary_directory / file_name)
+
+        manifest['target'] = y.name
+        manifest['schema'] = {field.name: str(field.type) for field in schema}
+        manifest['splits'][split] = {
+            'file': file_name,
+            'rows': len(X),
+            'hash': blake2b(temporary_directory / file_name),
+        }
+
+    version = hashlib.blake2b(
+        json.dumps([FORMAT_VERSION, manifest['splits']], sort_keys=True).encode('utf-8'),
+        digest_size=16,
+    ).hexdigest()
+    manifest['version'] = version
+
+    with open(temporary_directory / MANIFEST_FILE_NAME, 'wt', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+
+    version_directory = path / version
+    if version_directory.exists():
+        # Same content as a version written before
+        shutil.rmtree(temporary_directory)
+    else:
+        temporary_directory.rename(version_directory)
+
+    # Switch the current version only once its files are complete
+    current_file = path / CURRENT_FILE_NAME
+    temporary_file = current_file.with_suffix('.tmp')
+    temporary_file.write_text(version, encoding='utf-8')
+    temporary_file.replace(current_file)
+
+    return version_directory
+
+
+def resolve_version(path: Path) -> Path:
+    '''
+    Accept either a dataset root holding CURRENT or a version directory
+    '''
+    path = Path(path)
+
+    if (path / MANIFEST_FILE_NAME).exists():
+        return path
+
+    current_file = path / CURRENT_FILE_NAME
+    if not current_file.exists():
+        raise DatasetError(f'No dataset in {path}')
+
+    return path / current_file.read_text(encoding='utf-8').strip()
+
+
+def read_manifest(path: Path) -> Dict:
+    with open(resolve_version(path) / MANIFEST_FILE_NAME, 'rt', encoding='utf-8') as file:
+        manifest = json.load(file)
+
+    if manifest['format_version'] != FORMAT_VERSION:
+        raise DatasetError(f"Unsupported dataset format {manifest['format_version']}")
+
+    return manifest
+
+
+def verify_split(version_directory: Path, manifest: Dict, split: str) -> None:
+    split_path = version_directory / manifest['splits'][split]['file']
+    expected = manifest['splits'][split]['hash']
+
+    stat = split_path.stat()
+    key = (str(split_path), stat.st_size, stat.st_mtime_ns, expected)
+    if key in _verified_files:
+        return
+
+    if blake2b(split_path) != expected:
+        raise DatasetError(f'Hash mismatch of {split_path}')
+
+    _verified_files.add(key)
+
+
+def load_split(
+    path: Path, split: str, columns: Optional[List[str]] = None, verify: bool = True
+) -> Tuple[pd.DataFrame, pd.Series]:
+    '''
+    X and y of `split`. With `columns`, the other features are never read
+    from disk. With `verify`, the split file is checked against the hash of
+    the manifest, once per process.
+    '''
+    version_directory = resolve_version(path)
+    manifest = read_manifest(version_directory)
+    target = manifest['target']
+
+    if verify:
+        verify_split(version_directory, manifest, split)
+
+    if columns is not None:
+        columns = [INDEX_COLUMN, *columns, target]
+
+    table = feather.read_table(
+        str(version_directory / manifest['splits'][split]['file']),
+        columns=columns,
+        memory_map=True,
+    )
+    index = pd.Index(table.column(INDEX_COLUMN).to_numpy())
+
+    # Numerical columns without missing values are used without a copy
+    X = table.select(
+        [name for name in table.column_names if name not in (INDEX_COLUMN, target)]
+    ).to_pandas(split_blocks=True)
+    X.index = index
+
+    y = table.column(target).to_pandas().rename(target)
+    y.index = index
+
+    return X, y
@@ -0,0 +1,160 @@
+'''
+Serving engine for the XGBoost pipeline without sklearn or feature-engine at
+request time. The fitted pipeline is compiled into a flat artifact:
+
+    serving.json     feature order, encoded columns and the mean feature
+    encoders.npz     dense lookup table of every categorical column
+    booster.ubj      XGBoost booster in its native format
+
+and predictions run on float32 arrays with Booster.inplace_predict.
+'''
+
+import json
+import warnings
+from typing import Dict, List, Union
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from shared.lookup_encoder import LookupTable, LookupEncoder
+
+SERVING_FILE_NAME = 'serving.json'
+ENCODERS_FILE_NAME = 'encoders.npz'
+BOOSTER_FILE_NAME = 'booster.ubj'
+
+
+class CompiledModel:
+    '''
+    Same predictions as the fitted pipeline, from the compiled artifact
+    '''
+
+    def __init__(
+        self,
+        booster: xgb.Booster,
+        feature_names: List[str],
+        tables: Dict[str, LookupTable],
+        mean_variables: List[str],
+        mean_name: str,
+        mean_missing_values: str = 'raise',
+    ) -> None:
+        # pylint: disable=too-many-arguments
+        self.booster = booster
+        self.feature_names = feature_names
+        self.tables = tables
+        self.mean_variables = mean_variables
+        self.mean_name = mean_name
+        # As MathFeatures: 'raise' rejects NaN, 'ignore' averages the other variables
+        self.mean_missing_values = mean_missing_values
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> 'CompiledModel':
+        *encoders, math_features, model = (step for _, step in pipeline.steps)
+
+        # Pipelines trained with feature-engine encoders are folded into the same tables
+        if not isinstance(encoders[0], LookupEncoder):
+            encoders = [LookupEncoder.from_feature_engine(*encoders)]
+
+        booster = model.get_booster()
+
+        return cls(
+            booster,
+            list(booster.feature_names),
+            encoders[0].tables_,
+            list(math_features.variables_),
+            math_features.new_variables_names[0],
+            math_features.missing_values,
+        )
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        self.booster.save_model(path / BOOSTER_FILE_NAME)
+
+        columns = list(self.tables)
+        arrays = {}
+        for index, column in enumerate(columns):
+            arrays[f'values_{index}'] = self.tables[column].values
+        np.savez(path / ENCODERS_FILE_NAME, **arrays)
+
+        serving = {
+            'feature_names': self.feature_names,
+            'categorical': columns,
+            'mean': {
+                'variables': self.mean_variables,
+                'name': self.mean_name,
+                'missing_values': self.mean_missing_values,
+            },
+        }
+        with open(path / SERVING_FILE_NAME, 'wt', encoding='utf-8') as file:
+            json.dump(serving, file, indent=2)
+
+    @classmethod
+    def load(cls, path: Path) -> 'CompiledModel':
+        path = Path(path)
+
+        with open(path / SERVING_FILE_NAME, 'rt', encoding='utf-8') as file:
+            serving = json.load(file)
+
+        booster = xgb.Booster()
+        booster.load_model(path / BOOSTER_FILE_NAME)
+
+        with np.load(path / ENCODERS_FILE_NAME) as arrays:
+            tables = {
+                column: LookupTable(arrays[f'values_{index}'])
+                for index, column in enumerate(serving['categorical'])
+            }
+
+        return cls(
+            booster,
+            serving['feature_names'],
+            tables,
+            serving['mean']['variables'],
+            serving['mean']['name'],
+            # Artifacts compiled before it was stored come from the default MathFeatures
+            serving['mean'].get('missing_values', 'raise'),
+        )
+
+    def transform(self, features: Union[pd.DataFrame, Dict]) -> np.ndarray:
+        '''
+        Float32 matrix in the booster's feature order
+        '''
+        columns = {
+            column: table.encode(features[column])
+            for column, table in self.tables.items()
+        }
+        mean_values = np.array(
+            [
+                np.asarray(features[column], dtype=np.float64)
+                for column in self.mean_variables
+            ]
+        )
+
+        if self.mean_missing_values == 'raise' and np.isnan(mean_values).any():
+            raise ValueError(f'Missing values in {self.mean_variables}')
+
+        with warnings.catch_warnings():
+            # Rows missing every variable get NaN, as with pandas
+            warnings.simplefilter('ignore', RuntimeWarning)
+            columns[self.mean_name] = np.nanmean(mean_values, axis=0)
+
+        matrix = np.empty(
+            (len(columns[self.mean_name]), len(self.feature_names)), dtype=np.float32
+        )
+        for index, column in enumerate(self.feature_names):
+            matrix[:, index] = columns[column]
+
+        return matrix
+
+    def predict_proba(self, features: Union[pd.DataFrame, Dict]) -> np.ndarray:
+        return self.booster.inplace_predict(self.transform(features))
+
+    def predict(self, features: Union[pd.DataFrame, Dict]) -> np.ndarray:
+        probabilities = self.predict_proba(features)
+
+        if probabilities.ndim == 2:
+            return probabilities.argmax(axis=1)
+
+        return (probabilities > 0.5).astype(np.int64)
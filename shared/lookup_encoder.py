@@ -0,0 +1,120 @@
+'''
+Rare label grouping followed by count encoding, as RareLabelEncoder and
+CountFrequencyEncoder do it, but with one dense array per column indexed by
+the category itself. The categories of this dataset are small non-negative
+integers, so a whole batch is encoded with a single np.take per column.
+'''
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+
+
+class LookupTable:
+    '''
+    `values[category]` is the encoding of a frequent category and the last slot
+    the encoding of rare or unknown ones
+    '''
+
+    def __init__(self, values: np.ndarray) -> None:
+        self.values = np.asarray(values, dtype=np.float32)
+
+    @classmethod
+    def from_mapping(cls, mapping: Dict, default: float) -> 'LookupTable':
+        categories = np.array(list(mapping), dtype=np.float64)
+
+        if (categories < 0).any() or (categories != np.floor(categories)).any():
+            raise ValueError('Lookup tables need non-negative integer categories')
+
+        size = int(categories.max()) + 1 if len(categories) else 0
+        values = np.full(size + 1, default, dtype=np.float32)
+        values[categories.astype(np.intp)] = list(mapping.values())
+        return cls(values)
+
+    @property
+    def rare_slot(self) -> int:
+        return len(self.values) - 1
+
+    def encode(self, column) -> np.ndarray:
+        column = np.asarray(column, dtype=np.float64)
+        # NaN fails every comparison and lands in the rare slot too
+        known = (column >= 0) & (column < self.rare_slot) & (column == np.floor(column))
+        index = np.where(known, column, self.rare_slot).astype(np.intp)
+        return np.take(self.values, index)
+
+
+def count_tables(
+    frequent: Dict[str, List], counts: Dict[str, Dict], rare_label: str
+) -> Dict[str, LookupTable]:
+    '''
+    One table per column from the frequent categories and the counts after rare
+    grouping. Unknown categories get the rare label count, NaN if there was none.
+    '''
+    return {
+        column: LookupTable.from_mapping(
+            {
+                category: counts[column][category]
+                for category in frequent[column]
+                if category in counts[column]
+            },
+            counts[column].get(rare_label, np.nan),
+        )
+        for column in frequent
+    }
+
+
+class LookupEncoder(BaseEstimator, TransformerMixin):
+    '''
+    Drop-in replacement for the RareLabelEncoder and CountFrequencyEncoder steps
+    of the training pipeline, with the same defaults
+    '''
+
+    def __init__(
+        self, variables: Optional[List[str]] = None, tol: float = 0.05, n_categories=10
+    ) -> None:
+        self.variables = variables
+        self.tol = tol
+        self.n_categories = n_categories
+
+    def fit(self, X: pd.DataFrame, y=None):
+        # pylint: disable=unused-argument,attribute-defined-outside-init
+        self.tables_ = {}
+
+        for column in self.variables:
+            counts = X[column].value_counts()
+
+            if len(counts) > self.n_categories:
+                frequent = counts[counts / counts.sum() >= self.tol]
+                rare = counts.sum() - frequent.sum()
+            else:
+                frequent, rare = counts, 0
+
+            self.tables_[column] = LookupTable.from_mapping(
+                frequent.to_dict(), rare if rare else np.nan
+            )
+
+        return self
+
+    @classmethod
+    def from_feature_engine(cls, rare_label_encoder, count_encoder) -> 'LookupEncoder':
+        '''
+        Fitted encoder with the tables of already fitted feature-engine steps
+        '''
+        encoder = cls(list(rare_label_encoder.encoder_dict_))
+        # pylint: disable=attribute-defined-outside-init
+        encoder.tables_ = count_tables(
+            rare_label_encoder.encoder_dict_,
+            count_encoder.encoder_dict_,
+            rare_label_encoder.replace_with,
+        )
+        return encoder
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        X = X.copy()
+
+        for column, table in self.tables_.items():
+            X[column] = table.encode(X[column])
+
+        return X
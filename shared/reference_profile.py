@@ -0,0 +1,159 @@
+import json
+import threading
+from typing import Dict, List, Optional
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROFILE_FILE_NAME = 'reference_profile.json'
+REFERENCE_FILE_NAME = 'reference.arrow'
+LABEL_ENCODER_FILE_NAME = 'label_encoder.pkl'
+
+# Columns with more distinct values than this are stored as a histogram
+MAX_DISTINCT_VALUES = 1000
+
+
+def count_missing(dataset: pd.DataFrame) -> int:
+    '''
+    Missing cells, counting empty strings and infinities as missing like Evidently
+    '''
+    return int(
+        dataset.isna().sum().sum() + dataset.isin(['', np.inf, -np.inf]).sum().sum()
+    )
+
+
+def _to_python(values: np.ndarray) -> List:
+    return [value.item() if hasattr(value, 'item') else value for value in values]
+
+
+def profile_column(column: pd.Series, column_type: str) -> Dict:
+    '''
+    Value counts of a column. They are exact unless a numerical column has more
+    than MAX_DISTINCT_VALUES distinct values, then bin centers are stored instead
+    '''
+    not_missing = column.replace([np.inf, -np.inf], np.nan).dropna()
+    value_counts = not_missing.value_counts(sort=False).sort_index()
+    exact = column_type == 'categorical' or len(value_counts) <= MAX_DISTINCT_VALUES
+
+    if exact:
+        values, counts = value_counts.index.to_numpy(), value_counts.to_numpy()
+    else:
+        counts, edges = np.histogram(not_missing.to_numpy(), bins=MAX_DISTINCT_VALUES)
+        values = (edges[:-1] + edges[1:]) / 2
+
+    profile = {
+        'type': column_type,
+        'exact': bool(exact),
+        'values': _to_python(values),
+        'counts': [int(count) for count in counts],
+        'missing': int(len(column) - len(not_missing)),
+    }
+
+    if column_type == 'numerical':
+        profile['std'] = float(np.std(not_missing.to_numpy(dtype=float)))
+
+    return profile
+
+
+def build_reference_profile(
+    dataset: pd.DataFrame,
+    numerical_features: List[str],
+    categorical_features: List[str],
+    prediction: str = 'prediction',
+) -> Dict:
+    '''
+    Everything drift detection needs from the reference data, computed once
+    per model version
+    '''
+    column_types = {column: 'numerical' for column in numerical_features} | {
+        column: 'categorical' for column in categorical_features + [prediction]
+    }
+
+    return {
+        'n_rows': int(len(dataset)),
+        'n_missing': count_missing(dataset),
+        'n_cells': int(dataset.size),
+        'columns': {
+            column: profile_column(dataset[column], column_type)
+            for column, column_type in column_types.items()
+        },
+    }
+
+
+def save_reference_profile(profile: Dict, path: Path) -> None:
+    with open(path, 'wt', encoding='utf-8') as file:
+        json.dump(profile, file)
+
+
+def load_reference_profile(path: Path) -> Optional[Dict]:
+    if not Path(path).exists():
+        return None
+
+    with open(path, 'rt', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_reference_dataset(dataset: pd.DataFrame, path: Path) -> None:
+    '''
+    Uncompressed Arrow IPC file, so it can be memory-mapped
+    '''
+    # pylint: disable=import-outside-toplevel
+    from pyarrow import feather
+
+    feather.write_feather(
+        dataset.reset_index(drop=True), str(path), compression='uncompressed'
+    )
+
+
+def load_reference_dataset(path: Path) -> pd.DataFrame:
+    # pylint: disable=import-outside-toplevel
+    from pyarrow import feather
+
+    # Numerical columns without missing values are used without a copy
+    table = feather.read_table(str(path), memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+class ReferenceData:
+    '''
+    Reference dataset of the served model together with its precomputed profile.
+    The dataset is either given or memory-mapped from `dataset_path` on first
+    use. The profile is built from the dataset on first use when the model run
+    did not log one.
+    '''
+
+    def __init__(
+        self,
+        dataset: Optional[pd.DataFrame],
+        features: Dict,
+        profile: Optional[Dict] = None,
+        dataset_path: Optional[Path] = None,
+    ) -> None:
+        self._dataset = dataset
+        self.dataset_path = dataset_path
+        self.features = features
+        self._profile = profile
+        self.lock = threading.Lock()
+
+    @property
+    def dataset(self) -> pd.DataFrame:
+        with self.lock:
+            if self._dataset is None and self.dataset_path is not None:
+                self._dataset = load_reference_dataset(self.dataset_path)
+
+        return self._dataset
+
+    @property
+    def profile(self) -> Dict:
+        if self._profile is None:
+            self._profile = build_reference_profile(
+                self.dataset, self.features['numerical'], self.features['categorical']
+            )
+
+        return self._profile
+
+    @property
+    def share_of_missing_values(self) -> float:
+        profile = self.profile
+        return profile['n_missing'] / profile['n_cells'] if profile['n_cells'] else 0.0
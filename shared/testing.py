@@ -0,0 +1,46 @@
+'''
+Synthetic students with the features of params, shared by the tests and
+benchmarks of streaming and orchestration
+'''
+
+import numpy as np
+import pandas as pd
+
+
+def make_students(n_students: int, seed: int = 42, skewed: bool = False) -> pd.DataFrame:
+    '''
+    Random students with the features of params. With `skewed`, unit counts
+    are geometric, so some categories fall under the rare label tolerance
+    '''
+    rng = np.random.default_rng(seed)
+    students = pd.DataFrame(
+        {
+            'GDP': rng.choice([1.74, 0.32, -1.7, -3.12, 0.79, 2.02, -4.06], n_students),
+            'Inflation rate': rng.choice([1.4, 2.6, 3.7, -0.8, 0.5, 0.3], n_students),
+            'Tuition fees up to date': rng.integers(0, 2, n_students),
+            'Scholarship holder': rng.integers(0, 2, n_students),
+        }
+    )
+    units = (
+        np.minimum(rng.geometric(0.25, (n_students, 3)) - 1, 20)
+        if skewed
+        else rng.integers(0, 10, (n_students, 3))
+    )
+    students['Curricular units 1st sem (approved)'] = units[:, 0]
+    students['Curricular units 1st sem (enrolled)'] = units[:, 1]
+    students['Curricular units 2nd sem (approved)'] = units[:, 2]
+    return students
+
+
+def make_target(students: pd.DataFrame, noise: float = 0.0, seed: int = 0) -> pd.Series:
+    '''
+    Graduate when enough units of the 2nd semester were approved, with
+    optional gaussian noise so the trees have something to overfit
+    '''
+    rng = np.random.default_rng(seed)
+    approved = students['Curricular units 2nd sem (approved)'] + rng.normal(
+        0, noise, len(students)
+    )
+    return pd.Series(
+        np.where(approved > 4, 'Graduate', 'Dropout'), index=students.index, name='Target'
+    )
@@ -0,0 +1,206 @@
+'''
+Score a whole CSV, Parquet or Arrow IPC file with the served model:
+
+    python batch_score.py students.csv predictions.parquet --chunk-size 50000 --workers 4
+
+The input is read in chunks and every chunk is scored with one vectorized call,
+in this process or in a pool of worker processes. Predictions are appended to
+the output Parquet file one row group per chunk, so memory use depends on the
+chunk size and the number of workers, not on the size of the input.
+'''
+
+import os
+import time
+import logging
+import argparse
+import resource
+from typing import Dict, Tuple, Iterator, Optional
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import model
+import mlflow
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config.params import params
+
+BATCH_SCORE_CHUNK_SIZE = int(os.getenv('BATCH_SCORE_CHUNK_SIZE', '50000'))
+MLFLOW_TRACKING_URI = os.getenv('MLFLOW_TRACKING_URI')
+
+PREDICTION_COLUMN = 'prediction'
+FEATURES = params['features']['numerical'] + params['features']['categorical']
+
+_worker_service: Optional[model.ModelService] = None
+
+
+def read_chunks(path: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    path = Path(path)
+
+    if path.suffix == '.parquet':
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif path.suffix == '.arrow':
+        # Splits of the preprocessed dataset, memory-mapped and read without a copy
+        with pa.memory_map(str(path)) as source:
+            table = pa.ipc.open_file(source).read_all()
+            for batch in table.to_batches(max_chunksize=chunk_size):
+                yield batch.to_pandas()
+    elif path.suffix == '.csv':
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    else:
+        raise ValueError(
+            f'Unsupported input format {path.suffix}, use .csv, .parquet or .arrow'
+        )
+
+
+def serving_artifacts(artifacts: Tuple) -> Tuple:
+    '''
+    Model, label encoder and run_id only, workers do not need the reference data
+    '''
+    scoring_model, label_encoder, *_ = artifacts
+    return scoring_model, label_encoder, None, artifacts[-1]
+
+
+def init_worker(artifacts: Tuple) -> None:
+    # pylint: disable=global-statement
+    global _worker_service
+    _worker_service = model.ModelService(artifacts)
+
+
+def score_chunk(chunk: pd.DataFrame, model_service=None) -> pd.DataFrame:
+    model_service = model_service or _worker_service
+    # Other columns (e.g. student ids) are only copied to the output
+    predictions = model_service.predict_frame(chunk[FEATURES])
+    return chunk.assign(**{PREDICTION_COLUMN: predictions})
+
+
+class ParquetAppender:
+    '''
+    Appends DataFrames as row groups, cast to the schema of the first one
+    '''
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.writer: Optional[pq.ParquetWriter] = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            # CSV chunks may infer int for a column another chunk reads as float
+            table = table.cast(self.writer.schema)
+
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+def score_file(
+    input_path: Path,
+    output_path: Path,
+    artifacts: Tuple,
+    *,
+    chunk_size: int = BATCH_SCORE_CHUNK_SIZE,
+    workers: int = 0,
+) -> Dict:
+    '''
+    Score `input_path` into `output_path` and return the throughput report.
+    With `workers` > 0, at most two chunks per worker are in memory at a time.
+    '''
+    artifacts = serving_artifacts(artifacts)
+    appender = ParquetAppender(output_path)
+    rows, chunks = 0, 0
+    start = time.perf_counter()
+
+    def write(scored: pd.DataFrame) -> None:
+        nonlocal rows, chunks
+        appender.write(scored)
+        rows, chunks = rows + len(scored), chunks + 1
+        logging.info('Scored %d rows in %d chunks', rows, chunks)
+
+    try:
+        if workers <= 0:
+            model_service = model.ModelService(artifacts)
+            for chunk in read_chunks(input_path, chunk_size):
+                write(score_chunk(chunk, model_service))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=init_worker, initargs=(artifacts,)
+            ) as executor:
+                pending = deque()
+                for chunk in read_chunks(input_path, chunk_size):
+                    pending.append(executor.submit(score_chunk, chunk))
+
+                    # Results are written in input order
+                    if len(pending) >= 2 * workers:
+                        write(pending.popleft().result())
+
+                while pending:
+                    write(pending.popleft().result())
+    finally:
+        appender.close()
+
+    seconds = time.perf_counter() - start
+
+    return {
+        'run_id': artifacts[-1],
+        'rows': rows,
+        'chunks': chunks,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds else 0.0,
+        'max_rss_mb': max_rss_mb(resource.RUSAGE_SELF),
+        # Largest worker process, the pool is joined once every chunk is written
+        'max_worker_rss_mb': max_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def max_rss_mb(who: int) -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        'input', type=Path, help='CSV, Parquet or Arrow file of students'
+    )
+    arg_parser.add_argument('output', type=Path, help='Parquet file for the predictions')
+    arg_parser.add_argument('--chunk-size', default=BATCH_SCORE_CHUNK_SIZE, type=int)
+    arg_parser.add_argument(
+        '--workers', default=0, type=int, help='Worker processes, 0 scores in-process'
+    )
+
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if MLFLOW_TRACKING_URI is not None:
+        mlflow.set_tracking_uri(
+            f"http://{MLFLOW_TRACKING_URI}:{params['mlflow']['port']}"
+        )
+
+    report = score_file(
+        args.input,
+        args.output,
+        model.load_artifacts(),
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+    )
+
+    print(
+        f"Scored {report['rows']} rows with run_id={report['run_id']} "
+        f"in {report['seconds']}s: {report['rows_per_second']} rows/s, "
+        f"max RSS {report['max_rss_mb']} MB, per worker {report['max_worker_rss_mb']} MB"
+    )
+
+
+if __name__ == '__main__':
+    main()
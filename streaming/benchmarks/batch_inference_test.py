@@ -0,0 +1,63 @@
+import json
+import time
+from base64 import b64encode
+
+import model
+import pytest
+
+BATCH_SIZE = 500
+
+
+def kinesis_event(students) -> dict:
+    return {
+        'Records': [
+            {
+                'kinesis': {
+                    'data': b64encode(
+                        json.dumps(
+                            {'student_features': features, 'student_id': student_id}
+                        ).encode('utf-8')
+                    ).decode('utf-8')
+                }
+            }
+            for student_id, features in enumerate(students.to_dict('records'))
+        ]
+    }
+
+
+def test_batched_predictions_match_per_record(artifacts_fixture, students_fixture):
+    batch = students_fixture.head(BATCH_SIZE)
+    model_service = model.ModelService(artifacts_fixture)
+
+    per_record = [
+        model_service.predict(features) for features in batch.to_dict('records')
+    ]
+    output = model_service.lambda_handler(kinesis_event(batch))
+
+    assert [
+        event['prediction']['output'] for event in output['predictions']
+    ] == per_record
+
+
+@pytest.mark.timing
+def test_batched_vs_per_record_throughput(artifacts_fixture, students_fixture):
+    batch = students_fixture.head(BATCH_SIZE)
+    model_service = model.ModelService(artifacts_fixture)
+
+    start = time.perf_counter()
+    for features in batch.to_dict('records'):
+        model_service.predict(features)
+    per_record_seconds = time.perf_counter() - start
+
+    event = kinesis_event(batch)
+    start = time.perf_counter()
+    model_service.lambda_handler(event)
+    batched_seconds = time.perf_counter() - start
+
+    print(
+        f'\nper-record: {BATCH_SIZE / per_record_seconds:,.0f} records/s, '
+        f'batched: {BATCH_SIZE / batched_seconds:,.0f} records/s, '
+        f'speed-up: {per_record_seconds / batched_seconds:.1f}x'
+    )
+
+    assert batched_seconds < per_record_seconds
@@ -0,0 +1,37 @@
+import pandas as pd
+from batch_score import score_file
+
+from shared.testing import make_students
+from shared.compiled_model import CompiledModel
+
+N_STUDENTS = 200_000
+CHUNK_SIZE = 20_000
+
+
+def test_batch_score_throughput(tmp_path, artifacts_fixture):
+    input_path = tmp_path / 'students.parquet'
+    make_students(N_STUDENTS, seed=7).to_parquet(input_path, index=False)
+
+    # The sklearn pipeline spends most of its time in MathFeatures' row-wise mean,
+    # the compiled model shows the throughput of the scoring loop itself
+    pipeline, *rest = artifacts_fixture
+    artifacts = (CompiledModel.from_pipeline(pipeline), *rest)
+
+    for workers in [0, 2]:
+        output_path = tmp_path / f'predictions-{workers}.parquet'
+        report = score_file(
+            input_path,
+            output_path,
+            artifacts,
+            chunk_size=CHUNK_SIZE,
+            workers=workers,
+        )
+
+        print(
+            f"\nworkers={workers}: {report['rows_per_second']:,.0f} rows/s, "
+            f"{report['seconds']}s, max RSS {report['max_rss_mb']} MB, "
+            f"per worker {report['max_worker_rss_mb']} MB"
+        )
+
+        assert report['rows'] == N_STUDENTS
+        assert len(pd.read_parquet(output_path, columns=['prediction'])) == N_STUDENTS
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import pickle
+import subprocess
+from pathlib import Path
+
+import mlflow
+import pytest
+
+from shared.reference_profile import (
+    REFERENCE_FILE_NAME,
+    LABEL_ENCODER_FILE_NAME,
+    save_reference_dataset,
+)
+
+STREAMING_DIRECTORY = Path(__file__).parent.parent
+
+COLD_START_BUDGET_SECONDS = float(os.getenv('COLD_START_BUDGET_SECONDS', '10'))
+
+
+@pytest.fixture(name='local_model', scope='module')
+def local_model_fixture(tmp_path_factory, artifacts_fixture):
+    '''
+    Model and artifacts laid out like the integration test volumes
+    '''
+    pipeline, label_encoder, train_dataset, _ = artifacts_fixture
+    directory = tmp_path_factory.mktemp('cold-start')
+
+    mlflow.sklearn.save_model(
+        pipeline, directory / 'model', serialization_format='cloudpickle'
+    )
+    (directory / 'artifacts').mkdir()
+    with open(directory / 'artifacts' / LABEL_ENCODER_FILE_NAME, 'wb') as file:
+        pickle.dump(label_encoder, file)
+    save_reference_dataset(train_dataset, directory / 'artifacts' / REFERENCE_FILE_NAME)
+
+    return directory
+
+
+def cold_start(code: str, env: dict) -> float:
+    env = (
+        os.environ
+        | env
+        | {
+            'PYTHONPATH': os.pathsep.join(
+                [str(STREAMING_DIRECTORY), str(STREAMING_DIRECTORY.parent)]
+            )
+        }
+    )
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def test_cold_start_budget(local_model):
+    env = {
+        'MODEL_LOCATION': str(local_model / 'model'),
+        'ARTIFACT_LOCATION': str(local_model / 'artifacts'),
+    }
+
+    interpreter_seconds = cold_start('pass', env)
+    import_seconds = cold_start('import model', env)
+    init_seconds = cold_start('import model; model.init(None, test_run=True)', env)
+
+    print(
+        f'\ninterpreter: {interpreter_seconds:.2f}s, import model: {import_seconds:.2f}s, '
+        f'import + load artifacts: {init_seconds:.2f}s '
+        f'(budget {COLD_START_BUDGET_SECONDS:.1f}s)'
+    )
+
+    assert init_seconds < COLD_START_BUDGET_SECONDS
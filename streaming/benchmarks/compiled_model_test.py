@@ -0,0 +1,42 @@
+import time
+
+import numpy as np
+
+from shared.compiled_model import CompiledModel
+
+REPEATS = 50
+BATCH_SIZES = [1, 500]
+
+
+def latency(predict, features, repeats: int = REPEATS) -> float:
+    '''
+    Median seconds per call
+    '''
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(features)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def test_compiled_vs_pipeline_latency(tmp_path, artifacts_fixture, students_fixture):
+    pipeline, *_ = artifacts_fixture
+    CompiledModel.from_pipeline(pipeline).save(tmp_path / 'serving')
+    compiled_model = CompiledModel.load(tmp_path / 'serving')
+
+    for batch_size in BATCH_SIZES:
+        batch = students_fixture.head(batch_size)
+
+        assert (compiled_model.predict(batch) == pipeline.predict(batch)).all()
+
+        pipeline_seconds = latency(pipeline.predict, batch)
+        compiled_seconds = latency(compiled_model.predict, batch)
+
+        print(
+            f'\nbatch_size={batch_size} pipeline: {pipeline_seconds * 1e3:.3f} ms, '
+            f'compiled: {compiled_seconds * 1e3:.3f} ms, '
+            f'speed-up: {pipeline_seconds / compiled_seconds:.1f}x'
+        )
+
+        assert compiled_seconds < pipeline_seconds
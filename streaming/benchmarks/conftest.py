@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from xgboost import XGBClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from config.params import params
+from shared.testing import make_students
+from orchestration.common import pipeline_definition
+
+N_STUDENTS = 5000
+
+
+@pytest.fixture(scope='session')
+def students_fixture() -> pd.DataFrame:
+    return make_students(N_STUDENTS)
+
+
+@pytest.fixture(scope='session')
+def artifacts_fixture():
+    '''
+    Same artifacts layout as model.load_artifacts, with a pipeline fitted on synthetic data
+    '''
+    students = make_students(N_STUDENTS)
+    target = np.where(
+        students['Curricular units 2nd sem (approved)']
+        + 2 * students['Tuition fees up to date']
+        > 5,
+        'Graduate',
+        'Dropout',
+    )
+    label_encoder = LabelEncoder()
+    y_train = label_encoder.fit_transform(target)
+
+    hyperparams = {'n_estimators': 100, 'max_depth': 6, 'random_state': 42}
+    pipeline = pipeline_definition(
+        XGBClassifier, params['features'], 'XGBClassifier', hyperparams
+    )
+    pipeline.fit(students, y_train)
+
+    train_dataset = students.assign(
+        prediction=label_encoder.inverse_transform(pipeline.predict(students))
+    )
+    return pipeline, label_encoder, train_dataset, 'benchmark'
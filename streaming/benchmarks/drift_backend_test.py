@@ -0,0 +1,37 @@
+import time
+
+from native_drift import NativeDriftBackend
+from evidently_report import EvidentlyDriftBackend
+
+from config.params import params
+from shared.reference_profile import ReferenceData
+
+N_WINDOWS = 5
+
+
+def time_backend(backend, reference, window) -> float:
+    start = time.perf_counter()
+    for _ in range(N_WINDOWS):
+        metrics = backend.get_metrics(reference, window)
+    assert metrics.keys()
+    return (time.perf_counter() - start) / N_WINDOWS
+
+
+def test_native_vs_evidently_backend(artifacts_fixture):
+    *_, train_dataset, _ = artifacts_fixture
+    reference = ReferenceData(train_dataset, params['features'])
+    window = train_dataset.sample(500, random_state=1)
+
+    # Build the profile outside the timed section, as it is logged at training time
+    assert reference.profile
+
+    evidently_seconds = time_backend(EvidentlyDriftBackend(), reference, window)
+    native_seconds = time_backend(NativeDriftBackend(), reference, window)
+
+    print(
+        f'\nevidently: {evidently_seconds * 1000:.1f} ms/window, '
+        f'native: {native_seconds * 1000:.1f} ms/window, '
+        f'speed-up: {evidently_seconds / native_seconds:.1f}x'
+    )
+
+    assert native_seconds < evidently_seconds
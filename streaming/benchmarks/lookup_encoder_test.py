@@ -0,0 +1,37 @@
+import time
+
+from feature_engine.encoding import RareLabelEncoder, CountFrequencyEncoder
+
+from config.params import params
+from shared.lookup_encoder import LookupEncoder
+
+REPEATS = 20
+
+
+def test_lookup_vs_feature_engine_encoding(students_fixture):
+    variables = params['features']['categorical']
+
+    rare_label_encoder = RareLabelEncoder(
+        variables=variables, ignore_format=True, tol=0.05
+    )
+    count_encoder = CountFrequencyEncoder(variables=variables)
+    count_encoder.fit(rare_label_encoder.fit_transform(students_fixture))
+    lookup_encoder = LookupEncoder(variables=variables, tol=0.05).fit(students_fixture)
+
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        count_encoder.transform(rare_label_encoder.transform(students_fixture))
+    feature_engine_seconds = (time.perf_counter() - start) / REPEATS
+
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        lookup_encoder.transform(students_fixture)
+    lookup_seconds = (time.perf_counter() - start) / REPEATS
+
+    print(
+        f'\n{len(students_fixture)} rows feature-engine: {feature_engine_seconds * 1e3:.2f} ms, '
+        f'lookup: {lookup_seconds * 1e3:.2f} ms, '
+        f'speed-up: {feature_engine_seconds / lookup_seconds:.1f}x'
+    )
+
+    assert lookup_seconds < feature_engine_seconds
@@ -0,0 +1,68 @@
+import time
+
+import model
+import pytest
+from stage_metrics import StageMetrics
+
+from .batch_inference_test import BATCH_SIZE, kinesis_event
+
+ROUNDS = 20
+
+
+def handler_seconds(model_service: model.ModelService, event: dict) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        model_service.lambda_handler(event)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def test_stage_metrics_do_not_change_predictions(artifacts_fixture, students_fixture):
+    event = kinesis_event(students_fixture.head(BATCH_SIZE))
+    emitted = []
+
+    disabled = model.ModelService(artifacts_fixture)
+    enabled = model.ModelService(
+        artifacts_fixture,
+        stage_metrics=StageMetrics([lambda histograms, _: emitted.append(histograms)]),
+    )
+
+    assert enabled.lambda_handler(event) == disabled.lambda_handler(event)
+    assert len(emitted) == 1
+    assert {'decode', 'predict', 'batch'} <= emitted[0].keys()
+    assert emitted[0]['batch'].count == 1
+
+
+@pytest.mark.timing
+def test_stage_metrics_overhead(artifacts_fixture, students_fixture):
+    event = kinesis_event(students_fixture.head(BATCH_SIZE))
+    emitted = []
+
+    disabled = model.ModelService(artifacts_fixture)
+    enabled = model.ModelService(
+        artifacts_fixture,
+        stage_metrics=StageMetrics([lambda histograms, _: emitted.append(histograms)]),
+    )
+
+    # Warm up both paths before measuring
+    disabled.lambda_handler(event)
+    enabled.lambda_handler(event)
+
+    disabled_seconds = handler_seconds(disabled, event)
+    enabled_seconds = handler_seconds(enabled, event)
+
+    timer = StageMetrics()
+    start = time.perf_counter()
+    for _ in range(100_000):
+        with timer.stage('predict'):
+            pass
+    disabled_timer_ns = (time.perf_counter() - start) / 100_000 * 1e9
+
+    print(
+        f'\nbatch of {BATCH_SIZE}: disabled {disabled_seconds * 1000:.2f} ms, '
+        f'enabled {enabled_seconds * 1000:.2f} ms, '
+        f'disabled timer {disabled_timer_ns:.0f} ns'
+    )
+    print({name: h.summary()['max_ms'] for name, h in emitted[-1].items()})
+
+    assert disabled_timer_ns < 2000
+    assert enabled_seconds < disabled_seconds * 1.1
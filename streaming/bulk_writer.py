@@ -0,0 +1,84 @@
+import io
+import os
+import csv
+import time
+import logging
+import threading
+from typing import Dict, List, Callable
+
+import pandas as pd
+
+BULK_WRITE_BATCH_SIZE = int(os.getenv('BULK_WRITE_BATCH_SIZE', '500'))
+
+
+def copy_from_stdin(table, conn, keys, data_iter) -> int:
+    '''
+    pandas.to_sql insertion method streaming the rows through Postgres COPY
+    '''
+    buffer = io.StringIO()
+    rows = list(data_iter)
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    columns = ', '.join(f'"{key}"' for key in keys)
+    table_name = f'"{table.schema}"."{table.name}"' if table.schema else f'"{table.name}"'
+
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {table_name} ({columns}) FROM STDIN WITH CSV', buffer)
+
+    return len(rows)
+
+
+class BulkWriter:
+    '''
+    Buffers rows per table and writes each buffer in a single round trip,
+    either when it reaches `batch_size` rows or on `flush`.
+    '''
+
+    def __init__(
+        self,
+        get_engine: Callable,
+        batch_size: int = BULK_WRITE_BATCH_SIZE,
+        *,
+        stage_metrics=None,
+    ) -> None:
+        self.get_engine = get_engine
+        self.batch_size = batch_size
+        # Optional StageMetrics, not imported here to keep the module standalone
+        self.stage_metrics = stage_metrics
+        self.lock = threading.Lock()
+        self.buffers: Dict[str, List[Dict]] = {}
+
+    def write(self, table_name: str, row: Dict) -> None:
+        with self.lock:
+            buffer = self.buffers.setdefault(table_name, [])
+            buffer.append(row)
+
+            if len(buffer) < self.batch_size:
+                return
+
+            rows = self.buffers.pop(table_name)
+
+        self.write_rows(table_name, rows)
+
+    def flush(self) -> None:
+        with self.lock:
+            buffers, self.buffers = self.buffers, {}
+
+        for table_name, rows in buffers.items():
+            self.write_rows(table_name, rows)
+
+    def write_rows(self, table_name: str, rows: List[Dict]) -> None:
+        engine = self.get_engine()
+
+        # COPY is Postgres only, other dialects get a multi-row INSERT
+        method = copy_from_stdin if engine.dialect.name == 'postgresql' else 'multi'
+
+        start = time.perf_counter()
+        pd.DataFrame(rows).to_sql(
+            table_name, engine, if_exists='append', index=False, method=method
+        )
+
+        if self.stage_metrics is not None:
+            self.stage_metrics.record('postgres_write', time.perf_counter() - start)
+        logging.info('Wrote %d rows into %s', len(rows), table_name)
@@ -0,0 +1,180 @@
+'''
+Resolve a registered model once and write it, with its artifacts, into a
+versioned local directory the service can load without network access:
+
+    <output>/<run_id>/model/...          MLflow model
+    <output>/<run_id>/artifacts/...      label encoder and reference data
+    <output>/<run_id>/manifest.json      run_id and SHA-256 of every file
+    <output>/CURRENT                     run_id of the bundle to serve
+'''
+
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+from typing import Dict, Tuple
+from pathlib import Path
+from datetime import datetime, timezone
+
+import mlflow
+from mlflow.models import Model
+
+from config.params import params
+
+MANIFEST_FILE_NAME = 'manifest.json'
+CURRENT_FILE_NAME = 'CURRENT'
+
+MLFLOW_TRACKING_URI: str = os.getenv('MLFLOW_TRACKING_URI')
+
+
+class BundleError(Exception):
+    pass
+
+
+def sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checksums(directory: Path) -> Dict[str, str]:
+    return {
+        path.relative_to(directory).as_posix(): sha256(path)
+        for path in sorted(directory.rglob('*'))
+        if path.is_file() and path.name != MANIFEST_FILE_NAME
+    }
+
+
+def create_bundle(
+    model_path: Path, artifact_path: Path, output: Path, model_uri: str
+) -> Path:
+    '''
+    Copy an already downloaded model and its artifacts into a new bundle version
+    '''
+    run_id = Model.load(Path(model_path) / 'MLmodel').run_id
+    version_directory = Path(output) / run_id
+
+    if version_directory.exists():
+        shutil.rmtree(version_directory)
+
+    shutil.copytree(model_path, version_directory / 'model')
+    shutil.copytree(artifact_path, version_directory / 'artifacts')
+
+    manifest = {
+        'model_uri': model_uri,
+        'run_id': run_id,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'files': checksums(version_directory),
+    }
+    with open(version_directory / MANIFEST_FILE_NAME, 'wt', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+
+    # Switch the served version only once the bundle is complete
+    current_file = Path(output) / CURRENT_FILE_NAME
+    temporary_file = current_file.with_suffix('.tmp')
+    temporary_file.write_text(run_id, encoding='utf-8')
+    temporary_file.replace(current_file)
+
+    return version_directory
+
+
+def bundle_model(model_uri: str, output: Path) -> Path:
+    with tempfile.TemporaryDirectory() as directory:
+        print(f'Downloading {model_uri}')
+        model_path = mlflow.artifacts.download_artifacts(
+            model_uri, dst_path=str(Path(directory) / 'model')
+        )
+        run_id = Model.load(Path(model_path) / 'MLmodel').run_id
+
+        print(f'Downloading artifacts of run {run_id}')
+        artifact_path = mlflow.artifacts.download_artifacts(
+            f'runs:/{run_id}/artifacts/', dst_path=str(Path(directory) / 'artifacts')
+        )
+
+        return create_bundle(model_path, artifact_path, output, model_uri)
+
+
+def resolve_version(bundle_path: Path) -> Path:
+    '''
+    Accept either a bundle root holding CURRENT or a version directory
+    '''
+    bundle_path = Path(bundle_path)
+
+    if (bundle_path / MANIFEST_FILE_NAME).exists():
+        return bundle_path
+
+    current_file = bundle_path / CURRENT_FILE_NAME
+    if not current_file.exists():
+        raise BundleError(f'No bundle found in {bundle_path}')
+
+    return bundle_path / current_file.read_text(encoding='utf-8').strip()
+
+
+def read_manifest(version_directory: Path) -> Dict:
+    with open(version_directory / MANIFEST_FILE_NAME, 'rt', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def verify_bundle(version_directory: Path, manifest: Dict) -> None:
+    found = checksums(version_directory)
+
+    if found != manifest['files']:
+        changed = sorted(
+            name
+            for name in set(found) | set(manifest['files'])
+            if found.get(name) != manifest['files'].get(name)
+        )
+        raise BundleError(f'Checksum mismatch in {version_directory}: {changed}')
+
+    run_id = Model.load(version_directory / 'model' / 'MLmodel').run_id
+    if run_id != manifest['run_id']:
+        raise BundleError(
+            f'Bundle manifest is for {manifest["run_id"]}, model is {run_id}'
+        )
+
+
+def load_bundle(bundle_path: Path, verify: bool = True, load_model: bool = True) -> Tuple:
+    '''
+    Return the model (None when `load_model` is False), the artifact directory
+    and the run_id of a bundle, no network involved
+    '''
+    version_directory = resolve_version(bundle_path)
+    manifest = read_manifest(version_directory)
+
+    if verify:
+        verify_bundle(version_directory, manifest)
+
+    model = None
+    if load_model:
+        model = mlflow.pyfunc.load_model(str(version_directory / 'model'))
+
+    print(f"Serving bundled run_id={manifest['run_id']} from {version_directory}")
+
+    return model, version_directory / 'artifacts', manifest['run_id']
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        '--stage', default='Staging', help='Registry stage of the model to bundle'
+    )
+    arg_parser.add_argument(
+        '--output', default='bundle', type=Path, help='Root directory of the bundles'
+    )
+
+    args = arg_parser.parse_args()
+
+    mlflow.set_tracking_uri(f"http://{MLFLOW_TRACKING_URI}:{params['mlflow']['port']}")
+
+    model_uri = f"models:/{params['model_name']}/{args.stage}"
+    version_directory = bundle_model(model_uri, args.output)
+
+    print(f'Bundle written to {version_directory}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+'''
+Long-running Kinesis consumer, an alternative to the Lambda trigger for
+sustained load. Every shard of the input stream is read by its own worker
+thread with GetRecords, each batch goes through ModelService.handle_events
+and the last processed sequence number per shard is checkpointed to a local
+JSON file, so a restarted consumer resumes where it stopped.
+
+A failed batch is read again from the checkpoint, up to CONSUMER_MAX_RETRIES
+times. Beyond that every shard stops and the consumer exits with the error,
+so it can be restarted by its supervisor.
+'''
+
+import os
+import json
+import time
+import signal
+import logging
+import threading
+from typing import Dict, List, Optional
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import model
+import mlflow
+
+from config.params import params
+
+PREDICTIONS_INPUT_STREAM = os.getenv('PREDICTIONS_INPUT_STREAM')
+PREDICTIONS_OUTPUT_STREAM = os.getenv('PREDICTIONS_OUTPUT_STREAM')
+TEST_RUN = os.getenv('TEST_RUN', 'False') == 'True'
+MLFLOW_TRACKING_URI = os.getenv('MLFLOW_TRACKING_URI')
+
+# GetRecords returns at most 10000 records and is limited to 5 calls/s per shard
+CONSUMER_GET_RECORDS_LIMIT = int(os.getenv('CONSUMER_GET_RECORDS_LIMIT', '1000'))
+CONSUMER_POLL_SECONDS = float(os.getenv('CONSUMER_POLL_SECONDS', '1'))
+CONSUMER_CHECKPOINT_PATH = os.getenv('CONSUMER_CHECKPOINT_PATH', 'checkpoints.json')
+# Where shards without a checkpoint start: LATEST or TRIM_HORIZON
+CONSUMER_START_POSITION = os.getenv('CONSUMER_START_POSITION', 'LATEST')
+# Attempts of a failing batch after the first one, waiting poll_seconds * 2**n between them
+CONSUMER_MAX_RETRIES = int(os.getenv('CONSUMER_MAX_RETRIES', '3'))
+
+
+class CheckpointStore:
+    '''
+    Last processed sequence number per shard, rewritten atomically on every update
+    '''
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.checkpoints: Dict[str, str] = {}
+
+        if self.path.exists():
+            with open(self.path, 'rt', encoding='utf-8') as file:
+                self.checkpoints = json.load(file)
+
+    def get(self, shard_id: str) -> Optional[str]:
+        with self.lock:
+            return self.checkpoints.get(shard_id)
+
+    def set(self, shard_id: str, sequence_number: str) -> None:
+        with self.lock:
+            self.checkpoints[shard_id] = sequence_number
+
+            temporary_file = self.path.with_suffix('.tmp')
+            with open(temporary_file, 'wt', encoding='utf-8') as file:
+                json.dump(self.checkpoints, file)
+            temporary_file.replace(self.path)
+
+
+class ShardWorker:
+    '''
+    Reads one shard until it is closed or the consumer stops
+    '''
+
+    # pylint: disable=too-many-arguments,too-many-instance-attributes
+    def __init__(
+        self,
+        kinesis_client,
+        stream_name: str,
+        shard_id: str,
+        model_service: model.ModelService,
+        checkpoints: CheckpointStore,
+        *,
+        stopped: threading.Event,
+        limit: int = CONSUMER_GET_RECORDS_LIMIT,
+        poll_seconds: float = CONSUMER_POLL_SECONDS,
+        start_position: str = CONSUMER_START_POSITION,
+        max_retries: int = CONSUMER_MAX_RETRIES,
+    ) -> None:
+        self.kinesis_client = kinesis_client
+        self.stream_name = stream_name
+        self.shard_id = shard_id
+        self.model_service = model_service
+        self.checkpoints = checkpoints
+        self.stopped = stopped
+        self.limit = limit
+        self.poll_seconds = poll_seconds
+        self.start_position = start_position
+        self.max_retries = max_retries
+        self.records_processed = 0
+
+    def shard_iterator(self) -> str:
+        sequence_number = self.checkpoints.get(self.shard_id)
+
+        if sequence_number is None:
+            position = {'ShardIteratorType': self.start_position}
+        else:
+            position = {
+                'ShardIteratorType': 'AFTER_SEQUENCE_NUMBER',
+                'StartingSequenceNumber': sequence_number,
+            }
+
+        return self.kinesis_client.get_shard_iterator(
+            StreamName=self.stream_name, ShardId=self.shard_id, **position
+        )['ShardIterator']
+
+    def process(self, records: List[Dict]) -> None:
+        student_events = [json.loads(record['Data']) for record in records]
+        self.model_service.handle_events(student_events)
+
+        # Only checkpoint once the whole batch has been predicted and published
+        self.checkpoints.set(self.shard_id, records[-1]['SequenceNumber'])
+        self.records_processed += len(records)
+
+    def run(self) -> int:
+        try:
+            return self.read()
+        except Exception:
+            logging.exception('Shard %s failed, stopping the consumer', self.shard_id)
+            # The other shards stop too, so Consumer.run returns and raises the error
+            self.stopped.set()
+            raise
+
+    def read(self) -> int:
+        shard_iterator = self.shard_iterator()
+        failures = 0
+
+        while shard_iterator is not None and not self.stopped.is_set():
+            try:
+                result = self.kinesis_client.get_records(
+                    ShardIterator=shard_iterator, Limit=self.limit
+                )
+            except self.kinesis_client.exceptions.ExpiredIteratorException:
+                shard_iterator = self.shard_iterator()
+                continue
+            except self.kinesis_client.exceptions.ProvisionedThroughputExceededException:
+                logging.warning('Throughput exceeded on %s, backing off', self.shard_id)
+                self.stopped.wait(self.poll_seconds)
+                continue
+
+            if result['Records']:
+                try:
+                    self.process(result['Records'])
+                except Exception:  # pylint: disable=broad-exception-caught
+                    failures += 1
+                    if failures > self.max_retries:
+                        raise
+
+                    logging.exception(
+                        'Batch of %s failed, retrying from the checkpoint (%d/%d)',
+                        self.shard_id,
+                        failures,
+                        self.max_retries,
+                    )
+                    # Records published before the failure are published again
+                    self.stopped.wait(self.poll_seconds * 2**failures)
+                    shard_iterator = self.shard_iterator()
+                    continue
+
+                failures = 0
+
+            shard_iterator = result.get('NextShardIterator')
+
+            # Caught up with the shard, wait for new records
+            if not result['Records'] or not result.get('MillisBehindLatest', 0):
+                self.stopped.wait(self.poll_seconds)
+
+        logging.info(
+            'Shard %s stopped after %d records', self.shard_id, self.records_processed
+        )
+        return self.records_processed
+
+
+class Consumer:
+    '''
+    One ShardWorker thread per shard. Shards created by resharding are only
+    picked up on the next start.
+    '''
+
+    def __init__(
+        self,
+        kinesis_client,
+        stream_name: str,
+        model_service: model.ModelService,
+        checkpoints: CheckpointStore,
+        **worker_options,
+    ) -> None:
+        self.kinesis_client = kinesis_client
+        self.stream_name = stream_name
+        self.model_service = model_service
+        self.checkpoints = checkpoints
+        self.worker_options = worker_options
+        self.stopped = threading.Event()
+
+    def list_shards(self) -> List[str]:
+        shard_ids = []
+        request = {'StreamName': self.stream_name}
+
+        while True:
+            response = self.kinesis_client.list_shards(**request)
+            shard_ids.extend(shard['ShardId'] for shard in response['Shards'])
+
+            if 'NextToken' not in response:
+                return shard_ids
+
+            request = {'NextToken': response['NextToken']}
+
+    def run(self) -> int:
+        '''
+        Read every shard in parallel until all are closed or `stop` is called
+        '''
+        shard_ids = self.list_shards()
+        logging.info('Consuming %d shards of %s', len(shard_ids), self.stream_name)
+
+        workers = [
+            ShardWorker(
+                self.kinesis_client,
+                self.stream_name,
+                shard_id,
+                self.model_service,
+                self.checkpoints,
+                stopped=self.stopped,
+                **self.worker_options,
+            )
+            for shard_id in shard_ids
+        ]
+
+        with ThreadPoolExecutor(
+            max_workers=max(len(workers), 1), thread_name_prefix='shard'
+        ) as executor:
+            futures = [executor.submit(worker.run) for worker in workers]
+            # A failed shard stops the others, its error is raised once all returned
+            return sum(future.result() for future in futures)
+
+    def stop(self, *_) -> None:
+        self.stopped.set()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    if MLFLOW_TRACKING_URI is not None:
+        mlflow.set_tracking_uri(
+            f"http://{MLFLOW_TRACKING_URI}:{params['mlflow']['port']}"
+        )
+
+    model_service = model.init(PREDICTIONS_OUTPUT_STREAM, TEST_RUN)
+    consumer = Consumer(
+        model.create_kinesis_client(),
+        PREDICTIONS_INPUT_STREAM,
+        model_service,
+        CheckpointStore(CONSUMER_CHECKPOINT_PATH),
+    )
+
+    signal.signal(signal.SIGTERM, consumer.stop)
+    signal.signal(signal.SIGINT, consumer.stop)
+
+    start = time.perf_counter()
+    records = consumer.run()
+    logging.info('Processed %d records in %.1fs', records, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
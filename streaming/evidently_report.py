@@ -43,3 +43,28 @@ class EvidentlyReport:
         )
 
         return report.as_dict()['metrics']
+
+
+class EvidentlyDriftBackend:
+    def get_metrics(self, reference, current_data: pd.DataFrame) -> Dict:
+        evidentlyReport = EvidentlyReport(
+            numerical_features=reference.features['numerical'],
+            categorical_features=reference.features['categorical'],
+        )
+
+        metrics = evidentlyReport.get_evidently_metrics(reference.dataset, current_data)
+
+        metrics_dict = {
+            'drift_detected': metrics[0]['result']['drift_detected'],
+            'column_drift_metric': metrics[0]['result']['drift_score'],
+            'number_of_drifted_columns': metrics[1]['result'][
+                'number_of_drifted_columns'
+            ],
+            'current_share_of_missing_values': metrics[2]['result']['current'][
+                'share_of_missing_values'
+            ],
+            # Precomputed once per model version in the reference profile
+            'reference_share_of_missing_values': reference.share_of_missing_values,
+        }
+
+        return metrics_dict
@@ -1,15 +1,18 @@
 # pylint: disable= duplicate-code
 
 import os
-from typing import Dict
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
 from datetime import datetime
 
 import pytz
 import pandas as pd
-from sqlalchemy import create_engine
-from evidently_report import EvidentlyReport
+from bulk_writer import BulkWriter
 
 from config.params import params
+from shared.reference_profile import ReferenceData
 
 POSTGRES_HOSTNAME = os.getenv('POSTGRES_HOSTNAME', 'db')
 POSTGRES_USER = os.getenv('POSTGRES_USER')
@@ -19,57 +22,254 @@ POSTGRES_PORT = os.getenv('POSTGRES_PORT', '5432')
 
 psycopg_conn = f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOSTNAME}:{POSTGRES_PORT}/{POSTGRES_DB}'
 
+POSTGRES_POOL_SIZE = int(os.getenv('POSTGRES_POOL_SIZE', '4'))
+POSTGRES_MAX_OVERFLOW = int(os.getenv('POSTGRES_MAX_OVERFLOW', '4'))
+POSTGRES_POOL_PRE_PING = os.getenv('POSTGRES_POOL_PRE_PING', 'True') == 'True'
+POSTGRES_POOL_RECYCLE = int(os.getenv('POSTGRES_POOL_RECYCLE', '1800'))
+
+DRIFT_WINDOW_SIZE = int(os.getenv('DRIFT_WINDOW_SIZE', '500'))
+DRIFT_WINDOW_SECONDS = float(os.getenv('DRIFT_WINDOW_SECONDS', '60'))
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_stats_lock = threading.Lock()
+connection_stats = {'connections_opened': 0}
+
+# Columns added to the monitoring tables after their first release. pandas only
+# creates missing tables, existing ones are migrated when the engine is created.
+ADDED_COLUMNS = {'evidently_metrics': {'window_size': 'INTEGER'}}
+
+
+def _count_connection(*_) -> None:
+    with _stats_lock:
+        connection_stats['connections_opened'] += 1
+
+
+def migrate_tables(connection) -> None:
+    '''
+    Add the columns of ADDED_COLUMNS missing from tables created by an older
+    version of the service
+    '''
+    # pylint: disable=import-outside-toplevel
+    from sqlalchemy import text, inspect
+
+    inspector = inspect(connection)
+    # Concurrent workers may race to add the same column, PostgreSQL tolerates it
+    if_not_exists = 'IF NOT EXISTS ' if connection.dialect.name == 'postgresql' else ''
+
+    for table_name, columns in ADDED_COLUMNS.items():
+        if not inspector.has_table(table_name):
+            continue
+
+        existing = {column['name'] for column in inspector.get_columns(table_name)}
+        for column_name, column_type in columns.items():
+            if column_name not in existing:
+                connection.execute(
+                    text(
+                        f'ALTER TABLE {table_name} '
+                        f'ADD COLUMN {if_not_exists}{column_name} {column_type}'
+                    )
+                )
+
+
+def get_engine():
+    '''
+    Return the process-wide engine, created on first use and then shared by
+    worker threads and warm Lambda invocations
+    '''
+    # pylint: disable=global-statement,import-outside-toplevel
+    global _engine
+
+    from sqlalchemy import event, create_engine
+
+    with _engine_lock:
+        if _engine is None:
+            engine = create_engine(
+                psycopg_conn,
+                pool_size=POSTGRES_POOL_SIZE,
+                max_overflow=POSTGRES_MAX_OVERFLOW,
+                pool_pre_ping=POSTGRES_POOL_PRE_PING,
+                pool_recycle=POSTGRES_POOL_RECYCLE,
+            )
+            event.listen(engine, 'connect', _count_connection)
+
+            # Only cached once migrated, a failed migration is retried on next use
+            with engine.begin() as connection:
+                migrate_tables(connection)
+
+            _engine = engine
+
+        return _engine
+
+
+def dispose_engine() -> None:
+    # pylint: disable=global-statement
+    global _engine
+
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+
+
+class DriftWindow:
+    '''
+    Accumulates incoming rows until the window is closed by count or by age.
+    A non-positive `window_seconds` disables the time limit.
+
+    The window outlives a Kinesis batch: warm Lambda invocations and consumer
+    batches keep adding to it, so DRIFT_WINDOW_SIZE is not capped by the event
+    source batch size. An open window is reported by the first batch after it
+    expired. Lambda freezes and recycles environments without running exit
+    handlers, so there the rows of a window still open are not reported.
+    '''
+
+    def __init__(
+        self,
+        window_size: int = DRIFT_WINDOW_SIZE,
+        window_seconds: float = DRIFT_WINDOW_SECONDS,
+    ) -> None:
+        self.window_size = window_size
+        self.window_seconds = window_seconds
+        self.lock = threading.Lock()
+        self.rows: List[Dict] = []
+        self.started_at = time.monotonic()
+
+    def _expired(self) -> bool:
+        return 0 < self.window_seconds <= time.monotonic() - self.started_at
+
+    def _close(self) -> List[Dict]:
+        rows, self.rows = self.rows, []
+        return rows
+
+    def add(self, row: Dict) -> Optional[List[Dict]]:
+        '''
+        Return the rows of the window when `row` closes it, otherwise None
+        '''
+        with self.lock:
+            if not self.rows:
+                self.started_at = time.monotonic()
+
+            self.rows.append(row)
+
+            if len(self.rows) >= self.window_size or self._expired():
+                return self._close()
+
+        return None
+
+    def flush_expired(self) -> List[Dict]:
+        '''
+        Close the window if it is older than `window_seconds`, e.g. because
+        no row arrived since
+        '''
+        with self.lock:
+            if self.rows and self._expired():
+                return self._close()
+
+        return []
+
+    def flush(self) -> List[Dict]:
+        with self.lock:
+            return self._close()
+
+
+def get_drift_backend(name: str = params['monitoring']['drift_backend']):
+    # Backends pull in SciPy or Evidently, import only the selected one
+    # pylint: disable=import-outside-toplevel
+    if name == 'native':
+        from native_drift import NativeDriftBackend
+
+        return NativeDriftBackend()
+
+    if name == 'evidently':
+        from evidently_report import EvidentlyDriftBackend
+
+        return EvidentlyDriftBackend()
+
+    raise ValueError(f'Unknown drift backend {name}')
+
 
 class GrafanaCallback:
-    def insert_into_table(self, table_name, data: Dict) -> None:
-        engine = create_engine(psycopg_conn)
+    def __init__(
+        self,
+        drift_window: Optional[DriftWindow] = None,
+        bulk_writer: Optional[BulkWriter] = None,
+        drift_backend=None,
+        *,
+        stage_metrics=None,
+    ) -> None:
+        self.drift_window = drift_window or DriftWindow()
+        self.bulk_writer = bulk_writer or BulkWriter(
+            get_engine, stage_metrics=stage_metrics
+        )
+        self._drift_backend = drift_backend
+        self.reference: Optional[ReferenceData] = None
 
+    def insert_into_table(self, table_name, data: Dict) -> None:
         # Attaching timezone column to incoming data dictionary
         timestamp = f"{datetime.now(pytz.timezone('America/Bogota'))}"
         data_copy = data.copy() | {'timezone': timestamp}
 
-        dataframe = pd.DataFrame(data_copy, index=[0])
-        dataframe.to_sql(table_name, engine, if_exists='append', index=False)
+        # Rows are buffered and written in bulk, see flush
+        self.bulk_writer.write(table_name, data_copy)
 
-    def get_metrics(
-        self, train_dataset: pd.DataFrame, current_data: pd.DataFrame
-    ) -> Dict:
-        evidentlyReport = EvidentlyReport(
-            numerical_features=params['features']['numerical'],
-            categorical_features=params['features']['categorical'],
-        )
+    @property
+    def drift_backend(self):
+        # Resolved on the first closed window, not when the callback is created
+        if self._drift_backend is None:
+            self._drift_backend = get_drift_backend()
 
-        metrics = evidentlyReport.get_evidently_metrics(train_dataset, current_data)
-
-        metrics_dict = {
-            'drift_detected': metrics[0]['result']['drift_detected'],
-            'column_drift_metric': metrics[0]['result']['drift_score'],
-            'number_of_drifted_columns': metrics[1]['result'][
-                'number_of_drifted_columns'
-            ],
-            'current_share_of_missing_values': metrics[2]['result']['current'][
-                'share_of_missing_values'
-            ],
-            'reference_share_of_missing_values': metrics[2]['result']['reference'][
-                'share_of_missing_values'
-            ],
-        }
-
-        return metrics_dict
-
-    def report_metrics(
-        self, train_dataset: pd.DataFrame, features: Dict, prediction: Dict
-    ):
+        return self._drift_backend
+
+    def get_metrics(self, reference: ReferenceData, current_data: pd.DataFrame) -> Dict:
+        return self.drift_backend.get_metrics(reference, current_data)
+
+    def report_metrics(self, reference: ReferenceData, features: Dict, prediction: Dict):
         current_data = features | {'prediction': prediction['prediction']['output']}
+        self.reference = reference
 
         # Persist incoming data points into db
         self.insert_into_table('historical_data', current_data)
 
-        # Calculate Evidently metrics with the incoming data
-        metrics = self.get_metrics(train_dataset, pd.DataFrame(current_data, index=[0]))
+        # Drift is only computed once the window holding this data point is closed
+        window = self.drift_window.add(current_data)
+
+        if window is not None:
+            self.report_window(reference, window)
+
+    def report_window(self, reference: ReferenceData, window: List[Dict]) -> None:
+        # Calculate Evidently metrics with the whole window as current data
+        metrics = self.get_metrics(reference, pd.DataFrame(window))
 
         # Send alert if drift is detected
         if metrics['drift_detected']:
             print('ATENTION: Drift detected!!!')
 
-        self.insert_into_table('evidently_metrics', metrics)
+        self.insert_into_table(
+            'evidently_metrics', metrics | {'window_size': len(window)}
+        )
+
+    def _report_and_write(self, window: List[Dict]) -> None:
+        try:
+            if window and self.reference is not None:
+                self.report_window(self.reference, window)
+
+            self.bulk_writer.flush()
+        except Exception:  # pylint: disable=broad-exception-caught
+            # Monitoring must never fail a batch whose predictions were already published
+            logging.exception('Writing the monitoring tables failed')
+
+    def flush(self) -> None:
+        '''
+        Write every buffered row at the end of a Kinesis batch. The drift
+        window stays open across batches unless it has expired.
+        '''
+        self._report_and_write(self.drift_window.flush_expired())
+
+    def close(self) -> None:
+        '''
+        Report the partially filled window and write every buffered row,
+        e.g. when consumer.py exits. Never called on Lambda.
+        '''
+        self._report_and_write(self.drift_window.flush())
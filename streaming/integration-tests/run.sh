@@ -41,23 +41,22 @@ fi
 
 echo "Docker tested successfully!"
 
-# Test for Postgres
-echo "Testing Postgres DB..."
-
-pipenv run python test_postgres.py
+# Same for kinesis
+echo "Testing kinesis..."
+pipenv run python test_kinesis.py
 
-ERROR_CODE=$? #Catching the error
+ERROR_CODE=$?
 
 if [ ${ERROR_CODE} != 0 ]; then
     docker-compose logs
     docker-compose down
-    exit ${ERROR_CODE} # Stop the current execution
+    exit ${ERROR_CODE}
 fi
-echo "Postgres tested successfully!"
+echo "Kinesis tested successfully!"
 
-# Same for kinesis
-echo "Testing kinesis..."
-pipenv run python test_kinesis.py
+# Batched output through PutRecords
+echo "Testing kinesis batch..."
+pipenv run python test_kinesis_batch.py
 
 ERROR_CODE=$?
 
@@ -66,7 +65,21 @@ if [ ${ERROR_CODE} != 0 ]; then
     docker-compose down
     exit ${ERROR_CODE}
 fi
-echo "Kinesis tested successfully!"
+echo "Kinesis batch tested successfully!"
+
+# Test for Postgres, once every record was sent
+echo "Testing Postgres DB..."
+
+pipenv run python test_postgres.py
+
+ERROR_CODE=$? #Catching the error
+
+if [ ${ERROR_CODE} != 0 ]; then
+    docker-compose logs
+    docker-compose down
+    exit ${ERROR_CODE} # Stop the current execution
+fi
+echo "Postgres tested successfully!"
 
 # If previous tests fullfilled successfully then:
 echo "All good!"
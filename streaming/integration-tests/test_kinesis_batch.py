@@ -0,0 +1,63 @@
+# pylint: disable= duplicate-code
+import os
+import json
+import base64
+
+import boto3
+import requests
+
+kinesis_stream_name = os.getenv('PREDICTIONS_OUTPUT_STREAM')
+kinesis_endpoint = os.getenv('KINESIS_ENDPOINT_URL', 'http://localhost:4566')
+
+kinesis_client = boto3.client('kinesis', endpoint_url=kinesis_endpoint)
+
+SHARD_ID = 'shardId-000000000000'
+URL = 'http://localhost:8080/2015-03-31/functions/function/invocations'
+
+# More than 500 records so the output needs more than one PutRecords call
+BATCH_SIZE = 750
+
+with open('event.json', 'rt', encoding='utf-8') as file:
+    template = json.load(file)['Records'][0]
+
+student_event = json.loads(base64.b64decode(template['kinesis']['data']))
+
+
+def encode(student_id: int) -> str:
+    data = json.dumps(student_event | {'student_id': student_id})
+    return base64.b64encode(data.encode('utf-8')).decode('utf-8')
+
+
+event = {
+    'Records': [
+        {'kinesis': {'data': encode(student_id)}} for student_id in range(BATCH_SIZE)
+    ]
+}
+
+response = requests.post(URL, json=event, timeout=200).json()
+
+assert len(response['predictions']) == BATCH_SIZE, 'Lenght does not match'
+
+shard_iterator = kinesis_client.get_shard_iterator(
+    StreamName=kinesis_stream_name,
+    ShardId=SHARD_ID,
+    ShardIteratorType='TRIM_HORIZON',
+)['ShardIterator']
+
+records = []
+
+while True:
+    result = kinesis_client.get_records(ShardIterator=shard_iterator)
+    records.extend(json.loads(record['Data']) for record in result['Records'])
+    shard_iterator = result['NextShardIterator']
+
+    if not result['Records']:
+        break
+
+student_ids = [record['prediction']['student_id'] for record in records]
+
+print(f'{len(records)=}')
+
+# Plus the single record sent by test_docker.py
+assert len(records) == BATCH_SIZE + 1, 'Lenght does not match'
+assert set(student_ids) == set(range(BATCH_SIZE)) | {256}, 'Records are missing'
@@ -13,6 +13,11 @@ psycopg_conn = f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST
 
 engine = create_engine(psycopg_conn)
 
+# Runs after test_docker.py (1 record) and test_kinesis_batch.py (750 records)
+N_RECORDS = 751
+# Drift windows of DRIFT_WINDOW_SIZE rows, the last one is still open
+DRIFT_WINDOW_SIZE = 500
+
 columns_dict = {
     'EVIDENTLY': [
         'drift_detected',
@@ -20,6 +25,7 @@ columns_dict = {
         'number_of_drifted_columns',
         'current_share_of_missing_values',
         'reference_share_of_missing_values',
+        'window_size',
         'timezone',
     ],
     'HISTORICAL': [
@@ -54,6 +60,9 @@ def test_table(
     ), f'Columns in the the table {table_name} do not match with the expected ones'
 
 
-test_table('evidently_metrics', columns_dict['EVIDENTLY'], 1)
+test_table('evidently_metrics', columns_dict['EVIDENTLY'], N_RECORDS // DRIFT_WINDOW_SIZE)
+
+test_table('historical_data', columns_dict['HISTORICAL'], N_RECORDS)
 
-test_table('historical_data', columns_dict['HISTORICAL'], 1)
+window_sizes = pd.read_sql_table('evidently_metrics', engine)['window_size'].to_list()
+assert window_sizes == [DRIFT_WINDOW_SIZE], 'Drift windows do not match'
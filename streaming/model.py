@@ -1,34 +1,106 @@
 import os
 import json
+import time
+import atexit
 import base64
 import pickle
 import logging
 import threading
-from typing import Tuple
+from typing import Dict, List, Tuple, Callable, Optional
 from pathlib import Path
+from functools import partial
 
-import boto3
 import mlflow
 import pandas as pd
-from grafana_manager import GrafanaCallback
+from mlflow.models import Model
+from stage_metrics import StageMetrics, create_stage_metrics
+from model_refresher import (
+    MODEL_REFRESH_SECONDS,
+    ModelRefresher,
+    bundle_version,
+    registry_version,
+)
+from report_executor import ReportExecutor
+from prediction_cache import PREDICTION_CACHE_SIZE, PredictionCache, features_key
+
+from config.params import params
+from shared.reference_profile import (
+    PROFILE_FILE_NAME,
+    REFERENCE_FILE_NAME,
+    LABEL_ENCODER_FILE_NAME,
+    ReferenceData,
+    load_reference_profile,
+)
 
 MODEL_NAME = os.getenv('MODEL_NAME', 'student-dropout-classifier')
+SERVING_DIRECTORY = 'serving'
+
+# PutRecords accepts at most 500 records and 5 MB per request
+KINESIS_BATCH_SIZE = int(os.getenv('KINESIS_BATCH_SIZE', '500'))
+KINESIS_BATCH_BYTES = int(os.getenv('KINESIS_BATCH_BYTES', str(5 * 1024 * 1024)))
+KINESIS_MAX_RETRIES = int(os.getenv('KINESIS_MAX_RETRIES', '5'))
+KINESIS_BACKOFF_SECONDS = float(os.getenv('KINESIS_BACKOFF_SECONDS', '0.1'))
+
+# pipeline: the logged sklearn pipeline, compiled: the flat artifact of compiled_model.py
+SERVING_ENGINE = os.getenv('SERVING_ENGINE', 'pipeline')
 
 
 def get_model_location() -> str:
     model_location = os.getenv('MODEL_LOCATION')
 
-    if model_location is not None:
+    # Empty values, as exported from a copied .env, count as unset
+    if model_location:
         return model_location
 
     stage = os.getenv('STAGE', 'Staging')
     return f"models:/{MODEL_NAME}/{stage}"
 
 
+def get_version_source() -> Optional[Callable[[], Optional[str]]]:
+    '''
+    Function returning the run_id that should be served, None when the
+    model location is pinned and there is nothing to poll
+    '''
+    bundle_path = os.getenv('MODEL_BUNDLE_PATH')
+
+    if bundle_path:
+        return partial(bundle_version, bundle_path)
+
+    if os.getenv('MODEL_LOCATION') or os.getenv('ARTIFACT_LOCATION'):
+        return None
+
+    return partial(registry_version, MODEL_NAME, os.getenv('STAGE', 'Staging'))
+
+
+def model_run_id(model_location: str) -> str:
+    '''
+    run_id of the model at `model_location` without downloading the model:
+    registry URIs are resolved by the registry, other locations only read
+    their MLmodel file
+    '''
+    if not model_location.startswith('models:/'):
+        return Model.load(model_location).run_id
+
+    model_name, version = model_location[len('models:/') :].rsplit('/', 1)
+
+    if version.isdigit():
+        # pylint: disable=import-outside-toplevel
+        from mlflow import MlflowClient
+
+        return MlflowClient().get_model_version(model_name, version).run_id
+
+    run_id = registry_version(model_name, version)
+
+    if run_id is None:
+        raise ValueError(f'No version of {model_name} in stage {version}')
+
+    return run_id
+
+
 def download_artifacts(run_id: str) -> str:
     artifact_location = os.getenv('ARTIFACT_LOCATION')
 
-    if artifact_location is not None:
+    if artifact_location:
         return artifact_location
 
     artifact_location = f'runs:/{run_id}/artifacts/'
@@ -37,89 +109,348 @@ def download_artifacts(run_id: str) -> str:
 
 
 def load_artifacts() -> Tuple:
-    model_location = get_model_location()
+    bundle_path = os.getenv('MODEL_BUNDLE_PATH')
+
+    if bundle_path:
+        # Offline startup from a bundle baked into the image, see bundle.py
+        # pylint: disable=import-outside-toplevel
+        from bundle import load_bundle
+
+        verify = os.getenv('BUNDLE_VERIFY_CHECKSUMS', 'True') == 'True'
+        model, artifact_location, run_id = load_bundle(
+            bundle_path, verify, load_model=SERVING_ENGINE == 'pipeline'
+        )
+    else:
+        model_location = get_model_location()
+
+        if SERVING_ENGINE == 'compiled':
+            # Only the run_id is needed, the pipeline itself is never loaded
+            model, run_id = None, model_run_id(model_location)
+        else:
+            model = mlflow.pyfunc.load_model(model_location)
+            run_id = model.metadata.get_model_info().run_id
+
+        artifact_location = download_artifacts(run_id)
+
+    if SERVING_ENGINE == 'compiled':
+        # pylint: disable=import-outside-toplevel
+        from shared.compiled_model import CompiledModel
 
-    model = mlflow.pyfunc.load_model(model_location)
+        model = CompiledModel.load(Path(artifact_location) / SERVING_DIRECTORY)
 
-    run_id = model.metadata.get_model_info().run_id
-    artifact_location = download_artifacts(run_id)
-    with open(Path(artifact_location) / 'artifacts.pkl', 'rb') as file:
-        label_encoder, train_dataset = pickle.load(file)
+    artifact_location = Path(artifact_location)
 
-    return model, label_encoder, train_dataset, run_id
+    if (artifact_location / LABEL_ENCODER_FILE_NAME).exists():
+        with open(artifact_location / LABEL_ENCODER_FILE_NAME, 'rb') as file:
+            label_encoder = pickle.load(file)
+
+        # Memory-mapped on first use, the native drift backend only needs the profile
+        train_dataset, dataset_path = None, artifact_location / REFERENCE_FILE_NAME
+    else:
+        # Runs logged before the columnar reference dataset
+        with open(artifact_location / 'artifacts.pkl', 'rb') as file:
+            label_encoder, train_dataset = pickle.load(file)
+        dataset_path = None
+
+    # Runs logged before the profile existed get it computed on first use
+    reference_profile = load_reference_profile(artifact_location / PROFILE_FILE_NAME)
+    reference = ReferenceData(
+        train_dataset, params['features'], reference_profile, dataset_path
+    )
+
+    return model, label_encoder, reference, run_id
 
 
 class ModelService:
-    def __init__(self, artifacts, put_record=None, report_metrics=None) -> None:
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        artifacts,
+        put_record=None,
+        report_metrics=None,
+        report_executor=None,
+        flush_callbacks=None,
+        *,
+        prediction_cache=None,
+        stage_metrics=None,
+    ) -> None:
         self.artifacts = artifacts
         self.put_record = put_record or None
         self.report_metrics = report_metrics or None
+        self.report_executor = report_executor
+        self.flush_callbacks = flush_callbacks or []
+        self.prediction_cache = prediction_cache
+        self.stage_metrics = stage_metrics or StageMetrics()
+
+        if self.report_metrics is not None and self.report_executor is None:
+            self.report_executor = ReportExecutor()
 
     def predict(self, features) -> str:
+        if self.prediction_cache is not None:
+            return self.predict_batch([features])[0]
+
         df = pd.DataFrame(features, index=[0])
         model, label_encoder, *_ = self.artifacts
         prediction = model.predict(df)
         prediction = label_encoder.inverse_transform(prediction)
         return prediction[0]
 
+    def predict_batch(
+        self, features_batch: List[Dict], artifacts: Optional[Tuple] = None
+    ) -> List[str]:
+        '''
+        Score every student in a single pipeline call, keeping the input order.
+        `artifacts` pins the model version, the served one by default.
+        '''
+        if not features_batch:
+            return []
+
+        artifacts = artifacts or self.artifacts
+
+        if self.prediction_cache is not None:
+            return self.predict_cached(features_batch, artifacts)
+
+        with self.stage_metrics.stage('dataframe'):
+            df = pd.DataFrame(features_batch)
+
+        return list(self.predict_frame(df, artifacts))
+
+    def predict_frame(self, df: pd.DataFrame, artifacts: Optional[Tuple] = None):
+        '''
+        Labels for every row of an already built DataFrame, bypassing the cache
+        '''
+        model, label_encoder, *_ = artifacts or self.artifacts
+
+        with self.stage_metrics.stage('predict'):
+            predictions = model.predict(df)
+
+        with self.stage_metrics.stage('inverse_transform'):
+            return label_encoder.inverse_transform(predictions)
+
+    def predict_cached(self, features_batch: List[Dict], artifacts: Tuple) -> List[str]:
+        '''
+        Score only the distinct feature vectors missing from the cache
+        '''
+        run_id = artifacts[-1]
+        keys = [features_key(features) for features in features_batch]
+
+        predictions = {}
+        misses = {}
+        with self.stage_metrics.stage('cache_lookup'):
+            for key, features in zip(keys, features_batch):
+                if key in predictions or key in misses:
+                    continue
+
+                prediction = self.prediction_cache.get(run_id, key)
+                if prediction is None:
+                    misses[key] = features
+                else:
+                    predictions[key] = prediction
+
+        if misses:
+            with self.stage_metrics.stage('dataframe'):
+                df = pd.DataFrame(list(misses.values()))
+
+            scored = self.predict_frame(df, artifacts)
+            for key, prediction in zip(misses, scored):
+                self.prediction_cache.put(run_id, key, prediction)
+                predictions[key] = prediction
+
+        return [predictions[key] for key in keys]
+
     def lambda_handler(self, event):
-        *_, train_dataset, run_id = self.artifacts
+        # Decode the whole batch first so the model runs once per event
+        with self.stage_metrics.batch():
+            with self.stage_metrics.stage('decode'):
+                student_events = [
+                    base64_decode(record['kinesis']['data'])
+                    for record in event['Records']
+                ]
+
+            return self.handle_events(student_events)
+
+    def handle_events(self, student_events: List[Dict]) -> Dict:
+        '''
+        Predict, publish and monitor a batch of decoded student events
+        '''
+        # Shard workers share this service, each batch emits only its own timings
+        with self.stage_metrics.batch():
+            start = time.perf_counter()
+
+            # Read once, a model reload during the batch only applies to the next one
+            artifacts = self.artifacts
+            *_, reference, run_id = artifacts
+
+            batch_predictions = self.predict_batch(
+                [student_event['student_features'] for student_event in student_events],
+                artifacts,
+            )
 
-        predictions = []
+            predictions = []
 
-        for record in event['Records']:
-            encoded_data = record['kinesis']['data']
+            for student_event, prediction in zip(student_events, batch_predictions):
+                student_features, student_id = (
+                    student_event['student_features'],
+                    student_event['student_id'],
+                )
 
-            student_event = base64_decode(encoded_data)
+                logging.info('prediction=%s', prediction)
 
-            student_features, student_id = (
-                student_event['student_features'],
-                student_event['student_id'],
-            )
+                prediction_event = {
+                    'model': MODEL_NAME,
+                    'version': run_id,
+                    'prediction': {
+                        'output': prediction,
+                        'student_id': student_id,
+                    },
+                }
 
-            prediction = self.predict(student_features)
+                # Lets clients waiting on the output stream match their request
+                if 'correlation_id' in student_event:
+                    prediction_event['correlation_id'] = student_event['correlation_id']
 
-            logging.info('prediction=%s', prediction)
+                if self.put_record is not None and self.report_metrics is not None:
+                    with self.stage_metrics.stage('report_submit'):
+                        self.report_executor.submit(
+                            self.report_metrics,
+                            reference,
+                            student_features,
+                            prediction_event,
+                        )
 
-            prediction_event = {
-                'model': MODEL_NAME,
-                'version': run_id,
-                'prediction': {
-                    'output': prediction,
-                    'student_id': student_id,
-                },
-            }
+                    with self.stage_metrics.stage('put_record'):
+                        self.put_record(prediction_event)
 
-            if self.put_record is not None and self.report_metrics is not None:
-                background_report = threading.Thread(
-                    target=self.report_metrics,
-                    args=(train_dataset, student_features, prediction_event),
-                )
-                background_report.start()
+                predictions.append(prediction_event)
 
-                self.put_record(prediction_event)
+            # Monitoring jobs must finish before Lambda freezes the environment
+            if self.report_executor is not None:
+                with self.stage_metrics.stage('report_drain'):
+                    self.report_executor.drain()
 
-            predictions.append(prediction_event)
+            if self.prediction_cache is not None:
+                logging.info('prediction_cache=%s', self.prediction_cache.metrics())
+
+            # Buffered rows are written per batch, drift windows stay open until they expire
+            with self.stage_metrics.stage('flush'):
+                for flush in self.flush_callbacks:
+                    flush()
+
+            self.stage_metrics.record('batch', time.perf_counter() - start)
+            self.stage_metrics.emit(version=run_id, batch_size=len(student_events))
 
         return {'predictions': predictions}
 
 
 class KinesisCallback:
-    def __init__(self, kinesis_client, prediction_output_stream: str) -> None:
+    '''
+    Buffers prediction events and sends them with PutRecords, see flush
+    '''
+
+    # pylint: disable=too-many-arguments,too-many-instance-attributes
+    def __init__(
+        self,
+        kinesis_client,
+        prediction_output_stream: str,
+        *,
+        batch_size: int = KINESIS_BATCH_SIZE,
+        batch_bytes: int = KINESIS_BATCH_BYTES,
+        max_retries: int = KINESIS_MAX_RETRIES,
+        backoff_seconds: float = KINESIS_BACKOFF_SECONDS,
+        stage_metrics: Optional[StageMetrics] = None,
+    ) -> None:
         self.kinesis_client = kinesis_client
         self.prediction_output_stream = prediction_output_stream
+        self.batch_size = min(batch_size, 500)
+        self.batch_bytes = batch_bytes
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.stage_metrics = stage_metrics or StageMetrics()
+        # Shard workers of consumer.py share one callback but each thread buffers
+        # its own entries: a flush only sends the events of the calling thread's
+        # batch and raises if they were not all published
+        self.buffers = threading.local()
+
+    @property
+    def entries(self) -> List[Dict]:
+        if not hasattr(self.buffers, 'entries'):
+            self.buffers.entries, self.buffers.entries_bytes = [], 0
+        return self.buffers.entries
 
     def put_record(self, prediction_event) -> None:
-        partition_key = prediction_event['prediction']['student_id']
-
-        self.kinesis_client.put_record(
-            StreamName=self.prediction_output_stream,
-            Data=json.dumps(prediction_event),
-            PartitionKey=str(partition_key),
+        partition_key = str(prediction_event['prediction']['student_id'])
+        data = json.dumps(prediction_event).encode('utf-8')
+        entry_bytes = len(data) + len(partition_key.encode('utf-8'))
+
+        if self.entries and (
+            len(self.entries) >= self.batch_size
+            or self.buffers.entries_bytes + entry_bytes > self.batch_bytes
+        ):
+            self.flush()
+
+        self.entries.append({'Data': data, 'PartitionKey': partition_key})
+        self.buffers.entries_bytes += entry_bytes
+
+    def flush(self) -> None:
+        entries = self.entries
+        self.buffers.entries, self.buffers.entries_bytes = [], 0
+
+        if entries:
+            self.send(entries)
+
+    def send(self, entries: List[Dict]) -> None:
+        start = time.perf_counter()
+        self.put_records(entries)
+        latency = time.perf_counter() - start
+
+        self.stage_metrics.record('kinesis_put_records', latency)
+        logging.info('put_records batch_size=%d latency=%.3fs', len(entries), latency)
+
+    def put_records(self, entries: List[Dict]) -> None:
+        '''
+        Send the entries, retrying only the failed ones with exponential backoff.
+        A throttled request is retried whole on the same schedule.
+        '''
+        throttled = self.kinesis_client.exceptions.ProvisionedThroughputExceededException
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.kinesis_client.put_records(
+                    StreamName=self.prediction_output_stream, Records=entries
+                )
+            except throttled:
+                logging.warning(
+                    'Throughput exceeded on stream %s, backing off',
+                    self.prediction_output_stream,
+                )
+            else:
+                if response['FailedRecordCount'] == 0:
+                    return
+
+                # Results come back in the same order as the request entries
+                entries = [
+                    entry
+                    for entry, result in zip(entries, response['Records'])
+                    if 'ErrorCode' in result
+                ]
+
+            if attempt < self.max_retries:
+                time.sleep(self.backoff_seconds * 2**attempt)
+
+        logging.error(
+            'Could not put %d records in stream %s',
+            len(entries),
+            self.prediction_output_stream,
+        )
+        raise RuntimeError(
+            f'{len(entries)} records failed after {self.max_retries} retries'
         )
 
 
 def create_kinesis_client():
+    # pylint: disable=import-outside-toplevel
+    import boto3
+
     endpoint_url = os.getenv('KINESIS_ENDPOINT_URL')
 
     if endpoint_url is None:
@@ -131,18 +462,47 @@ def create_kinesis_client():
 
 def init(prediction_output_stream, test_run: bool):
     artifacts = load_artifacts()
+    stage_metrics = create_stage_metrics(dimensions={'Model': MODEL_NAME})
 
     put_record_callback, report_metrics_callback = None, None
+    flush_callbacks = []
 
     if not test_run:
+        # Monitoring pulls in SQLAlchemy and the drift backend, only load it when enabled
+        # pylint: disable=import-outside-toplevel
+        from grafana_manager import GrafanaCallback
+
         kinesis_client = create_kinesis_client()
 
-        kinesis_callback = KinesisCallback(kinesis_client, prediction_output_stream)
-        grafana_callback = GrafanaCallback()
+        kinesis_callback = KinesisCallback(
+            kinesis_client, prediction_output_stream, stage_metrics=stage_metrics
+        )
+        grafana_callback = GrafanaCallback(stage_metrics=stage_metrics)
         put_record_callback = kinesis_callback.put_record
         report_metrics_callback = grafana_callback.report_metrics
-
-    return ModelService(artifacts, put_record_callback, report_metrics_callback)
+        flush_callbacks.extend([kinesis_callback.flush, grafana_callback.flush])
+        # Report the drift window left open when the consumer or server exits,
+        # Lambda does not run exit handlers
+        atexit.register(grafana_callback.close)
+
+    prediction_cache = None
+    if PREDICTION_CACHE_SIZE > 0:
+        prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE)
+
+    model_service = ModelService(
+        artifacts,
+        put_record_callback,
+        report_metrics_callback,
+        flush_callbacks=flush_callbacks,
+        prediction_cache=prediction_cache,
+        stage_metrics=stage_metrics,
+    )
+
+    get_version = get_version_source()
+    if MODEL_REFRESH_SECONDS > 0 and get_version is not None:
+        ModelRefresher(model_service, get_version, load_artifacts).start()
+
+    return model_service
 
 
 def base64_decode(encoded_data: str):
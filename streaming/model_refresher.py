@@ -0,0 +1,105 @@
+import os
+import time
+import logging
+import threading
+from typing import Tuple, Callable, Optional
+from pathlib import Path
+
+MODEL_REFRESH_SECONDS = float(os.getenv('MODEL_REFRESH_SECONDS', '0'))
+
+
+def registry_version(model_name: str, stage: str) -> Optional[str]:
+    '''
+    run_id of the latest model version in a registry stage
+    '''
+    # pylint: disable=import-outside-toplevel
+    from mlflow import MlflowClient
+
+    versions = MlflowClient().get_latest_versions(model_name, stages=[stage])
+    return versions[0].run_id if versions else None
+
+
+def bundle_version(bundle_path: Path) -> str:
+    '''
+    run_id the CURRENT pointer of a bundle root refers to
+    '''
+    # pylint: disable=import-outside-toplevel
+    from bundle import resolve_version
+
+    return resolve_version(bundle_path).name
+
+
+class ModelRefresher:
+    '''
+    Polls `get_version` every `interval` seconds on a daemon thread. When it
+    returns a run_id other than the served one, `load_artifacts` runs on that
+    thread and the result replaces `model_service.artifacts` in one assignment,
+    so a batch uses either the old or the new artifacts, never a mix.
+    '''
+
+    def __init__(
+        self,
+        model_service,
+        get_version: Callable[[], Optional[str]],
+        load_artifacts: Callable[[], Tuple],
+        interval: float = MODEL_REFRESH_SECONDS,
+    ) -> None:
+        self.model_service = model_service
+        self.get_version = get_version
+        self.load_artifacts = load_artifacts
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.counters = {'checks': 0, 'reloads': 0, 'failures': 0}
+
+    @property
+    def served_version(self) -> str:
+        return self.model_service.artifacts[-1]
+
+    def check(self) -> bool:
+        '''
+        Load and swap in the new version if there is one, return whether it did
+        '''
+        self.counters['checks'] += 1
+        version = self.get_version()
+
+        if version is None or version == self.served_version:
+            return False
+
+        logging.info('Loading model run_id=%s', version)
+        start = time.perf_counter()
+        artifacts = self.load_artifacts()
+
+        previous_version = self.served_version
+        self.model_service.artifacts = artifacts
+        self.counters['reloads'] += 1
+
+        logging.info(
+            'Swapped model run_id=%s for run_id=%s in %.1fs',
+            previous_version,
+            artifacts[-1],
+            time.perf_counter() - start,
+        )
+        return True
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception:  # pylint: disable=broad-exception-caught
+                # Keep serving the current version and try again on the next poll
+                self.counters['failures'] += 1
+                logging.exception('Model refresh failed')
+
+    def start(self) -> 'ModelRefresher':
+        self.thread = threading.Thread(
+            target=self.run, name='model-refresher', daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+        if self.thread is not None:
+            self.thread.join()
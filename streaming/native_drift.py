@@ -0,0 +1,150 @@
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from shared.reference_profile import ReferenceData, count_missing
+
+# Evidently defaults: p-value tests flag drift below the threshold,
+# distance tests flag drift at or above it
+P_VALUE_THRESHOLD = 0.05
+DISTANCE_THRESHOLD = 0.1
+
+# Above this many reference rows, distances replace p-value tests
+LARGE_REFERENCE_ROWS = 1000
+
+
+def _aligned_counts(
+    reference_values: np.ndarray, reference_counts: np.ndarray, current: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Reference and current counts over the union of observed values
+    '''
+    current_values, current_counts = np.unique(current, return_counts=True)
+    keys = np.union1d(reference_values, current_values)
+
+    reference_aligned = np.zeros(len(keys))
+    reference_aligned[np.searchsorted(keys, reference_values)] = reference_counts
+
+    current_aligned = np.zeros(len(keys))
+    current_aligned[np.searchsorted(keys, current_values)] = current_counts
+
+    return keys, reference_aligned, current_aligned
+
+
+def jensenshannon(reference_counts: np.ndarray, current_counts: np.ndarray) -> float:
+    p = reference_counts / reference_counts.sum()
+    q = current_counts / current_counts.sum()
+    m = (p + q) / 2
+
+    def kl(x):
+        mask = x > 0
+        return np.sum(x[mask] * np.log(x[mask] / m[mask]))
+
+    return float(np.sqrt(max((kl(p) + kl(q)) / 2, 0.0)))
+
+
+def wasserstein_norm(
+    keys: np.ndarray,
+    reference_counts: np.ndarray,
+    current_counts: np.ndarray,
+    reference_std: float,
+) -> float:
+    reference_cdf = np.cumsum(reference_counts) / reference_counts.sum()
+    current_cdf = np.cumsum(current_counts) / current_counts.sum()
+    distance = np.sum(np.abs(reference_cdf - current_cdf)[:-1] * np.diff(keys))
+    return float(distance / max(reference_std, 0.001))
+
+
+def chisquare(reference_counts: np.ndarray, current_counts: np.ndarray) -> float:
+    expected = reference_counts * current_counts.sum() / reference_counts.sum()
+    return float(stats.chisquare(current_counts, expected)[1])
+
+
+def z_test(keys, reference_counts: np.ndarray, current_counts: np.ndarray) -> float:
+    if len(keys) == 1:
+        return 1.0
+
+    # Proportion of values different from the first key, as in Evidently
+    n_reference, n_current = reference_counts.sum(), current_counts.sum()
+    p_reference = 1 - reference_counts[0] / n_reference
+    p_current = 1 - current_counts[0] / n_current
+    pooled = (p_reference * n_reference + p_current * n_current) / (
+        n_reference + n_current
+    )
+    z_stat = (p_reference - p_current) / np.sqrt(
+        pooled * (1 - pooled) * (1 / n_reference + 1 / n_current)
+    )
+    return float(2 * (1 - stats.norm.cdf(np.abs(z_stat))))
+
+
+def column_drift(column_profile: Dict, current: pd.Series) -> Tuple[float, bool]:
+    '''
+    Same test selection as Evidently's defaults, but the reference side
+    comes from the precomputed profile
+    '''
+    current = current.replace([np.inf, -np.inf], np.nan).dropna().to_numpy()
+    reference_values = np.asarray(column_profile['values'])
+    reference_counts = np.asarray(column_profile['counts'], dtype=float)
+
+    # Labels are compared as strings unless both sides are numbers
+    if not (
+        reference_values.dtype.kind in 'biuf'
+        and pd.api.types.is_numeric_dtype(current.dtype)
+    ):
+        reference_values = reference_values.astype(str)
+        current = current.astype(str)
+
+    keys, reference_counts, current_counts = _aligned_counts(
+        reference_values, reference_counts, current
+    )
+    numerical = column_profile['type'] == 'numerical'
+    n_values = len(keys)
+
+    if reference_counts.sum() > LARGE_REFERENCE_ROWS:
+        if numerical and n_values > 5:
+            score = wasserstein_norm(
+                keys, reference_counts, current_counts, column_profile['std']
+            )
+        else:
+            score = jensenshannon(reference_counts, current_counts)
+        return score, score >= DISTANCE_THRESHOLD
+
+    if numerical and n_values > 5:
+        reference_sample = np.repeat(keys, reference_counts.astype(int))
+        score = float(stats.ks_2samp(reference_sample, current)[1])
+        return score, score <= P_VALUE_THRESHOLD
+
+    if n_values > 2:
+        score = chisquare(reference_counts, current_counts)
+    else:
+        score = z_test(keys, reference_counts, current_counts)
+    return score, score < P_VALUE_THRESHOLD
+
+
+class NativeDriftBackend:
+    '''
+    NumPy implementation of the metrics we use from Evidently's
+    ColumnDriftMetric, DatasetDriftMetric and DatasetMissingValuesMetric
+    '''
+
+    def get_metrics(self, reference: ReferenceData, current_data: pd.DataFrame) -> Dict:
+        profile = reference.profile
+
+        drift_by_column = {
+            column: column_drift(column_profile, current_data[column])
+            for column, column_profile in profile['columns'].items()
+        }
+        prediction_score, prediction_drift = drift_by_column['prediction']
+
+        return {
+            'drift_detected': bool(prediction_drift),
+            'column_drift_metric': prediction_score,
+            'number_of_drifted_columns': sum(
+                drifted for _, drifted in drift_by_column.values()
+            ),
+            'current_share_of_missing_values': count_missing(current_data)
+            / current_data.size,
+            'reference_share_of_missing_values': reference.share_of_missing_values,
+        }
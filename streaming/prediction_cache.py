@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Tuple, Callable, Optional
+from collections import OrderedDict
+
+PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', '0'))
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv('PREDICTION_CACHE_TTL_SECONDS', '0'))
+
+
+def features_key(features: Dict) -> str:
+    '''
+    Hash of the features that ignores key order and int/float differences
+    '''
+    canonical = {
+        name: (
+            float(value)
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+            else value
+        )
+        for name, value in features.items()
+    }
+    data = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class PredictionCache:
+    '''
+    LRU cache of predictions keyed on the model run_id and the features hash.
+
+    Entries older than `ttl_seconds` are treated as misses (0 keeps them until
+    evicted) and the whole cache is cleared when a different run_id is served.
+    '''
+
+    def __init__(
+        self,
+        capacity: int = PREDICTION_CACHE_SIZE,
+        ttl_seconds: float = PREDICTION_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.run_id: Optional[str] = None
+        self.entries: OrderedDict[Tuple[str, str], Tuple[Any, float]] = OrderedDict()
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def _check_version(self, run_id: str) -> None:
+        if run_id == self.run_id:
+            return
+
+        if self.run_id is not None:
+            self.counters['invalidations'] += 1
+
+        self.entries.clear()
+        self.run_id = run_id
+
+    def get(self, run_id: str, key: str) -> Optional[Any]:
+        with self.lock:
+            self._check_version(run_id)
+            entry = self.entries.get((run_id, key))
+
+            if entry is not None and self.ttl_seconds and entry[1] <= self.clock():
+                del self.entries[(run_id, key)]
+                self.counters['expirations'] += 1
+                entry = None
+
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+
+            self.entries.move_to_end((run_id, key))
+            self.counters['hits'] += 1
+            return entry[0]
+
+    def put(self, run_id: str, key: str, prediction: Any) -> None:
+        with self.lock:
+            self._check_version(run_id)
+
+            self.entries[(run_id, key)] = (prediction, self.clock() + self.ttl_seconds)
+            self.entries.move_to_end((run_id, key))
+
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return self.counters | {
+                'size': len(self.entries),
+                'hit_rate': self.counters['hits'] / lookups if lookups else 0.0,
+            }
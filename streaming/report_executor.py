@@ -0,0 +1,108 @@
+import os
+import logging
+import threading
+import contextvars
+from typing import Dict, Callable, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+REPORT_MAX_WORKERS = int(os.getenv('REPORT_MAX_WORKERS', '4'))
+REPORT_QUEUE_SIZE = int(os.getenv('REPORT_QUEUE_SIZE', '100'))
+REPORT_SUBMIT_TIMEOUT = float(os.getenv('REPORT_SUBMIT_TIMEOUT', '5'))
+REPORT_DRAIN_TIMEOUT = float(os.getenv('REPORT_DRAIN_TIMEOUT', '60'))
+
+
+class ReportExecutor:
+    '''
+    Bounded thread pool for monitoring jobs.
+
+    At most `max_workers` jobs run while `queue_size` more wait for a worker.
+    When every slot is taken, `submit` blocks for up to `submit_timeout` seconds
+    (backpressure on the handler) and then drops the job.
+    '''
+
+    def __init__(
+        self,
+        max_workers: int = REPORT_MAX_WORKERS,
+        queue_size: int = REPORT_QUEUE_SIZE,
+        submit_timeout: float = REPORT_SUBMIT_TIMEOUT,
+    ) -> None:
+        self.max_workers = max_workers
+        self.submit_timeout = submit_timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='report'
+        )
+        self.slots = threading.BoundedSemaphore(max_workers + queue_size)
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'dropped': 0,
+            'max_queue_depth': 0,
+        }
+
+    def submit(self, func: Callable, *args) -> bool:
+        # pylint: disable-next=consider-using-with
+        if not self.slots.acquire(timeout=self.submit_timeout):
+            with self.lock:
+                self.counters['dropped'] += 1
+            logging.warning('Report queue is full, dropping job %s', func.__name__)
+            return False
+
+        # The job runs in the caller's context, e.g. its stage metrics batch
+        future = self.executor.submit(contextvars.copy_context().run, func, *args)
+
+        with self.lock:
+            self.counters['submitted'] += 1
+            self.pending.add(future)
+            self.counters['max_queue_depth'] = max(
+                self.counters['max_queue_depth'], self.queue_depth()
+            )
+
+        future.add_done_callback(self._on_done)
+        return True
+
+    def _on_done(self, future: Future) -> None:
+        self.slots.release()
+
+        with self.lock:
+            self.pending.discard(future)
+            if future.exception() is not None:
+                self.counters['failed'] += 1
+            else:
+                self.counters['completed'] += 1
+
+        if future.exception() is not None:
+            logging.error('Report job failed', exc_info=future.exception())
+
+    def queue_depth(self) -> int:
+        '''
+        Jobs submitted but still waiting for a free worker
+        '''
+        return max(len(self.pending) - self.max_workers, 0)
+
+    def drain(self, timeout: Optional[float] = REPORT_DRAIN_TIMEOUT) -> bool:
+        '''
+        Wait for every submitted job, so nothing is left running when Lambda freezes
+        '''
+        with self.lock:
+            pending = set(self.pending)
+
+        _, not_done = wait(pending, timeout=timeout)
+
+        if not_done:
+            logging.warning('%d report jobs still running after drain', len(not_done))
+
+        logging.info('report_executor=%s', self.metrics())
+        return not not_done
+
+    def metrics(self) -> Dict[str, int]:
+        with self.lock:
+            return self.counters | {
+                'in_flight': len(self.pending),
+                'queue_depth': self.queue_depth(),
+            }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,316 @@
+'''
+Long-running HTTP server around ModelService, an alternative to the Lambda
+entry point for local use and low-latency clients:
+
+    POST /predict          {"student_features": {...}, "student_id": 1}
+    POST /predict_batch    {"instances": [{"student_features": {...}}, ...]}
+    GET  /health           the process is up
+    GET  /ready            the model is loaded and requests are accepted
+
+Concurrent requests are coalesced into micro-batches, see MicroBatcher. The
+instances of a batch request are queued together or not at all: 503 when the
+queue cannot take them all, 413 beyond SERVER_MAX_QUEUE_SIZE instances.
+'''
+
+import os
+import asyncio
+import logging
+import argparse
+from typing import Any, Set, Dict, List, Tuple, Callable, Optional
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import model
+import mlflow
+import uvicorn
+from fastapi import FastAPI, Response, HTTPException
+from pydantic import BaseModel
+
+from config.params import params
+
+SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.getenv('SERVER_PORT', '8000'))
+SERVER_MAX_BATCH_SIZE = int(os.getenv('SERVER_MAX_BATCH_SIZE', '64'))
+SERVER_MAX_WAIT_MS = float(os.getenv('SERVER_MAX_WAIT_MS', '5'))
+SERVER_MAX_CONCURRENCY = int(os.getenv('SERVER_MAX_CONCURRENCY', '2'))
+SERVER_MAX_QUEUE_SIZE = int(os.getenv('SERVER_MAX_QUEUE_SIZE', '1000'))
+
+MLFLOW_TRACKING_URI = os.getenv('MLFLOW_TRACKING_URI')
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class RequestTooLargeError(Exception):
+    pass
+
+
+class MicroBatcher:
+    '''
+    Collects single predictions into batches of at most `max_batch_size`,
+    waiting no longer than `max_wait_ms` after the first one arrived.
+
+    At most `max_concurrency` batches are scored at a time on worker threads
+    and at most `max_queue_size` predictions wait, beyond that they are rejected.
+    '''
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        predict_batch: Callable[[List[Dict]], List],
+        *,
+        max_batch_size: int = SERVER_MAX_BATCH_SIZE,
+        max_wait_ms: float = SERVER_MAX_WAIT_MS,
+        max_concurrency: int = SERVER_MAX_CONCURRENCY,
+        max_queue_size: int = SERVER_MAX_QUEUE_SIZE,
+    ) -> None:
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.max_concurrency = max_concurrency
+        self.max_queue_size = max_queue_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.task: Optional[asyncio.Task] = None
+        # The event loop only keeps weak references to tasks
+        self.scoring: Set[asyncio.Task] = set()
+        self.counters = {'batches': 0, 'predictions': 0, 'rejected': 0}
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix='predict'
+        )
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        # Batches already taken from the queue are answered before shutting down
+        await asyncio.gather(*self.scoring)
+        self.executor.shutdown(wait=True)
+
+    async def predict(self, features: Dict) -> Any:
+        future = asyncio.get_running_loop().create_future()
+
+        try:
+            self.queue.put_nowait((features, future))
+        except asyncio.QueueFull as error:
+            self.counters['rejected'] += 1
+            raise QueueFullError('Too many pending predictions') from error
+
+        return await future
+
+    async def predict_many(self, features_batch: List[Dict]) -> List:
+        '''
+        All the predictions are queued or the whole request is rejected
+        '''
+        if len(features_batch) > self.max_queue_size:
+            self.counters['rejected'] += len(features_batch)
+            raise RequestTooLargeError(
+                f'At most {self.max_queue_size} instances are accepted per request'
+            )
+
+        # Nothing runs on the event loop between the check and the puts
+        if self.max_queue_size - self.queue.qsize() < len(features_batch):
+            self.counters['rejected'] += len(features_batch)
+            raise QueueFullError('Too many pending predictions')
+
+        futures = []
+        for features in features_batch:
+            future = asyncio.get_running_loop().create_future()
+            self.queue.put_nowait((features, future))
+            futures.append(future)
+
+        return list(await asyncio.gather(*futures))
+
+    async def next_batch(self) -> List:
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait_seconds
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def run(self) -> None:
+        while True:
+            # Wait for a free slot first, so requests keep coalescing meanwhile
+            await self.slots.acquire()
+            batch = await self.next_batch()
+            task = asyncio.create_task(self.score(batch))
+            self.scoring.add(task)
+            task.add_done_callback(self.scoring.discard)
+
+    async def score(self, batch: List) -> None:
+        try:
+            predictions = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.predict_batch, [features for features, _ in batch]
+            )
+            self.counters['batches'] += 1
+            self.counters['predictions'] += len(batch)
+
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            logging.exception('Batch prediction failed')
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            self.slots.release()
+
+
+class PredictRequest(BaseModel):
+    student_features: Dict[str, Any]
+    student_id: Optional[Any] = None
+
+
+class PredictBatchRequest(BaseModel):
+    instances: List[PredictRequest]
+
+
+def create_app(
+    load_model_service: Callable[[], model.ModelService], **batcher_options
+) -> FastAPI:
+    '''
+    The model is loaded on a worker thread after startup, /ready turns 200 once done
+    '''
+    state: Dict[str, Any] = {'model_service': None, 'batcher': None}
+
+    async def load() -> None:
+        try:
+            model_service = await asyncio.get_running_loop().run_in_executor(
+                None, load_model_service
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            # /ready keeps answering 503, the orchestrator restarts the container
+            logging.exception('Model loading failed')
+            return
+
+        def predict_batch(features_batch: List[Dict]) -> List[Tuple[Any, str]]:
+            stage_metrics = model_service.stage_metrics
+
+            # Every micro-batch emits its own timings, like a Kinesis batch
+            with stage_metrics.batch():
+                # Read once, a model reload during the batch only applies to the next one
+                artifacts = model_service.artifacts
+                predictions = model_service.predict_batch(features_batch, artifacts)
+                stage_metrics.emit(version=artifacts[-1], batch_size=len(features_batch))
+
+            return [(prediction, artifacts[-1]) for prediction in predictions]
+
+        batcher = MicroBatcher(predict_batch, **batcher_options)
+        await batcher.start()
+        state['model_service'], state['batcher'] = model_service, batcher
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        # Serve /health while the model loads
+        loading = asyncio.create_task(load())
+
+        yield
+
+        loading.cancel()
+        if state['batcher'] is not None:
+            await state['batcher'].stop()
+
+    app = FastAPI(title='Student dropout classifier', lifespan=lifespan)
+
+    def prediction(request: PredictRequest, result: Tuple[Any, str]) -> Dict:
+        # The version of the model that scored the micro-batch
+        output, version = result
+        return {
+            'model': model.MODEL_NAME,
+            'version': version,
+            'prediction': {'output': output, 'student_id': request.student_id},
+        }
+
+    def ready_batcher() -> MicroBatcher:
+        if state['batcher'] is None:
+            raise HTTPException(status_code=503, detail='Model is loading')
+        return state['batcher']
+
+    @app.get('/health')
+    async def health():
+        return {'status': 'ok'}
+
+    @app.get('/ready')
+    async def ready(response: Response):
+        if state['batcher'] is None:
+            response.status_code = 503
+            return {'status': 'loading'}
+
+        return {
+            'status': 'ready',
+            'version': state['model_service'].artifacts[-1],
+            'batcher': state['batcher'].counters,
+        }
+
+    @app.post('/predict')
+    async def predict(request: PredictRequest):
+        batcher = ready_batcher()
+        try:
+            result = await batcher.predict(request.student_features)
+        except QueueFullError as error:
+            raise HTTPException(status_code=503, detail=str(error)) from error
+
+        return prediction(request, result)
+
+    @app.post('/predict_batch')
+    async def predict_batch(request: PredictBatchRequest):
+        batcher = ready_batcher()
+        try:
+            results = await batcher.predict_many(
+                [instance.student_features for instance in request.instances]
+            )
+        except RequestTooLargeError as error:
+            raise HTTPException(status_code=413, detail=str(error)) from error
+        except QueueFullError as error:
+            raise HTTPException(status_code=503, detail=str(error)) from error
+
+        return {
+            'predictions': [
+                prediction(instance, result)
+                for instance, result in zip(request.instances, results)
+            ]
+        }
+
+    return app
+
+
+def init_model_service() -> model.ModelService:
+    # No Kinesis or Grafana callbacks, the server only answers predictions
+    return model.init(prediction_output_stream=None, test_run=True)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--host', default=SERVER_HOST)
+    arg_parser.add_argument('--port', default=SERVER_PORT, type=int)
+
+    args = arg_parser.parse_args()
+
+    if MLFLOW_TRACKING_URI is not None:
+        mlflow.set_tracking_uri(
+            f"http://{MLFLOW_TRACKING_URI}:{params['mlflow']['port']}"
+        )
+
+    uvicorn.run(create_app(init_model_service), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+'''
+Latency of every stage of the prediction path, aggregated into histograms
+and emitted once per batch:
+
+    STAGE_METRICS=emf,postgres
+
+`emf` prints CloudWatch Embedded Metric Format lines, which Lambda turns
+into metrics from its logs, and `postgres` writes one row per stage into
+the `stage_latency` table next to the monitoring tables used by Grafana.
+Without sinks every timer is a shared no-op context manager.
+'''
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from typing import Dict, List, Callable, Optional
+from datetime import datetime, timezone
+from contextlib import nullcontext, contextmanager
+
+STAGE_METRICS = os.getenv('STAGE_METRICS', '')
+STAGE_METRICS_NAMESPACE = os.getenv('STAGE_METRICS_NAMESPACE', 'StudentDropout')
+STAGE_METRICS_TABLE = 'stage_latency'
+
+# Bucket upper bounds in milliseconds, from 50 µs to about 52 s
+BUCKET_BOUNDS = tuple(0.05 * 2**exponent for exponent in range(21))
+# EMF accepts at most 100 values per metric in one document
+EMF_MAX_VALUES = 100
+
+_NO_TIMER = nullcontext()
+
+
+class Histogram:
+    '''
+    Latencies in milliseconds counted in exponential buckets. The samples
+    themselves are kept for the EMF sink, a histogram only lives for a batch.
+    '''
+
+    def __init__(self) -> None:
+        self.samples: List[float] = []
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float('inf')
+        self.maximum = 0.0
+
+    def record(self, milliseconds: float) -> None:
+        self.samples.append(milliseconds)
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.minimum = min(self.minimum, milliseconds)
+        self.maximum = max(self.maximum, milliseconds)
+
+    def percentile(self, quantile: float) -> float:
+        '''
+        Upper bound of the bucket holding the quantile, at most the maximum
+        '''
+        rank = quantile * self.count
+        cumulative = 0
+
+        for bound, count in zip(BUCKET_BOUNDS, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.maximum)
+
+        return self.maximum
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum_ms': self.total,
+            'min_ms': self.minimum if self.count else 0.0,
+            'max_ms': self.maximum,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+        }
+
+
+class _StageTimer:
+    __slots__ = ('stage_metrics', 'name', 'start')
+
+    def __init__(self, stage_metrics: 'StageMetrics', name: str) -> None:
+        self.stage_metrics = stage_metrics
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.stage_metrics.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StageMetrics:
+    '''
+    Histogram per stage name, handed to every sink and reset by `emit`.
+    Without sinks nothing is measured.
+
+    Shard workers of consumer.py share one instance, so every worker collects
+    its samples inside `batch` and only emits its own histograms. Samples
+    recorded outside a batch are dropped, nothing would ever emit them.
+    '''
+
+    def __init__(self, sinks: Optional[List[Callable]] = None) -> None:
+        self.sinks = sinks or []
+        self.enabled = bool(self.sinks)
+        # Report threads record into the batch of the job they run
+        self.lock = threading.Lock()
+        self.batch_histograms = contextvars.ContextVar('batch_histograms', default=None)
+
+    @contextmanager
+    def batch(self):
+        '''
+        Collect the samples of the calling context apart from other batches,
+        a nested batch belongs to the enclosing one
+        '''
+        if not self.enabled or self.batch_histograms.get() is not None:
+            yield
+            return
+
+        token = self.batch_histograms.set({})
+        try:
+            yield
+        finally:
+            self.batch_histograms.reset(token)
+
+    def stage(self, name: str):
+        '''
+        Context manager timing the block as one sample of `name`
+        '''
+        if self.batch_histograms.get() is None:
+            return _NO_TIMER
+
+        return _StageTimer(self, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        histograms = self.batch_histograms.get()
+
+        if histograms is None:
+            return
+
+        with self.lock:
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = Histogram()
+            histogram.record(seconds * 1000)
+
+    def emit(self, **properties) -> None:
+        '''
+        Send the histograms of the current batch collected since the last call
+        to every sink, `properties` (e.g. model version, batch size) are
+        attached as context
+        '''
+        collected = self.batch_histograms.get()
+
+        if collected is None:
+            return
+
+        with self.lock:
+            histograms = dict(collected)
+            collected.clear()
+
+        if not histograms:
+            return
+
+        for sink in self.sinks:
+            try:
+                sink(histograms, properties)
+            except Exception:  # pylint: disable=broad-exception-caught
+                # Metrics must never fail a batch that was already predicted
+                logging.exception('Stage metrics sink %s failed', sink)
+
+
+class EmfSink:
+    '''
+    CloudWatch Embedded Metric Format lines with the samples of a batch, a
+    metric per stage whose value is the array of its latencies. Stages with
+    more than EMF_MAX_VALUES samples are spread over several lines.
+    '''
+
+    def __init__(
+        self,
+        namespace: str = STAGE_METRICS_NAMESPACE,
+        dimensions: Optional[Dict[str, str]] = None,
+        write: Callable[[str], None] = print,
+    ) -> None:
+        self.namespace = namespace
+        self.dimensions = dimensions or {}
+        self.write = write
+
+    def __call__(self, histograms: Dict[str, Histogram], properties: Dict) -> None:
+        timestamp = int(time.time() * 1000)
+        most_samples = max(histogram.count for histogram in histograms.values())
+
+        for start in range(0, most_samples, EMF_MAX_VALUES):
+            values = {
+                name: histogram.samples[start : start + EMF_MAX_VALUES]
+                for name, histogram in histograms.items()
+                if histogram.count > start
+            }
+            self.write(self.document(timestamp, values, properties))
+
+    def document(
+        self, timestamp: int, values: Dict[str, List[float]], properties: Dict
+    ) -> str:
+        document = {
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [
+                    {
+                        'Namespace': self.namespace,
+                        'Dimensions': [list(self.dimensions)],
+                        'Metrics': [
+                            {'Name': name, 'Unit': 'Milliseconds'} for name in values
+                        ],
+                    }
+                ],
+            }
+        }
+        document |= self.dimensions | properties | values
+
+        return json.dumps(document, separators=(',', ':'))
+
+
+class PostgresSink:
+    '''
+    One row per stage and batch, written together in a single round trip
+    '''
+
+    def __init__(self, bulk_writer, table_name: str = STAGE_METRICS_TABLE) -> None:
+        self.bulk_writer = bulk_writer
+        self.table_name = table_name
+
+    def __call__(self, histograms: Dict[str, Histogram], properties: Dict) -> None:
+        timestamp = datetime.now(timezone.utc)
+
+        for name, histogram in histograms.items():
+            self.bulk_writer.write(
+                self.table_name,
+                {'timestamp': timestamp, 'stage': name}
+                | histogram.summary()
+                | properties,
+            )
+
+        self.bulk_writer.flush()
+
+
+def create_stage_metrics(
+    sink_names: str = STAGE_METRICS, dimensions: Optional[Dict[str, str]] = None
+) -> StageMetrics:
+    sinks = []
+
+    for sink_name in filter(None, (name.strip() for name in sink_names.split(','))):
+        if sink_name == 'emf':
+            sinks.append(EmfSink(dimensions=dimensions))
+        elif sink_name == 'postgres':
+            # SQLAlchemy is only imported when the table is written
+            # pylint: disable=import-outside-toplevel
+            from bulk_writer import BulkWriter
+            from grafana_manager import get_engine
+
+            sinks.append(PostgresSink(BulkWriter(get_engine)))
+        else:
+            raise ValueError(f'Unknown stage metrics sink {sink_name}')
+
+    return StageMetrics(sinks)
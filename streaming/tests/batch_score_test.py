@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from batch_score import score_file
+from sklearn.preprocessing import LabelEncoder
+
+
+class GDPModelMock:
+    def predict(self, X):
+        assert 'student_id' not in X
+        return (X['GDP'] > 0).astype(int).to_numpy()
+
+
+@pytest.fixture(name='students')
+def students_fixture(feature_fixture):
+    students = pd.DataFrame([feature_fixture] * 1050)
+    students['GDP'] = np.linspace(-1, 1, len(students))
+    students['student_id'] = np.arange(len(students))
+    return students
+
+
+@pytest.fixture(name='artifacts')
+def artifacts_fixture():
+    label_encoder = LabelEncoder().fit(['Dropout', 'Graduate'])
+    return GDPModelMock(), label_encoder, 'reference', 'run-1'
+
+
+@pytest.mark.parametrize('suffix, workers', [('.csv', 0), ('.parquet', 2), ('.arrow', 0)])
+def test_score_file(tmp_path, students, artifacts, suffix, workers):
+    input_path = tmp_path / f'students{suffix}'
+    if suffix == '.csv':
+        students.to_csv(input_path, index=False)
+    elif suffix == '.arrow':
+        students.to_feather(input_path, compression='uncompressed')
+    else:
+        students.to_parquet(input_path, index=False)
+
+    report = score_file(
+        input_path,
+        tmp_path / 'predictions.parquet',
+        artifacts,
+        chunk_size=100,
+        workers=workers,
+    )
+
+    predictions = pd.read_parquet(tmp_path / 'predictions.parquet')
+    expected = np.where(students['GDP'] > 0, 'Graduate', 'Dropout')
+
+    assert report['rows'] == len(students)
+    assert report['chunks'] == 11
+    if workers:
+        # Memory of the joined worker processes is reported apart
+        assert report['max_worker_rss_mb'] > 0
+    assert predictions['student_id'].tolist() == students['student_id'].tolist()
+    assert predictions['prediction'].tolist() == expected.tolist()
+
+
+def test_unsupported_input_format(tmp_path, artifacts):
+    (tmp_path / 'students.json').write_text('[]', encoding='utf-8')
+
+    with pytest.raises(ValueError):
+        score_file(tmp_path / 'students.json', tmp_path / 'out.parquet', artifacts)
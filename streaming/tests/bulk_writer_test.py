@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import pandas as pd
+from sqlalchemy import create_engine
+from bulk_writer import BulkWriter, copy_from_stdin
+
+
+class CursorMock:
+    def __init__(self) -> None:
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def copy_expert(self, sql, file):
+        self.statements.append((sql, file.read()))
+
+
+def test_bulk_writer_writes_full_batches_and_flushes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'monitoring.db'}")
+    writer = BulkWriter(lambda: engine, batch_size=3)
+
+    for value in range(4):
+        writer.write('historical_data', {'value': value})
+
+    assert len(pd.read_sql_table('historical_data', engine)) == 3
+
+    writer.flush()
+
+    assert pd.read_sql_table('historical_data', engine)['value'].tolist() == [0, 1, 2, 3]
+    assert not writer.buffers
+
+
+def test_copy_from_stdin():
+    cursor = CursorMock()
+    conn = SimpleNamespace(connection=SimpleNamespace(cursor=lambda: cursor))
+    table = SimpleNamespace(schema=None, name='historical_data')
+
+    written = copy_from_stdin(
+        table, conn, ['GDP', 'Scholarship holder'], iter([(1.74, 0), (0.32, 1)])
+    )
+
+    assert written == 2
+    assert cursor.statements == [
+        (
+            'COPY "historical_data" ("GDP", "Scholarship holder") FROM STDIN WITH CSV',
+            '1.74,0\r\n0.32,1\r\n',
+        )
+    ]
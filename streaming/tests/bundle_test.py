@@ -0,0 +1,85 @@
+import pickle
+
+import model
+import mlflow
+import pandas as pd
+import pytest
+from bundle import BundleError, load_bundle, create_bundle
+from mlflow.models import Model
+from sklearn.dummy import DummyClassifier
+
+RUN_ID = '9cc5cf53c15f4e68ac2f98abd4eb0ec4'
+
+
+@pytest.fixture(name='downloaded_model')
+def downloaded_model_fixture(tmp_path, feature_fixture):
+    '''
+    Model and artifacts as they come out of the MLflow download
+    '''
+    X_train = pd.DataFrame([feature_fixture] * 2)
+    classifier = DummyClassifier(strategy='constant', constant=1).fit(X_train, [0, 1])
+
+    model_path = tmp_path / 'download' / 'model'
+    mlflow.sklearn.save_model(classifier, model_path, serialization_format='cloudpickle')
+    mlmodel = Model.load(model_path / 'MLmodel')
+    mlmodel.run_id = RUN_ID
+    mlmodel.save(model_path / 'MLmodel')
+
+    artifact_path = tmp_path / 'download' / 'artifacts'
+    artifact_path.mkdir()
+    with open(artifact_path / 'artifacts.pkl', 'wb') as file:
+        pickle.dump((LabelEncoderMock(), X_train.assign(prediction='Graduate')), file)
+
+    return model_path, artifact_path
+
+
+class LabelEncoderMock:
+    def inverse_transform(self, prediction):
+        return ['Dropout' if value == 0 else 'Graduate' for value in prediction]
+
+
+def test_create_and_load_bundle(tmp_path, downloaded_model):
+    version_directory = create_bundle(
+        *downloaded_model,
+        tmp_path / 'bundle',
+        'models:/student-dropout-classifier/Staging',
+    )
+
+    assert version_directory == tmp_path / 'bundle' / RUN_ID
+    assert (tmp_path / 'bundle' / 'CURRENT').read_text(encoding='utf-8') == RUN_ID
+
+    _, artifact_location, run_id = load_bundle(tmp_path / 'bundle')
+
+    assert run_id == RUN_ID
+    assert artifact_location == version_directory / 'artifacts'
+
+
+def test_load_bundle_rejects_modified_files(tmp_path, downloaded_model):
+    version_directory = create_bundle(
+        *downloaded_model,
+        tmp_path / 'bundle',
+        'models:/student-dropout-classifier/Staging',
+    )
+    with open(version_directory / 'artifacts' / 'artifacts.pkl', 'ab') as file:
+        file.write(b'tampered')
+
+    with pytest.raises(BundleError, match='artifacts/artifacts.pkl'):
+        load_bundle(tmp_path / 'bundle')
+
+
+def test_load_artifacts_from_bundle(
+    tmp_path, monkeypatch, downloaded_model, feature_fixture
+):
+    create_bundle(*downloaded_model, tmp_path / 'bundle', 'models:/x/Staging')
+    monkeypatch.setenv('MODEL_BUNDLE_PATH', str(tmp_path / 'bundle'))
+    monkeypatch.setattr(
+        mlflow.artifacts,
+        'download_artifacts',
+        lambda *_: pytest.fail('bundle mode must not download artifacts'),
+    )
+
+    artifacts = model.load_artifacts()
+    model_service = model.ModelService(artifacts)
+
+    assert artifacts[-1] == RUN_ID
+    assert model_service.predict(feature_fixture) == 'Graduate'
@@ -0,0 +1,92 @@
+import pandas as pd
+import pytest
+
+from shared.columnar_dataset import (
+    DatasetError,
+    blake2b,
+    load_split,
+    read_manifest,
+    write_dataset,
+    resolve_version,
+)
+
+
+@pytest.fixture(name='splits')
+def splits_fixture(feature_fixture):
+    X = pd.DataFrame([feature_fixture] * 6, index=[9, 4, 7, 0, 2, 5])
+    X['GDP'] = [0.1, -0.2, 0.3, -0.4, 0.5, -0.6]
+    y = pd.Series(
+        ['Dropout', 'Graduate', 'Graduate', 'Dropout', 'Graduate', 'Dropout'],
+        index=X.index,
+        name='Target',
+    )
+    return {'train': (X.iloc[:4], y.iloc[:4]), 'test': (X.iloc[4:], y.iloc[4:])}
+
+
+def test_splits_round_trip(tmp_path, splits):
+    write_dataset(tmp_path, splits)
+
+    for split, (X, y) in splits.items():
+        X_loaded, y_loaded = load_split(tmp_path, split)
+
+        pd.testing.assert_frame_equal(X_loaded, X, check_dtype=False)
+        pd.testing.assert_series_equal(y_loaded, y)
+
+
+def test_only_selected_columns_are_loaded(tmp_path, splits):
+    write_dataset(tmp_path, splits)
+
+    X, y = load_split(tmp_path, 'train', columns=['GDP', 'Scholarship holder'])
+
+    assert X.columns.tolist() == ['GDP', 'Scholarship holder']
+    assert X.index.tolist() == [9, 4, 7, 0]
+    assert y.tolist() == splits['train'][1].tolist()
+
+
+def test_manifest(tmp_path, splits):
+    version_directory = write_dataset(tmp_path, splits)
+    manifest = read_manifest(tmp_path)
+
+    assert resolve_version(tmp_path) == version_directory
+    assert manifest['version'] == version_directory.name
+    assert manifest['target'] == 'Target'
+    assert manifest['schema']['GDP'] == 'double'
+    assert {split: entry['rows'] for split, entry in manifest['splits'].items()} == {
+        'train': 4,
+        'test': 2,
+    }
+    assert manifest['splits']['test']['hash'] == blake2b(version_directory / 'test.arrow')
+
+
+def test_version_follows_the_content(tmp_path, splits):
+    version = write_dataset(tmp_path, splits).name
+    assert write_dataset(tmp_path, splits).name == version
+
+    X, y = splits['test']
+    changed = write_dataset(tmp_path, splits | {'test': (X.assign(GDP=0.0), y)})
+
+    assert changed.name != version
+    assert resolve_version(tmp_path) == changed
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        ['CURRENT', version, changed.name]
+    )
+
+
+def test_corrupted_split_is_rejected(tmp_path, splits):
+    version_directory = write_dataset(tmp_path, splits)
+    split_path = version_directory / 'train.arrow'
+
+    content = bytearray(split_path.read_bytes())
+    content[len(content) // 2] ^= 0xFF
+    split_path.write_bytes(content)
+
+    with pytest.raises(DatasetError):
+        load_split(tmp_path, 'train')
+
+    X, _ = load_split(tmp_path, 'test')
+    assert len(X) == 2
+
+
+def test_missing_dataset(tmp_path):
+    with pytest.raises(DatasetError):
+        load_split(tmp_path, 'train')
@@ -0,0 +1,79 @@
+import copy
+
+import numpy as np
+import pytest
+from xgboost import XGBClassifier
+
+from config.params import params
+from shared.testing import make_students
+from orchestration.common import pipeline_definition, export_serving_artifact
+from shared.compiled_model import CompiledModel
+
+
+@pytest.fixture(name='pipeline', scope='module')
+def pipeline_fixture():
+    students = make_students(2000, seed=1, skewed=True)
+    target = (
+        students['Curricular units 2nd sem (approved)']
+        + 2 * students['Tuition fees up to date']
+        + students['GDP']
+        > 4
+    ).astype(int)
+
+    pipeline = pipeline_definition(
+        XGBClassifier,
+        params['features'],
+        'XGBClassifier',
+        {'n_estimators': 50, 'max_depth': 4, 'random_state': 42},
+    )
+    return pipeline.fit(students, target)
+
+
+def test_compiled_model_matches_pipeline(tmp_path, pipeline):
+    export_serving_artifact(pipeline, tmp_path / 'serving')
+    compiled_model = CompiledModel.load(tmp_path / 'serving')
+
+    students = make_students(1000, seed=2, skewed=True)
+    # Categories never seen in training take the rare label path
+    students.loc[:9, 'Curricular units 1st sem (approved)'] = 99
+
+    np.testing.assert_allclose(
+        compiled_model.predict_proba(students),
+        pipeline.predict_proba(students)[:, 1],
+        rtol=1e-5,
+        atol=1e-6,
+    )
+    assert (compiled_model.predict(students) == pipeline.predict(students)).all()
+
+
+def test_compiled_model_accepts_columns_dict(pipeline):
+    compiled_model = CompiledModel.from_pipeline(pipeline)
+    students = make_students(10, seed=3, skewed=True)
+
+    predictions = compiled_model.predict(
+        {column: students[column].to_numpy() for column in students.columns}
+    )
+
+    assert predictions.tolist() == pipeline.predict(students).tolist()
+
+
+def test_compiled_model_handles_missing_values_like_pipeline(pipeline):
+    students = make_students(100, seed=4, skewed=True)
+    students.loc[:9, 'GDP'] = np.nan
+    students.loc[5:9, 'Inflation rate'] = np.nan
+
+    # MathFeatures rejects NaN by default
+    with pytest.raises(ValueError):
+        pipeline.predict_proba(students)
+    with pytest.raises(ValueError):
+        CompiledModel.from_pipeline(pipeline).predict_proba(students)
+
+    ignoring = copy.deepcopy(pipeline)
+    ignoring.named_steps['MathFeatures'].missing_values = 'ignore'
+
+    np.testing.assert_allclose(
+        CompiledModel.from_pipeline(ignoring).predict_proba(students),
+        ignoring.predict_proba(students)[:, 1],
+        rtol=1e-5,
+        atol=1e-6,
+    )
@@ -0,0 +1,184 @@
+import json
+from typing import Dict, List
+
+import model
+import pytest
+from consumer import Consumer, CheckpointStore
+
+from .model_test import ModelMock, LabelEncoderMock
+
+
+class KinesisStreamMock:
+    '''
+    In-memory stand-in for the Kinesis calls of the consumer, shards are closed
+    '''
+
+    # pylint: disable=unused-argument
+
+    class exceptions:
+        class ExpiredIteratorException(Exception):
+            pass
+
+        class ProvisionedThroughputExceededException(Exception):
+            pass
+
+    def __init__(self, shards: Dict[str, List[Dict]]) -> None:
+        self.shards = {
+            shard_id: [
+                {
+                    'Data': json.dumps(event).encode('utf-8'),
+                    'SequenceNumber': f'{index:020d}',
+                    'PartitionKey': str(event['student_id']),
+                }
+                for index, event in enumerate(events)
+            ]
+            for shard_id, events in shards.items()
+        }
+        self.get_records_calls = 0
+
+    def list_shards(self, StreamName=None, NextToken=None):
+        # One shard per page to go through the pagination
+        shard_ids = list(self.shards)
+        index = 0 if NextToken is None else int(NextToken)
+        response = {'Shards': [{'ShardId': shard_ids[index]}]}
+        if index + 1 < len(shard_ids):
+            response['NextToken'] = str(index + 1)
+        return response
+
+    def get_shard_iterator(
+        self, StreamName, ShardId, ShardIteratorType, StartingSequenceNumber=None
+    ):
+        position = 0
+        if ShardIteratorType == 'AFTER_SEQUENCE_NUMBER':
+            position = int(StartingSequenceNumber) + 1
+        return {'ShardIterator': f'{ShardId}:{position}'}
+
+    def get_records(self, ShardIterator, Limit):
+        self.get_records_calls += 1
+        shard_id, position = ShardIterator.rsplit(':', 1)
+        records = self.shards[shard_id][int(position) : int(position) + Limit]
+        next_position = int(position) + len(records)
+
+        return {
+            'Records': records,
+            # Closed shards end without a next iterator once fully read
+            'NextShardIterator': (
+                f'{shard_id}:{next_position}'
+                if next_position < len(self.shards[shard_id])
+                else None
+            ),
+            'MillisBehindLatest': 0,
+        }
+
+
+def student_events(feature_fixture, student_ids) -> List[Dict]:
+    return [
+        {'student_features': feature_fixture, 'student_id': student_id}
+        for student_id in student_ids
+    ]
+
+
+def run_consumer(
+    kinesis_client, checkpoints: CheckpointStore, put_record=None, **options
+):
+    published = []
+    model_service = model.ModelService(
+        (ModelMock(1), LabelEncoderMock('Graduate'), 'reference', 'run-1'),
+        put_record or published.append,
+        lambda *_: None,
+    )
+    consumer = Consumer(
+        kinesis_client,
+        'input-stream',
+        model_service,
+        checkpoints,
+        limit=10,
+        poll_seconds=0,
+        **options,
+    )
+    return consumer.run(), published
+
+
+def test_consumer_reads_every_shard(tmp_path, feature_fixture):
+    kinesis_client = KinesisStreamMock(
+        {
+            'shardId-0': student_events(feature_fixture, range(0, 25)),
+            'shardId-1': student_events(feature_fixture, range(100, 125)),
+        }
+    )
+    checkpoints = CheckpointStore(tmp_path / 'checkpoints.json')
+
+    processed, published = run_consumer(kinesis_client, checkpoints)
+
+    assert processed == 50
+    assert sorted(event['prediction']['student_id'] for event in published) == list(
+        range(0, 25)
+    ) + list(range(100, 125))
+    # 3 batches of at most 10 records per shard
+    assert kinesis_client.get_records_calls == 6
+
+    saved = json.loads((tmp_path / 'checkpoints.json').read_text(encoding='utf-8'))
+    assert saved == {'shardId-0': f'{24:020d}', 'shardId-1': f'{24:020d}'}
+
+
+def test_consumer_resumes_from_checkpoint(tmp_path, feature_fixture):
+    kinesis_client = KinesisStreamMock(
+        {'shardId-0': student_events(feature_fixture, range(25))}
+    )
+    CheckpointStore(tmp_path / 'checkpoints.json').set('shardId-0', f'{19:020d}')
+
+    processed, published = run_consumer(
+        kinesis_client, CheckpointStore(tmp_path / 'checkpoints.json')
+    )
+
+    assert processed == 5
+    assert [event['prediction']['student_id'] for event in published] == list(
+        range(20, 25)
+    )
+
+
+def test_failed_batch_is_read_again_from_checkpoint(tmp_path, feature_fixture):
+    kinesis_client = KinesisStreamMock(
+        {'shardId-0': student_events(feature_fixture, range(25))}
+    )
+    published, failures = [], [15]
+
+    def put_record(prediction_event):
+        student_id = prediction_event['prediction']['student_id']
+        if student_id in failures:
+            failures.remove(student_id)
+            raise RuntimeError('PutRecords failed')
+        published.append(student_id)
+
+    processed, _ = run_consumer(
+        kinesis_client, CheckpointStore(tmp_path / 'checkpoints.json'), put_record
+    )
+
+    assert processed == 25
+    # The second batch is published again from its first record
+    assert published == list(range(15)) + list(range(10, 25))
+    assert CheckpointStore(tmp_path / 'checkpoints.json').get('shardId-0') == f'{24:020d}'
+
+
+def test_failing_shard_stops_the_consumer(tmp_path, feature_fixture):
+    kinesis_client = KinesisStreamMock(
+        {
+            'shardId-0': student_events(feature_fixture, range(0, 25)),
+            'shardId-1': student_events(feature_fixture, range(100, 125)),
+        }
+    )
+
+    def put_record(prediction_event):
+        if prediction_event['prediction']['student_id'] >= 100:
+            raise RuntimeError('PutRecords failed')
+
+    with pytest.raises(RuntimeError):
+        run_consumer(
+            kinesis_client,
+            CheckpointStore(tmp_path / 'checkpoints.json'),
+            put_record,
+            max_retries=1,
+        )
+
+    # 2 attempts of the first batch of shardId-1, never checkpointed
+    assert CheckpointStore(tmp_path / 'checkpoints.json').get('shardId-1') is None
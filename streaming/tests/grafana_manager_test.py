@@ -0,0 +1,169 @@
+import time
+import sqlite3
+
+import pandas as pd
+import grafana_manager
+from bulk_writer import BulkWriter
+from grafana_manager import DriftWindow, GrafanaCallback
+
+from config.params import params
+from shared.reference_profile import ReferenceData
+
+
+class GrafanaCallbackMock(GrafanaCallback):
+    def __init__(self, drift_window: DriftWindow) -> None:
+        super().__init__(drift_window)
+        self.tables = {'historical_data': [], 'evidently_metrics': []}
+        self.windows = []
+
+    def insert_into_table(self, table_name, data) -> None:
+        self.tables[table_name].append(data)
+
+    def get_metrics(self, reference, current_data):
+        self.windows.append(current_data)
+        return {'drift_detected': False}
+
+
+class DriftBackendMock:
+    def __init__(self, metrics) -> None:
+        self.metrics = metrics
+
+    def get_metrics(self, reference, current_data):
+        return self.metrics
+
+
+def prediction_event(output: str):
+    return {'prediction': {'output': output, 'student_id': 1}}
+
+
+def test_drift_window_closes_by_count():
+    window = DriftWindow(window_size=3, window_seconds=0)
+
+    assert window.add({'value': 1}) is None
+    assert window.add({'value': 2}) is None
+    assert window.add({'value': 3}) == [{'value': 1}, {'value': 2}, {'value': 3}]
+    assert not window.flush()
+
+
+def test_drift_window_closes_by_time():
+    window = DriftWindow(window_size=100, window_seconds=0.05)
+
+    assert window.add({'value': 1}) is None
+    time.sleep(0.06)
+    assert window.add({'value': 2}) == [{'value': 1}, {'value': 2}]
+
+
+def test_report_metrics_writes_one_row_per_window(feature_fixture):
+    callback = GrafanaCallbackMock(DriftWindow(window_size=4, window_seconds=0))
+    reference = ReferenceData(pd.DataFrame([feature_fixture]), params['features'])
+
+    for _ in range(10):
+        callback.report_metrics(reference, feature_fixture, prediction_event('Dropout'))
+
+    assert len(callback.tables['historical_data']) == 10
+    assert [row['window_size'] for row in callback.tables['evidently_metrics']] == [4, 4]
+
+    callback.close()
+
+    assert [row['window_size'] for row in callback.tables['evidently_metrics']] == [
+        4,
+        4,
+        2,
+    ]
+    assert callback.windows[0].shape == (4, len(feature_fixture) + 1)
+    assert callback.windows[0]['prediction'].tolist() == ['Dropout'] * 4
+
+
+def test_drift_window_spans_batches(feature_fixture):
+    callback = GrafanaCallbackMock(DriftWindow(window_size=4, window_seconds=0.05))
+    reference = ReferenceData(pd.DataFrame([feature_fixture]), params['features'])
+
+    # Two batches of 3 rows fill a window of 4 rows
+    for _ in range(2):
+        for _ in range(3):
+            callback.report_metrics(
+                reference, feature_fixture, prediction_event('Dropout')
+            )
+        callback.flush()
+
+    assert [row['window_size'] for row in callback.tables['evidently_metrics']] == [4]
+
+    # Without new rows, the open window is only reported once it expires
+    time.sleep(0.06)
+    callback.flush()
+
+    assert [row['window_size'] for row in callback.tables['evidently_metrics']] == [4, 2]
+
+
+def test_insert_into_table_reuses_pooled_engine(tmp_path, monkeypatch, feature_fixture):
+    monkeypatch.setattr(
+        grafana_manager, 'psycopg_conn', f"sqlite:///{tmp_path / 'monitoring.db'}"
+    )
+    grafana_manager.dispose_engine()
+    opened_before = grafana_manager.connection_stats['connections_opened']
+
+    callback = GrafanaCallback()
+    for _ in range(5):
+        callback.insert_into_table('historical_data', feature_fixture)
+    callback.flush()
+
+    engine = grafana_manager.get_engine()
+    assert engine is grafana_manager.get_engine()
+    assert len(pd.read_sql_table('historical_data', engine)) == 5
+    assert grafana_manager.connection_stats['connections_opened'] - opened_before == 1
+
+    grafana_manager.dispose_engine()
+
+
+def test_window_size_is_added_to_existing_metrics_table(
+    tmp_path, monkeypatch, feature_fixture
+):
+    monkeypatch.setattr(
+        grafana_manager, 'psycopg_conn', f"sqlite:///{tmp_path / 'monitoring.db'}"
+    )
+    grafana_manager.dispose_engine()
+
+    metrics = {
+        'drift_detected': False,
+        'column_drift_metric': 0.1,
+        'number_of_drifted_columns': 0,
+        'current_share_of_missing_values': 0.0,
+        'reference_share_of_missing_values': 0.0,
+    }
+
+    # evidently_metrics as created before windows were reported
+    with sqlite3.connect(tmp_path / 'monitoring.db') as connection:
+        pd.DataFrame([metrics | {'timezone': '2023-09-01 00:00:00-05:00'}]).to_sql(
+            'evidently_metrics', connection, index=False
+        )
+
+    callback = GrafanaCallback(
+        DriftWindow(window_size=1, window_seconds=0),
+        drift_backend=DriftBackendMock(metrics),
+    )
+    callback.report_window(
+        ReferenceData(pd.DataFrame([feature_fixture]), params['features']),
+        [feature_fixture | {'prediction': 'Dropout'}],
+    )
+    callback.bulk_writer.flush()
+
+    table = pd.read_sql_table('evidently_metrics', grafana_manager.get_engine())
+    assert table['window_size'].isna().tolist() == [True, False]
+    assert table['window_size'].iloc[-1] == 1
+
+    grafana_manager.dispose_engine()
+
+
+def test_failing_monitoring_writes_do_not_raise(feature_fixture):
+    def get_engine():
+        raise ConnectionError('database is down')
+
+    callback = GrafanaCallback(
+        DriftWindow(window_size=1, window_seconds=0), BulkWriter(get_engine)
+    )
+    callback.insert_into_table('historical_data', feature_fixture)
+
+    callback.flush()
+    callback.close()
+
+    assert not callback.bulk_writer.buffers
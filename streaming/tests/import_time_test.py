@@ -0,0 +1,60 @@
+import os
+import sys
+import subprocess
+from typing import Dict
+from pathlib import Path
+
+STREAMING_DIRECTORY = Path(__file__).parent.parent
+
+# Only needed once monitoring is enabled and used
+MONITORING_MODULES = ['sqlalchemy', 'evidently', 'boto3', 'grafana_manager']
+
+
+def import_times(module: str) -> Dict[str, int]:
+    '''
+    Cumulative import time in microseconds of every module loaded by
+    `import module` in a fresh interpreter, as reported by -X importtime
+    '''
+    env = os.environ | {
+        'PYTHONPATH': os.pathsep.join(
+            [str(STREAMING_DIRECTORY), str(STREAMING_DIRECTORY.parent)]
+        )
+    }
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        times[name.strip()] = int(cumulative)
+
+    return times
+
+
+def print_report(module: str, times: Dict[str, int], top: int = 10) -> None:
+    print(f'\nSlowest imports under {module}:')
+    for name, cumulative in sorted(times.items(), key=lambda item: -item[1])[:top]:
+        print(f'{cumulative / 1000:10.1f} ms  {name}')
+
+
+def test_model_does_not_import_monitoring():
+    times = import_times('model')
+    print_report('model', times)
+
+    for module in MONITORING_MODULES:
+        assert module not in times, f'{module} is imported eagerly'
+
+
+def test_grafana_manager_defers_engine_and_drift_backend():
+    times = import_times('grafana_manager')
+    print_report('grafana_manager', times)
+
+    for module in ['sqlalchemy', 'evidently', 'scipy']:
+        assert module not in times, f'{module} is imported eagerly'
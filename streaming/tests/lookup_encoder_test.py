@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+from feature_engine.encoding import RareLabelEncoder, CountFrequencyEncoder
+
+from shared.testing import make_students
+from shared.lookup_encoder import LookupTable, LookupEncoder
+
+UNITS, BINARY = 'Curricular units 1st sem (approved)', 'Tuition fees up to date'
+COLUMNS = [UNITS, BINARY]
+
+
+def test_lookup_encoder_matches_feature_engine():
+    train = make_students(2000, seed=1, skewed=True)[COLUMNS]
+    test = make_students(500, seed=2, skewed=True)[COLUMNS]
+    test.loc[:4, UNITS] = [99, 21, 50, 30, 25]
+    test.loc[:2, BINARY] = 7
+
+    rare_label_encoder = RareLabelEncoder(variables=COLUMNS, ignore_format=True, tol=0.05)
+    count_encoder = CountFrequencyEncoder(variables=COLUMNS)
+    count_encoder.fit(rare_label_encoder.fit_transform(train))
+    expected = count_encoder.transform(rare_label_encoder.transform(test))
+
+    encoder = LookupEncoder(variables=COLUMNS, tol=0.05).fit(train)
+    from_feature_engine = LookupEncoder.from_feature_engine(
+        rare_label_encoder, count_encoder
+    )
+
+    for column in COLUMNS:
+        np.testing.assert_array_equal(
+            encoder.tables_[column].values, from_feature_engine.tables_[column].values
+        )
+
+    pd.testing.assert_frame_equal(
+        encoder.transform(test), expected.astype('float32'), check_dtype=False
+    )
+
+
+def test_lookup_table_rare_slot():
+    table = LookupTable.from_mapping({0: 10, 1: 20, 3: 30}, default=5)
+
+    encoded = table.encode([0, 1, 2, 3, 4, -1, 1.5, np.nan])
+
+    assert encoded.tolist() == [10, 20, 5, 30, 5, 5, 5, 5]
+
+
+def test_lookup_table_rejects_non_integer_categories():
+    with pytest.raises(ValueError):
+        LookupTable.from_mapping({0.5: 10}, default=0)
@@ -0,0 +1,96 @@
+import time
+
+import model
+from model_refresher import ModelRefresher, bundle_version
+
+
+class VersionSource:
+    def __init__(self, version: str) -> None:
+        self.version = version
+
+    def __call__(self) -> str:
+        return self.version
+
+
+def artifacts_loader(source: VersionSource):
+    return lambda: ('model', 'label_encoder', 'reference', source.version)
+
+
+def test_check_swaps_artifacts_on_new_version():
+    source = VersionSource('run-1')
+    model_service = model.ModelService(artifacts_loader(source)())
+    refresher = ModelRefresher(model_service, source, artifacts_loader(source))
+
+    assert not refresher.check()
+
+    source.version = 'run-2'
+    assert refresher.check()
+    assert model_service.artifacts[-1] == 'run-2'
+    assert refresher.counters == {'checks': 2, 'reloads': 1, 'failures': 0}
+
+
+def test_failed_load_keeps_serving_current_version():
+    source = VersionSource('run-1')
+    model_service = model.ModelService(artifacts_loader(source)())
+
+    def failing_loader():
+        raise OSError('registry unavailable')
+
+    refresher = ModelRefresher(model_service, source, failing_loader, interval=0.01)
+    source.version = 'run-2'
+    refresher.start()
+    time.sleep(0.1)
+    refresher.stop()
+
+    assert model_service.artifacts[-1] == 'run-1'
+    assert refresher.counters['failures'] > 0
+
+
+def test_background_refresh():
+    source = VersionSource('run-1')
+    model_service = model.ModelService(artifacts_loader(source)())
+    refresher = ModelRefresher(
+        model_service, source, artifacts_loader(source), interval=0.01
+    ).start()
+
+    source.version = 'run-2'
+    deadline = time.monotonic() + 5
+    while model_service.artifacts[-1] != 'run-2' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    refresher.stop()
+
+    assert model_service.artifacts[-1] == 'run-2'
+
+
+def test_bundle_version_follows_current_file(tmp_path):
+    (tmp_path / 'run-2').mkdir()
+    (tmp_path / 'CURRENT').write_text('run-2\n', encoding='utf-8')
+
+    assert bundle_version(tmp_path) == 'run-2'
+
+
+def test_version_source_polls_bundle(monkeypatch, tmp_path):
+    (tmp_path / 'run-1').mkdir()
+    (tmp_path / 'CURRENT').write_text('run-1', encoding='utf-8')
+    monkeypatch.setenv('MODEL_BUNDLE_PATH', str(tmp_path))
+
+    assert model.get_version_source()() == 'run-1'
+
+
+def test_pinned_model_location_is_not_polled(monkeypatch):
+    monkeypatch.delenv('MODEL_BUNDLE_PATH', raising=False)
+    monkeypatch.setenv('MODEL_LOCATION', 'runs:/abc/model')
+
+    assert model.get_version_source() is None
+
+
+def test_empty_model_location_polls_the_registry(monkeypatch):
+    # A copied .env exports the variables even when they are left empty
+    monkeypatch.delenv('MODEL_BUNDLE_PATH', raising=False)
+    monkeypatch.setenv('MODEL_LOCATION', '')
+    monkeypatch.setenv('ARTIFACT_LOCATION', '')
+    monkeypatch.delenv('STAGE', raising=False)
+    monkeypatch.setattr(model, 'registry_version', lambda name, stage: f'{name}/{stage}')
+
+    assert model.get_model_location() == f'models:/{model.MODEL_NAME}/Staging'
+    assert model.get_version_source()() == f'{model.MODEL_NAME}/Staging'
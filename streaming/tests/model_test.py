@@ -1,6 +1,13 @@
+import json
+import threading
+from types import SimpleNamespace
+from base64 import b64encode
 from pathlib import Path
 
 import model
+import pytest
+from report_executor import ReportExecutor
+from prediction_cache import PredictionCache
 
 
 def read_text(file: Path) -> str:
@@ -75,3 +82,295 @@ def test_lambda_handler():
     output = model_service.lambda_handler(EVENT)
     print(output)
     assert output == expected
+
+
+class ApprovedUnitsModelMock:
+    def predict(self, X):
+        return (X['Curricular units 2nd sem (approved)'] > 3).astype(int).to_numpy()
+
+
+class LabelEncoderArrayMock:
+    def __init__(self, classes) -> None:
+        self.classes = classes
+
+    def inverse_transform(self, prediction):
+        return [self.classes[value] for value in prediction]
+
+
+def encode_event(student_event) -> str:
+    return b64encode(json.dumps(student_event).encode('utf-8')).decode('utf-8')
+
+
+def test_lambda_handler_batch_keeps_record_order(feature_fixture):
+    approved_units = [5, 0, 4, 1, 3]
+    records = [
+        {
+            'kinesis': {
+                'data': encode_event(
+                    {
+                        'student_features': feature_fixture
+                        | {'Curricular units 2nd sem (approved)': units},
+                        'student_id': student_id,
+                    }
+                )
+            }
+        }
+        for student_id, units in enumerate(approved_units)
+    ]
+
+    model_service = model.ModelService(
+        (ApprovedUnitsModelMock(), LabelEncoderArrayMock(['Dropout', 'Graduate']), '1')
+    )
+    output = model_service.lambda_handler({'Records': records})
+
+    assert [event['prediction'] for event in output['predictions']] == [
+        {'output': 'Graduate', 'student_id': 0},
+        {'output': 'Dropout', 'student_id': 1},
+        {'output': 'Graduate', 'student_id': 2},
+        {'output': 'Dropout', 'student_id': 3},
+        {'output': 'Dropout', 'student_id': 4},
+    ]
+
+
+def test_predict_batch_empty():
+    model_service = model.ModelService((ModelMock(1), LabelEncoderMock('Dropout'), ''))
+    assert not model_service.predict_batch([])
+
+
+def test_lambda_handler_drains_reports(feature_fixture):
+    records = [
+        {
+            'kinesis': {
+                'data': encode_event(
+                    {'student_features': feature_fixture, 'student_id': student_id}
+                )
+            }
+        }
+        for student_id in range(20)
+    ]
+    put_records, reports = [], []
+
+    model_service = model.ModelService(
+        (ModelMock(1), LabelEncoderMock('Graduate'), None, '1'),
+        put_record=put_records.append,
+        report_metrics=lambda *args: reports.append(args),
+        report_executor=ReportExecutor(max_workers=2, queue_size=5, submit_timeout=5),
+    )
+    model_service.lambda_handler({'Records': records})
+
+    assert len(put_records) == 20
+    assert len(reports) == 20
+    assert model_service.report_executor.metrics()['completed'] == 20
+
+
+class KinesisClientMock:
+    class exceptions:
+        class ProvisionedThroughputExceededException(Exception):
+            pass
+
+    def __init__(self, failures=()) -> None:
+        # Partition keys failing on each successive call, None throttles the request
+        self.failures = list(failures)
+        self.calls = []
+
+    def put_records(self, StreamName, Records):
+        failing = self.failures.pop(0) if self.failures else set()
+        self.calls.append((StreamName, [entry['PartitionKey'] for entry in Records]))
+
+        if failing is None:
+            raise self.exceptions.ProvisionedThroughputExceededException()
+
+        results = [
+            (
+                {'ErrorCode': 'ProvisionedThroughputExceededException'}
+                if entry['PartitionKey'] in failing
+                else {'SequenceNumber': '1', 'ShardId': 'shardId-000000000000'}
+            )
+            for entry in Records
+        ]
+        failed = sum('ErrorCode' in result for result in results)
+        return {'FailedRecordCount': failed, 'Records': results}
+
+
+def prediction_events(n):
+    return [
+        {
+            'model': 'student-dropout-classifier',
+            'version': '1',
+            'prediction': {'output': 'Graduate', 'student_id': student_id},
+        }
+        for student_id in range(n)
+    ]
+
+
+def test_kinesis_callback_batches_put_records():
+    client = KinesisClientMock()
+    callback = model.KinesisCallback(client, 'output', batch_size=2)
+
+    for event in prediction_events(5):
+        callback.put_record(event)
+    callback.flush()
+
+    assert client.calls == [
+        ('output', ['0', '1']),
+        ('output', ['2', '3']),
+        ('output', ['4']),
+    ]
+
+
+def test_kinesis_callback_respects_batch_bytes():
+    client = KinesisClientMock()
+    event_bytes = len(json.dumps(prediction_events(1)[0])) + 1
+    callback = model.KinesisCallback(client, 'output', batch_bytes=2 * event_bytes)
+
+    for event in prediction_events(5):
+        callback.put_record(event)
+    callback.flush()
+
+    assert [len(keys) for _, keys in client.calls] == [2, 2, 1]
+
+
+def test_kinesis_callback_retries_only_failed_records():
+    client = KinesisClientMock(failures=[{'1', '3'}, {'3'}])
+    callback = model.KinesisCallback(client, 'output', backoff_seconds=0)
+
+    for event in prediction_events(4):
+        callback.put_record(event)
+    callback.flush()
+
+    assert client.calls == [
+        ('output', ['0', '1', '2', '3']),
+        ('output', ['1', '3']),
+        ('output', ['3']),
+    ]
+
+
+def test_kinesis_callback_raises_after_max_retries():
+    client = KinesisClientMock(failures=[{'0'}] * 3)
+    callback = model.KinesisCallback(client, 'output', max_retries=2, backoff_seconds=0)
+    callback.put_record(prediction_events(1)[0])
+
+    with pytest.raises(RuntimeError):
+        callback.flush()
+
+    assert len(client.calls) == 3
+
+
+def test_kinesis_callback_retries_throttled_requests(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(model.time, 'sleep', sleeps.append)
+    client = KinesisClientMock(failures=[None, None, {'1'}])
+    callback = model.KinesisCallback(client, 'output', backoff_seconds=0.1)
+
+    for event in prediction_events(2):
+        callback.put_record(event)
+    callback.flush()
+
+    assert [keys for _, keys in client.calls] == [['0', '1']] * 3 + [['1']]
+    assert sleeps == pytest.approx([0.1, 0.2, 0.4])
+
+
+def test_kinesis_callback_raises_after_throttled_retries():
+    client = KinesisClientMock(failures=[None] * 3)
+    callback = model.KinesisCallback(client, 'output', max_retries=2, backoff_seconds=0)
+    callback.put_record(prediction_events(1)[0])
+
+    with pytest.raises(RuntimeError):
+        callback.flush()
+
+    assert len(client.calls) == 3
+
+
+def test_kinesis_callback_flushes_only_the_calling_thread():
+    client = KinesisClientMock()
+    callback = model.KinesisCallback(client, 'output')
+    events = prediction_events(4)
+
+    # Another shard worker buffers its events without flushing them
+    other_thread = threading.Thread(
+        target=lambda: [callback.put_record(event) for event in events[2:]]
+    )
+    other_thread.start()
+    other_thread.join()
+
+    for event in events[:2]:
+        callback.put_record(event)
+    callback.flush()
+
+    assert client.calls == [('output', ['0', '1'])]
+
+
+class CountingModelMock(ModelMock):
+    def __init__(self, value) -> None:
+        super().__init__(value)
+        self.scored_rows = 0
+
+    def predict(self, X):
+        self.scored_rows += len(X)
+        return super().predict(X)
+
+
+def test_predict_batch_scores_only_cache_misses(feature_fixture):
+    model_mock = CountingModelMock(1)
+    artifacts = (model_mock, LabelEncoderMock('Graduate'), 'reference', 'run-1')
+    model_service = model.ModelService(
+        artifacts, prediction_cache=PredictionCache(capacity=10)
+    )
+    other_features = feature_fixture | {'GDP': 0.32}
+
+    model_service.predict_batch([feature_fixture, feature_fixture, other_features])
+    predictions = model_service.predict_batch([other_features, feature_fixture])
+
+    assert predictions == ['Graduate', 'Graduate']
+    assert model_mock.scored_rows == 2
+    assert model_service.prediction_cache.metrics()['hits'] == 2
+
+    # A new model version is scored again
+    model_service.artifacts = artifacts[:-1] + ('run-2',)
+    model_service.predict_batch([feature_fixture])
+
+    assert model_mock.scored_rows == 3
+
+
+def test_correlation_id_is_echoed(feature_fixture):
+    model_service = model.ModelService(
+        (ModelMock(1), LabelEncoderMock('Graduate'), 'reference', 'run-1')
+    )
+
+    output = model_service.handle_events(
+        [
+            {
+                'student_features': feature_fixture,
+                'student_id': 1,
+                'correlation_id': 'a1',
+            },
+            {'student_features': feature_fixture, 'student_id': 2},
+        ]
+    )
+
+    predictions = output['predictions']
+    assert predictions[0]['correlation_id'] == 'a1'
+    assert 'correlation_id' not in predictions[1]
+
+
+def test_model_run_id_does_not_download_registry_models(monkeypatch):
+    def load_model(_):
+        raise AssertionError('the model is downloaded')
+
+    class MlflowClientMock:
+        def get_model_version(self, name, version):
+            return SimpleNamespace(run_id=f'{name}-{version}')
+
+    monkeypatch.setattr(model.Model, 'load', load_model)
+    monkeypatch.setattr(model.mlflow, 'MlflowClient', MlflowClientMock)
+    monkeypatch.setattr(model, 'registry_version', lambda name, stage: f'{name}-{stage}')
+
+    assert model.model_run_id('models:/classifier/Staging') == 'classifier-Staging'
+    assert model.model_run_id('models:/classifier/3') == 'classifier-3'
+
+
+def test_model_run_id_without_version_in_stage(monkeypatch):
+    monkeypatch.setattr(model, 'registry_version', lambda name, stage: None)
+
+    with pytest.raises(ValueError):
+        model.model_run_id('models:/classifier/Production')
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from native_drift import NativeDriftBackend
+from grafana_manager import get_drift_backend
+from evidently_report import EvidentlyDriftBackend
+
+from config.params import params
+from shared.testing import make_students
+from shared.reference_profile import ReferenceData
+
+
+def make_window(n_rows: int, seed: int, shift: float = 0.0) -> pd.DataFrame:
+    students = make_students(n_rows, seed)
+    return students.assign(
+        GDP=students['GDP'] + shift,
+        prediction=np.where(
+            students['Tuition fees up to date'] == 1, 'Graduate', 'Dropout'
+        ),
+    )
+
+
+@pytest.mark.parametrize(
+    'reference_rows, current_rows, shift',
+    [
+        (500, 50, 0.0),  # p-value tests: KS, chi-square and Z-test
+        (500, 200, 1.0),
+        (3000, 200, 0.0),  # distances: Wasserstein and Jensen-Shannon
+        (3000, 300, 1.0),
+    ],
+)
+def test_native_backend_matches_evidently(reference_rows, current_rows, shift):
+    reference = ReferenceData(make_window(reference_rows, 1), params['features'])
+    current_data = make_window(current_rows, 2, shift)
+    current_data.loc[0, 'Inflation rate'] = np.nan
+
+    expected = EvidentlyDriftBackend().get_metrics(reference, current_data)
+    output = NativeDriftBackend().get_metrics(reference, current_data)
+
+    # Exact counts for every column, like the features of the real dataset
+    assert all(column['exact'] for column in reference.profile['columns'].values())
+
+    assert output.keys() == expected.keys()
+    assert output['drift_detected'] == expected['drift_detected']
+    assert output['number_of_drifted_columns'] == expected['number_of_drifted_columns']
+    assert output['column_drift_metric'] == pytest.approx(expected['column_drift_metric'])
+    assert output['current_share_of_missing_values'] == pytest.approx(
+        expected['current_share_of_missing_values']
+    )
+    assert output['reference_share_of_missing_values'] == 0
+
+
+def test_native_backend_detects_shift():
+    reference = ReferenceData(make_window(3000, 1), params['features'])
+
+    output = NativeDriftBackend().get_metrics(reference, make_window(300, 2, shift=1.0))
+
+    assert output['number_of_drifted_columns'] >= 1
+
+
+def test_native_backend_is_the_default():
+    assert isinstance(get_drift_backend(), NativeDriftBackend)
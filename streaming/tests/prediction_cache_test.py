@@ -0,0 +1,55 @@
+from prediction_cache import PredictionCache, features_key
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_features_key_is_canonical(feature_fixture):
+    reordered = dict(reversed(list(feature_fixture.items())))
+    as_floats = {name: float(value) for name, value in feature_fixture.items()}
+
+    assert features_key(feature_fixture) == features_key(reordered)
+    assert features_key(feature_fixture) == features_key(as_floats)
+    assert features_key(feature_fixture) != features_key(feature_fixture | {'GDP': 0})
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(capacity=2)
+    cache.put('run', 'a', 'Dropout')
+    cache.put('run', 'b', 'Graduate')
+    cache.get('run', 'a')
+    cache.put('run', 'c', 'Graduate')
+
+    assert cache.get('run', 'b') is None
+    assert cache.get('run', 'a') == 'Dropout'
+    assert cache.metrics()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = PredictionCache(capacity=10, ttl_seconds=60, clock=clock)
+    cache.put('run', 'a', 'Dropout')
+
+    clock.now = 59
+    assert cache.get('run', 'a') == 'Dropout'
+
+    clock.now = 60
+    assert cache.get('run', 'a') is None
+    assert cache.metrics()['expirations'] == 1
+
+
+def test_new_run_id_invalidates_cache():
+    cache = PredictionCache(capacity=10)
+    cache.put('old', 'a', 'Dropout')
+
+    assert cache.get('new', 'a') is None
+
+    metrics = cache.metrics()
+    assert metrics['invalidations'] == 1
+    assert metrics['size'] == 0
+    assert (metrics['hits'], metrics['misses']) == (0, 1)
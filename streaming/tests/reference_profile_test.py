@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from config.params import params
+from shared.reference_profile import (
+    ReferenceData,
+    profile_column,
+    load_reference_profile,
+    save_reference_dataset,
+    save_reference_profile,
+    build_reference_profile,
+)
+
+
+def reference_dataset(feature_fixture) -> pd.DataFrame:
+    dataset = pd.DataFrame([feature_fixture] * 4)
+    dataset.loc[1, 'GDP'] = 0.32
+    dataset.loc[2, 'GDP'] = None
+    dataset['prediction'] = ['Dropout', 'Graduate', 'Graduate', 'Graduate']
+    return dataset
+
+
+def test_build_reference_profile(feature_fixture):
+    profile = build_reference_profile(
+        reference_dataset(feature_fixture),
+        params['features']['numerical'],
+        params['features']['categorical'],
+    )
+
+    assert profile['n_rows'] == 4
+    assert profile['n_missing'] == 1
+    assert profile['n_cells'] == 32
+    assert profile['columns']['GDP'] == {
+        'type': 'numerical',
+        'exact': True,
+        'values': [0.32, 1.74],
+        'counts': [1, 2],
+        'missing': 1,
+        'std': float(np.std([1.74, 0.32, 1.74])),
+    }
+    assert profile['columns']['prediction']['values'] == ['Dropout', 'Graduate']
+    assert profile['columns']['prediction']['counts'] == [1, 3]
+    assert profile['columns']['Scholarship holder']['type'] == 'categorical'
+
+
+def test_profile_column_bins_high_cardinality_columns():
+    column = pd.Series(np.random.default_rng(0).normal(size=5000))
+
+    profile = profile_column(column, 'numerical')
+
+    assert not profile['exact']
+    assert len(profile['values']) == 1000
+    assert sum(profile['counts']) == 5000
+
+
+def test_reference_profile_round_trip(tmp_path, feature_fixture):
+    profile = build_reference_profile(
+        reference_dataset(feature_fixture),
+        params['features']['numerical'],
+        params['features']['categorical'],
+    )
+    save_reference_profile(profile, tmp_path / 'reference_profile.json')
+
+    assert load_reference_profile(tmp_path / 'reference_profile.json') == profile
+    assert load_reference_profile(tmp_path / 'missing.json') is None
+
+
+def test_reference_data_builds_profile_once(feature_fixture):
+    reference = ReferenceData(reference_dataset(feature_fixture), params['features'])
+
+    profile = reference.profile
+
+    assert reference.profile is profile
+    assert reference.share_of_missing_values == 1 / 32
+
+
+def test_reference_dataset_is_loaded_on_first_use(tmp_path, feature_fixture):
+    dataset = reference_dataset(feature_fixture).set_index(pd.Index([7, 3, 5, 1]))
+    save_reference_dataset(dataset, tmp_path / 'reference.arrow')
+
+    reference = ReferenceData(
+        None, params['features'], dataset_path=tmp_path / 'reference.arrow'
+    )
+
+    assert reference._dataset is None  # pylint: disable=protected-access
+    loaded = reference.dataset
+    pd.testing.assert_frame_equal(loaded, dataset.reset_index(drop=True))
+    assert reference.dataset is loaded
+    assert reference.share_of_missing_values == 1 / 32
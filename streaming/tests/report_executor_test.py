@@ -0,0 +1,43 @@
+import time
+import threading
+
+from report_executor import ReportExecutor
+
+
+def test_drain_waits_for_every_job():
+    done = []
+    executor = ReportExecutor(max_workers=2, queue_size=10, submit_timeout=1)
+
+    for value in range(5):
+        executor.submit(lambda value: time.sleep(0.01) or done.append(value), value)
+
+    assert executor.drain(timeout=5)
+    assert sorted(done) == [0, 1, 2, 3, 4]
+    assert executor.metrics()['completed'] == 5
+    assert executor.metrics()['in_flight'] == 0
+
+
+def test_full_queue_drops_jobs():
+    release = threading.Event()
+    executor = ReportExecutor(max_workers=1, queue_size=1, submit_timeout=0)
+
+    accepted = [executor.submit(release.wait) for _ in range(4)]
+
+    assert accepted == [True, True, False, False]
+    assert executor.metrics()['dropped'] == 2
+    assert executor.metrics()['queue_depth'] == 1
+
+    release.set()
+    assert executor.drain(timeout=5)
+    assert executor.metrics()['max_queue_depth'] == 1
+
+
+def test_failed_jobs_are_counted():
+    def failing_job():
+        raise ValueError('boom')
+
+    executor = ReportExecutor(max_workers=1, queue_size=1, submit_timeout=1)
+    executor.submit(failing_job)
+
+    assert executor.drain(timeout=5)
+    assert executor.metrics()['failed'] == 1
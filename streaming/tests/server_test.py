@@ -0,0 +1,189 @@
+import time
+import asyncio
+import threading
+
+import model
+import pytest
+from server import MicroBatcher, QueueFullError, RequestTooLargeError, create_app
+from stage_metrics import StageMetrics
+from fastapi.testclient import TestClient
+
+
+class RecordingPredictor:
+    def __init__(self, delay: float = 0) -> None:
+        self.delay = delay
+        self.batches = []
+
+    def __call__(self, features_batch):
+        time.sleep(self.delay)
+        self.batches.append(len(features_batch))
+        return [features['GDP'] for features in features_batch]
+
+
+def test_concurrent_predictions_are_coalesced():
+    predictor = RecordingPredictor()
+
+    async def scenario():
+        batcher = MicroBatcher(predictor, max_batch_size=8, max_wait_ms=50)
+        await batcher.start()
+        results = await asyncio.gather(*(batcher.predict({'GDP': i}) for i in range(20)))
+        await batcher.stop()
+        return results
+
+    assert asyncio.run(scenario()) == list(range(20))
+    assert predictor.batches == [8, 8, 4]
+
+
+def test_full_queue_rejects_predictions():
+    predictor = RecordingPredictor(delay=0.2)
+
+    async def scenario():
+        batcher = MicroBatcher(
+            predictor, max_batch_size=1, max_concurrency=1, max_queue_size=2
+        )
+        await batcher.start()
+        results = await asyncio.gather(
+            *(batcher.predict({'GDP': i}) for i in range(5)), return_exceptions=True
+        )
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert sum(isinstance(result, QueueFullError) for result in results) > 0
+
+
+def test_batches_are_queued_whole_or_rejected():
+    predictor = RecordingPredictor(delay=0.2)
+
+    async def scenario():
+        batcher = MicroBatcher(
+            predictor, max_batch_size=2, max_concurrency=1, max_queue_size=4
+        )
+        await batcher.start()
+
+        with pytest.raises(RequestTooLargeError):
+            await batcher.predict_many([{'GDP': i} for i in range(5)])
+
+        pending = asyncio.ensure_future(
+            batcher.predict_many([{'GDP': i} for i in range(4)])
+        )
+        await asyncio.sleep(0)
+        # The first batch is being scored, 2 slots are free
+        with pytest.raises(QueueFullError):
+            await batcher.predict_many([{'GDP': i} for i in range(3)])
+
+        results = await pending
+        await batcher.stop()
+        return results, batcher.counters
+
+    results, counters = asyncio.run(scenario())
+
+    assert results == [0, 1, 2, 3]
+    assert predictor.batches == [2, 2]
+    assert counters['rejected'] == 8
+
+
+def test_stop_waits_for_running_batches():
+    predictor = RecordingPredictor(delay=0.2)
+
+    async def scenario():
+        batcher = MicroBatcher(predictor, max_batch_size=4, max_wait_ms=50)
+        await batcher.start()
+        pending = [
+            asyncio.ensure_future(batcher.predict({'GDP': i})) for i in range(4)
+        ]
+        # Let the batch reach the executor
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+
+        assert not batcher.scoring
+        return [future.result() for future in pending]
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3]
+    assert predictor.batches == [4]
+
+
+class ModelServiceMock:
+    def __init__(self, stage_metrics=None) -> None:
+        self.artifacts = ('model', 'label_encoder', 'reference', 'run-1')
+        self.stage_metrics = stage_metrics or StageMetrics()
+
+    def predict_batch(self, features_batch, artifacts):
+        self.stage_metrics.record('predict', 0.001)
+        # The next version is loaded while this batch is being scored
+        version = int(artifacts[-1].split('-')[1])
+        self.artifacts = artifacts[:-1] + (f'run-{version + 1}',)
+        return [
+            'Graduate' if features['GDP'] > 0 else 'Dropout'
+            for features in features_batch
+        ]
+
+
+def wait_until_ready(client: TestClient) -> None:
+    deadline = time.monotonic() + 5
+    while client.get('/ready').status_code != 200 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_predict_endpoints(feature_fixture):
+    app = create_app(ModelServiceMock, max_wait_ms=1)
+
+    with TestClient(app) as client:
+        wait_until_ready(client)
+
+        response = client.post(
+            '/predict', json={'student_features': feature_fixture, 'student_id': 7}
+        )
+        assert response.json() == {
+            'model': model.MODEL_NAME,
+            'version': 'run-1',
+            'prediction': {'output': 'Graduate', 'student_id': 7},
+        }
+
+        response = client.post(
+            '/predict_batch',
+            json={
+                'instances': [
+                    {'student_features': feature_fixture},
+                    {'student_features': feature_fixture | {'GDP': -1.7}},
+                ]
+            },
+        )
+        outputs = [
+            (item['prediction']['output'], item['version'])
+            for item in response.json()['predictions']
+        ]
+        # Scored in one micro-batch by the version that followed the first request
+        assert outputs == [('Graduate', 'run-2'), ('Dropout', 'run-2')]
+
+
+def test_micro_batches_emit_their_stage_metrics(feature_fixture):
+    emitted = []
+    stage_metrics = StageMetrics(
+        [lambda histograms, properties: emitted.append((list(histograms), properties))]
+    )
+    app = create_app(lambda: ModelServiceMock(stage_metrics), max_wait_ms=1)
+
+    with TestClient(app) as client:
+        wait_until_ready(client)
+        client.post('/predict', json={'student_features': feature_fixture})
+
+    assert emitted == [(['predict'], {'version': 'run-1', 'batch_size': 1})]
+
+
+def test_not_ready_while_model_loads():
+    loaded = threading.Event()
+
+    def load_model_service():
+        loaded.wait(5)
+        return ModelServiceMock()
+
+    with TestClient(create_app(load_model_service)) as client:
+        assert client.get('/health').status_code == 200
+        assert client.get('/ready').status_code == 503
+        assert client.post('/predict', json={'student_features': {}}).status_code == 503
+
+        loaded.set()
+        wait_until_ready(client)
+        assert client.get('/ready').json()['version'] == 'run-1'
@@ -0,0 +1,237 @@
+import json
+import threading
+
+import model
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from bulk_writer import BulkWriter
+from stage_metrics import (
+    EmfSink,
+    Histogram,
+    PostgresSink,
+    StageMetrics,
+    create_stage_metrics,
+)
+from report_executor import ReportExecutor
+
+from .model_test import ModelMock, LabelEncoderMock
+
+
+class SinkMock:
+    def __init__(self) -> None:
+        self.batches = []
+
+    def __call__(self, histograms, properties):
+        self.batches.append(
+            ({name: h.count for name, h in histograms.items()}, properties)
+        )
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+
+    for milliseconds in [1.0] * 90 + [40.0] * 9 + [900.0]:
+        histogram.record(milliseconds)
+
+    summary = histogram.summary()
+
+    assert summary['count'] == 100
+    assert summary['min_ms'] == 1.0
+    assert summary['max_ms'] == 900.0
+    # Upper bounds of the 0.8-1.6 ms, 25.6-51.2 ms and 819.2-1638.4 ms buckets
+    assert summary['p50_ms'] == pytest.approx(1.6)
+    assert summary['p95_ms'] == pytest.approx(51.2)
+    assert summary['p99_ms'] == pytest.approx(51.2)
+    assert histogram.percentile(1.0) == 900.0
+    assert [count for count in histogram.counts if count] == [90, 9, 1]
+
+
+def test_disabled_stage_metrics_record_nothing():
+    stage_metrics = StageMetrics()
+
+    with stage_metrics.batch():
+        with stage_metrics.stage('predict'):
+            pass
+        stage_metrics.record('batch', 0.1)
+        stage_metrics.emit(version='1')
+
+    assert not stage_metrics.enabled
+    assert stage_metrics.batch_histograms.get() is None
+
+
+def test_emit_sends_and_resets_histograms():
+    sink = SinkMock()
+    stage_metrics = StageMetrics([sink])
+
+    with stage_metrics.batch():
+        for _ in range(3):
+            with stage_metrics.stage('predict'):
+                pass
+        stage_metrics.emit(version='1')
+        # Nothing was measured since the last emit
+        stage_metrics.emit(version='1')
+
+    assert sink.batches == [({'predict': 3}, {'version': '1'})]
+
+
+def test_samples_outside_a_batch_are_dropped():
+    sink = SinkMock()
+    stage_metrics = StageMetrics([sink])
+
+    with stage_metrics.stage('predict'):
+        pass
+    stage_metrics.record('predict', 0.01)
+    stage_metrics.emit(version='1')
+
+    with stage_metrics.batch():
+        stage_metrics.record('decode', 0.01)
+        stage_metrics.emit(version='2')
+
+    assert sink.batches == [({'decode': 1}, {'version': '2'})]
+
+
+def test_batches_emit_only_their_own_samples():
+    sink = SinkMock()
+    stage_metrics = StageMetrics([sink])
+    report_executor = ReportExecutor(max_workers=1)
+    other_batch_started, first_batch_emitted = threading.Event(), threading.Event()
+
+    def other_shard():
+        with stage_metrics.batch():
+            stage_metrics.record('predict', 0.01)
+            other_batch_started.set()
+            first_batch_emitted.wait(5)
+            stage_metrics.emit(shard='other')
+
+    thread = threading.Thread(target=other_shard)
+    thread.start()
+    other_batch_started.wait(5)
+
+    with stage_metrics.batch():
+        stage_metrics.record('decode', 0.01)
+        # Recorded by a report thread, still part of the batch that submitted the job
+        report_executor.submit(stage_metrics.record, 'postgres_write', 0.01)
+        report_executor.drain()
+        stage_metrics.emit(shard='first')
+
+    first_batch_emitted.set()
+    thread.join()
+    report_executor.shutdown()
+
+    assert sink.batches == [
+        ({'decode': 1, 'postgres_write': 1}, {'shard': 'first'}),
+        ({'predict': 1}, {'shard': 'other'}),
+    ]
+
+
+def test_failing_sink_does_not_raise():
+    def failing_sink(*_):
+        raise ConnectionError('database is down')
+
+    sink = SinkMock()
+    stage_metrics = StageMetrics([failing_sink, sink])
+
+    with stage_metrics.batch():
+        stage_metrics.record('predict', 0.01)
+        stage_metrics.emit()
+
+    assert len(sink.batches) == 1
+
+
+def test_emf_sink_writes_one_line_per_batch():
+    lines = []
+    stage_metrics = StageMetrics([EmfSink('Test', {'Model': 'classifier'}, lines.append)])
+
+    with stage_metrics.batch():
+        stage_metrics.record('predict', 0.002)
+        stage_metrics.record('predict', 0.004)
+        stage_metrics.record('decode', 0.0001)
+        stage_metrics.emit(batch_size=2)
+
+    assert len(lines) == 1
+
+    document = json.loads(lines[0])
+    directive = document['_aws']['CloudWatchMetrics'][0]
+
+    assert directive['Namespace'] == 'Test'
+    assert directive['Dimensions'] == [['Model']]
+    assert [metric['Name'] for metric in directive['Metrics']] == ['predict', 'decode']
+    assert document['Model'] == 'classifier'
+    assert document['batch_size'] == 2
+    # EMF metric values are numbers or arrays of numbers
+    assert document['predict'] == pytest.approx([2.0, 4.0])
+    assert document['decode'] == pytest.approx([0.1])
+
+
+def test_emf_sink_spreads_large_stages_over_lines():
+    lines = []
+    stage_metrics = StageMetrics([EmfSink('Test', {}, lines.append)])
+
+    with stage_metrics.batch():
+        for _ in range(250):
+            stage_metrics.record('decode', 0.001)
+        stage_metrics.record('predict', 0.002)
+        stage_metrics.emit()
+
+    documents = [json.loads(line) for line in lines]
+
+    assert [len(document['decode']) for document in documents] == [100, 100, 50]
+    assert [
+        [metric['Name'] for metric in document['_aws']['CloudWatchMetrics'][0]['Metrics']]
+        for document in documents
+    ] == [['decode', 'predict'], ['decode'], ['decode']]
+    assert all(
+        isinstance(value, float) for document in documents for value in document['decode']
+    )
+
+
+def test_postgres_sink_writes_a_row_per_stage(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'monitoring.db'}")
+    stage_metrics = StageMetrics([PostgresSink(BulkWriter(lambda: engine))])
+
+    with stage_metrics.batch():
+        stage_metrics.record('predict', 0.003)
+        stage_metrics.record('decode', 0.001)
+        stage_metrics.emit(version='123', batch_size=10)
+
+    rows = pd.read_sql_table('stage_latency', engine)
+
+    assert rows['stage'].tolist() == ['predict', 'decode']
+    assert rows['version'].tolist() == ['123', '123']
+    assert rows['count'].tolist() == [1, 1]
+    assert rows.loc[0, 'max_ms'] == pytest.approx(3.0)
+
+
+def test_unknown_sink():
+    with pytest.raises(ValueError):
+        create_stage_metrics('statsd')
+
+
+def test_handle_events_times_every_stage(feature_fixture):
+    sink = SinkMock()
+    model_service = model.ModelService(
+        (ModelMock(1), LabelEncoderMock('Graduate'), None, '123'),
+        put_record=lambda _: None,
+        report_metrics=lambda *_: None,
+        stage_metrics=StageMetrics([sink]),
+    )
+
+    model_service.handle_events(
+        [{'student_features': feature_fixture, 'student_id': i} for i in range(3)]
+    )
+
+    stages, properties = sink.batches[0]
+
+    assert len(sink.batches) == 1
+    assert properties == {'version': '123', 'batch_size': 3}
+    assert stages == {
+        'dataframe': 1,
+        'predict': 1,
+        'inverse_transform': 1,
+        'report_submit': 3,
+        'put_record': 3,
+        'report_drain': 1,
+        'flush': 1,
+        'batch': 1,
+    }
@@ -78,7 +78,15 @@ with st.form('form', clear_on_submit=True):
             unsafe_allow_html=True,
         )
 
-        predict()
+        try:
+            predict()
+        except TimeoutError:
+            result_prediction.markdown(
+                "<h4 style='text-align: center; color: black;'>"
+                "The prediction is taking too long, please try again</h4>",
+                unsafe_allow_html=True,
+            )
+            st.stop()
 
         output = prediction['prediction']['output']
 
@@ -1,11 +1,31 @@
 import os
 import json
+import time
+import uuid
 import logging
+import threading
+from typing import Dict, Optional
+from datetime import datetime, timezone
+from functools import lru_cache
+from collections import OrderedDict
 
 import boto3
 
 PREDICTIONS_INPUT_STREAM: str = os.getenv('PREDICTIONS_INPUT_STREAM')
 PREDICTIONS_OUTPUT_STREAM: str = os.getenv('PREDICTIONS_OUTPUT_STREAM')
+PREDICTION_TIMEOUT_SECONDS = float(os.getenv('PREDICTION_TIMEOUT_SECONDS', '60'))
+PREDICTION_POLL_SECONDS = float(os.getenv('PREDICTION_POLL_SECONDS', '0.25'))
+# Longest wait between reads of the output stream while it is throttled
+PREDICTION_MAX_BACKOFF_SECONDS = float(os.getenv('PREDICTION_MAX_BACKOFF_SECONDS', '5'))
+
+# Replies read for requests that already timed out are dropped beyond this
+MAX_UNCLAIMED_REPLIES = 1000
+
+
+@lru_cache(maxsize=None)
+def get_kinesis_client():
+    # boto3 clients are thread-safe, one is shared by every Streamlit session
+    return boto3.client('kinesis')
 
 
 class KinesisStream:
@@ -13,48 +33,197 @@ class KinesisStream:
         self.kinesis_client = kinesis_client
         self.name = name
 
-    def put_record(self, data):
+    def put_record(self, data, partition_key: str):
         try:
-            self.kinesis_client.put_record(
-                StreamName=self.name, Data=json.dumps(data), PartitionKey='1'
+            response = self.kinesis_client.put_record(
+                StreamName=self.name, Data=json.dumps(data), PartitionKey=partition_key
             )
 
             logging.info('Put records in stream %s.', self.name)
 
+            return response
         except:
             logging.exception('Could not put record in stream %s.', self.name)
             raise
 
-    def get_records(self, shard_id: str, shard_iterator_type: str = 'TRIM_HORIZON'):
-        try:
-            shard_iterator = self.kinesis_client.get_shard_iterator(
-                StreamName=self.name,
-                ShardId=shard_id,
-                ShardIteratorType=shard_iterator_type,
-            )
-
-            result = self.kinesis_client.get_records(
-                ShardIterator=shard_iterator['ShardIterator']
-            )
-            response = result['Records']
-
-            response = json.loads(response[0]['Data'])
 
-            logging.info('Get records from stream %s.', self.name)
+class ReplyReader:
+    '''
+    Reads every shard of the output stream from where it stopped last time and
+    hands each prediction to the request with the same correlation id.
+
+    Iterators start at LATEST when the reader is created, so it must exist
+    before the first request is sent. Expired iterators are recreated after
+    the last sequence number read on their shard, or at the time the shard
+    was last found empty.
+
+    One waiting session at a time reads the stream, at most every
+    `poll_seconds`, and wakes the others up. The lock is not held during the
+    GetRecords calls. Throttled reads back off exponentially.
+    '''
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        kinesis_client,
+        name: str,
+        *,
+        poll_seconds: float = PREDICTION_POLL_SECONDS,
+        max_backoff_seconds: float = PREDICTION_MAX_BACKOFF_SECONDS,
+    ) -> None:
+        self.kinesis_client = kinesis_client
+        self.name = name
+        self.poll_seconds = poll_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.condition = threading.Condition()
+        self.polling = False
+        self.next_poll = 0.0
+        self.throttled_polls = 0
+        self.shard_iterators: Dict[str, Optional[str]] = {}
+        self.sequence_numbers: Dict[str, str] = {}
+        self.read_at: Dict[str, datetime] = {}
+        self.replies: OrderedDict[str, Dict] = OrderedDict()
+
+        started_at = datetime.now(timezone.utc)
+        for shard_id in self.list_shards():
+            self.read_at[shard_id] = started_at
+            self.shard_iterators[shard_id] = self.shard_iterator(shard_id, 'LATEST')
+
+    def list_shards(self):
+        request = {'StreamName': self.name}
+
+        while True:
+            response = self.kinesis_client.list_shards(**request)
+            yield from (shard['ShardId'] for shard in response['Shards'])
+
+            if 'NextToken' not in response:
+                return
+
+            request = {'NextToken': response['NextToken']}
+
+    def shard_iterator(self, shard_id: str, iterator_type: Optional[str] = None) -> str:
+        sequence_number = self.sequence_numbers.get(shard_id)
+
+        if iterator_type is not None:
+            position = {'ShardIteratorType': iterator_type}
+        elif sequence_number is None:
+            # Nothing read yet, LATEST would skip the records sent since the last read
+            position = {
+                'ShardIteratorType': 'AT_TIMESTAMP',
+                'Timestamp': self.read_at[shard_id],
+            }
+        else:
+            position = {
+                'ShardIteratorType': 'AFTER_SEQUENCE_NUMBER',
+                'StartingSequenceNumber': sequence_number,
+            }
+
+        return self.kinesis_client.get_shard_iterator(
+            StreamName=self.name, ShardId=shard_id, **position
+        )['ShardIterator']
+
+    def poll(self) -> bool:
+        '''
+        One GetRecords call per open shard, keeping every reply by correlation id.
+        Return whether a shard was throttled.
+        '''
+        # Only the polling session reads and updates the iterators
+        replies = {}
+        throttled = False
+
+        for shard_id, shard_iterator in self.shard_iterators.items():
+            if shard_iterator is None:
+                continue
+
+            read_at = datetime.now(timezone.utc)
+            exceptions = self.kinesis_client.exceptions
+
+            try:
+                result = self.kinesis_client.get_records(ShardIterator=shard_iterator)
+            except exceptions.ExpiredIteratorException:
+                self.shard_iterators[shard_id] = self.shard_iterator(shard_id)
+                continue
+            except exceptions.ProvisionedThroughputExceededException:
+                logging.warning('Throughput exceeded on %s, backing off', shard_id)
+                throttled = True
+                continue
+
+            if not result['Records']:
+                self.read_at[shard_id] = read_at
+
+            for record in result['Records']:
+                self.sequence_numbers[shard_id] = record['SequenceNumber']
+                reply = json.loads(record['Data'])
+
+                if 'correlation_id' in reply:
+                    replies[reply['correlation_id']] = reply
+
+            self.shard_iterators[shard_id] = result.get('NextShardIterator')
+
+        with self.condition:
+            self.replies.update(replies)
+
+            while len(self.replies) > MAX_UNCLAIMED_REPLIES:
+                self.replies.popitem(last=False)
+
+        return throttled
+
+    def poll_delay(self, throttled: bool) -> float:
+        self.throttled_polls = self.throttled_polls + 1 if throttled else 0
+
+        if not self.throttled_polls:
+            return self.poll_seconds
+
+        return min(self.poll_seconds * 2**self.throttled_polls, self.max_backoff_seconds)
+
+    def wait_for(
+        self, correlation_id: str, timeout: float = PREDICTION_TIMEOUT_SECONDS
+    ) -> Dict:
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self.condition:
+                while True:
+                    if correlation_id in self.replies:
+                        return self.replies.pop(correlation_id)
+
+                    now = time.monotonic()
+                    if now >= deadline:
+                        raise TimeoutError(
+                            f'No prediction for request {correlation_id} after {timeout}s'
+                        )
+
+                    if not self.polling and now >= self.next_poll:
+                        self.polling = True
+                        break
+
+                    # Another session is reading the stream or just did
+                    wake_at = deadline if self.polling else min(self.next_poll, deadline)
+                    self.condition.wait(wake_at - now)
+
+            throttled = True
+            try:
+                throttled = self.poll()
+            finally:
+                with self.condition:
+                    self.polling = False
+                    self.next_poll = time.monotonic() + self.poll_delay(throttled)
+                    self.condition.notify_all()
+
+
+@lru_cache(maxsize=None)
+def get_reply_reader() -> ReplyReader:
+    return ReplyReader(get_kinesis_client(), name=PREDICTIONS_OUTPUT_STREAM)
 
-            return response
-        except:
-            logging.exception('Could not get record from stream %s.', self.name)
-            raise
 
+def get_prediction(data: dict) -> Dict:
+    # Positioned before sending, so the reply cannot be missed
+    reply_reader = get_reply_reader()
 
-def get_prediction(data: dict) -> str:
-    kinesis_client = boto3.client('kinesis')
-    input_stream = KinesisStream(kinesis_client, name=PREDICTIONS_INPUT_STREAM)
-    input_stream.put_record(data)
+    correlation_id = uuid.uuid4().hex
+    partition_key = str(data.get('student_id') or correlation_id)
 
-    kinesis_client = boto3.client('kinesis')
-    output_stream = KinesisStream(kinesis_client, name=PREDICTIONS_OUTPUT_STREAM)
-    record = output_stream.get_records(shard_id='shardId-000000000000')
+    input_stream = KinesisStream(get_kinesis_client(), name=PREDICTIONS_INPUT_STREAM)
+    input_stream.put_record(data | {'correlation_id': correlation_id}, partition_key)
 
-    return record
+    return reply_reader.wait_for(correlation_id)
@@ -0,0 +1,177 @@
+import json
+import time
+import threading
+from typing import Dict, List
+
+import pytest
+import predictions
+from predictions import ReplyReader
+
+
+class KinesisClientMock:
+    '''
+    In-memory output stream, records are appended by `reply`
+    '''
+
+    # pylint: disable=unused-argument
+
+    class exceptions:
+        class ExpiredIteratorException(Exception):
+            pass
+
+        class ProvisionedThroughputExceededException(Exception):
+            pass
+
+    def __init__(self, shard_ids: List[str]) -> None:
+        self.shards: Dict[str, List[Dict]] = {shard_id: [] for shard_id in shard_ids}
+        self.expired, self.throttled = set(), []
+        self.iterator_requests, self.get_records_calls = [], 0
+        self.reader = None
+
+    def list_shards(self, StreamName=None, NextToken=None):
+        # One shard per page to go through the pagination
+        shard_ids = list(self.shards)
+        index = 0 if NextToken is None else int(NextToken)
+        response = {'Shards': [{'ShardId': shard_ids[index]}]}
+        if index + 1 < len(shard_ids):
+            response['NextToken'] = str(index + 1)
+        return response
+
+    def reply(self, shard_id: str, correlation_id: str) -> None:
+        records = self.shards[shard_id]
+        records.append(
+            {
+                'Data': json.dumps({'correlation_id': correlation_id}).encode('utf-8'),
+                'SequenceNumber': f'{len(records):020d}',
+                'ArrivedAt': time.time(),
+            }
+        )
+
+    def get_shard_iterator(self, StreamName, ShardId, ShardIteratorType, **position):
+        self.iterator_requests.append((ShardId, ShardIteratorType))
+        records = self.shards[ShardId]
+
+        if ShardIteratorType == 'LATEST':
+            index = len(records)
+        elif ShardIteratorType == 'AT_TIMESTAMP':
+            timestamp = position['Timestamp'].timestamp()
+            index = sum(record['ArrivedAt'] < timestamp for record in records)
+        else:
+            index = int(position['StartingSequenceNumber']) + 1
+
+        return {'ShardIterator': f'{ShardId}:{index}'}
+
+    def get_records(self, ShardIterator):
+        self.get_records_calls += 1
+        if self.reader is not None:
+            # The reader lock is not held during the network call
+            # pylint: disable-next=protected-access
+            assert not self.reader.condition._is_owned()
+
+        shard_id, index = ShardIterator.rsplit(':', 1)
+        if shard_id in self.expired:
+            self.expired.remove(shard_id)
+            raise self.exceptions.ExpiredIteratorException()
+        if self.throttled:
+            self.throttled.pop()
+            raise self.exceptions.ProvisionedThroughputExceededException()
+
+        records = self.shards[shard_id][int(index) :]
+        next_index = int(index) + len(records)
+        return {'Records': records, 'NextShardIterator': f'{shard_id}:{next_index}'}
+
+
+@pytest.fixture(name='kinesis_client')
+def kinesis_client_fixture():
+    return KinesisClientMock(['shardId-0', 'shardId-1'])
+
+
+def reply_reader(kinesis_client, **options) -> ReplyReader:
+    reader = ReplyReader(kinesis_client, 'output', poll_seconds=0, **options)
+    kinesis_client.reader = reader
+    return reader
+
+
+def test_replies_of_every_shard_are_matched(kinesis_client):
+    # Sent before the reader existed, LATEST skips it
+    kinesis_client.reply('shardId-0', 'before')
+    reader = reply_reader(kinesis_client)
+
+    kinesis_client.reply('shardId-1', 'b')
+    kinesis_client.reply('shardId-0', 'a')
+
+    assert reader.wait_for('a', timeout=1) == {'correlation_id': 'a'}
+    assert reader.wait_for('b', timeout=1) == {'correlation_id': 'b'}
+    with pytest.raises(TimeoutError):
+        reader.wait_for('before', timeout=0.05)
+
+
+def test_expired_iterators_resume_where_reading_stopped(kinesis_client):
+    reader = reply_reader(kinesis_client)
+    kinesis_client.reply('shardId-0', 'a')
+    reader.wait_for('a', timeout=1)
+
+    kinesis_client.expired |= {'shardId-0', 'shardId-1'}
+    kinesis_client.reply('shardId-0', 'b')
+    kinesis_client.reply('shardId-1', 'c')
+
+    assert reader.wait_for('b', timeout=1) == {'correlation_id': 'b'}
+    assert reader.wait_for('c', timeout=1) == {'correlation_id': 'c'}
+    assert kinesis_client.iterator_requests[2:] == [
+        ('shardId-0', 'AFTER_SEQUENCE_NUMBER'),
+        # Nothing read from this shard yet, LATEST would skip c
+        ('shardId-1', 'AT_TIMESTAMP'),
+    ]
+
+
+def test_unclaimed_replies_are_evicted(kinesis_client, monkeypatch):
+    monkeypatch.setattr(predictions, 'MAX_UNCLAIMED_REPLIES', 2)
+    reader = reply_reader(kinesis_client)
+
+    for correlation_id in ['timed-out', 'a', 'b']:
+        kinesis_client.reply('shardId-0', correlation_id)
+
+    assert reader.wait_for('b', timeout=1) == {'correlation_id': 'b'}
+    assert list(reader.replies) == ['a']
+    with pytest.raises(TimeoutError):
+        reader.wait_for('timed-out', timeout=0)
+
+
+def test_throttled_reads_back_off():
+    kinesis_client = KinesisClientMock(['shardId-0'])
+    reader = reply_reader(kinesis_client, max_backoff_seconds=0.02)
+    reader.poll_seconds = 0.01
+    kinesis_client.throttled = [True] * 2
+    kinesis_client.reply('shardId-0', 'a')
+
+    start = time.monotonic()
+    assert reader.wait_for('a', timeout=1) == {'correlation_id': 'a'}
+
+    # 2 throttled polls, each followed by a wait of 0.01 * 2**n capped at 0.02s
+    assert time.monotonic() - start >= 0.04
+    assert kinesis_client.get_records_calls == 3
+    assert reader.throttled_polls == 0
+
+
+def test_sessions_share_one_reader(kinesis_client):
+    reader = reply_reader(kinesis_client)
+    correlation_ids = [f'request-{index}' for index in range(8)]
+    replies = {}
+
+    def wait(correlation_id):
+        replies[correlation_id] = reader.wait_for(correlation_id, timeout=2)
+
+    threads = [threading.Thread(target=wait, args=(cid,)) for cid in correlation_ids]
+    for thread in threads:
+        thread.start()
+
+    for index, correlation_id in enumerate(correlation_ids):
+        kinesis_client.reply(f'shardId-{index % 2}', correlation_id)
+
+    for thread in threads:
+        thread.join()
+
+    assert {cid: reply['correlation_id'] for cid, reply in replies.items()} == {
+        cid: cid for cid in correlation_ids
+    }
+    assert not reader.replies